@@ -0,0 +1,95 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from models import Base, Booking, ParkingSpot, PromoCode, Vehicle
+from utils.booking_export import csv_lines, export_chunks, gzipped, ndjson_lines
+
+# Full-history finance export. Set BENCH_DB_URL to run against MySQL (where
+# stream_results uses an unbuffered server-side cursor) instead of SQLite.
+ROWS = [100_000, 300_000]
+SPOTS = 200
+VEHICLES = 5000
+
+
+def make_engine():
+    url = os.getenv("BENCH_DB_URL")
+    if url:
+        return create_engine(url)
+    path = os.path.join(tempfile.mkdtemp(), "bench_export.db")
+    return create_engine(f"sqlite:///{path}")
+
+
+def seed(engine, n):
+    t0 = datetime(2025, 1, 1)
+    with Session(engine) as db:
+        db.query(Booking).delete()
+        if not db.query(ParkingSpot).count():
+            db.execute(insert(ParkingSpot), [
+                {"id": i + 1, "row": i // 20, "col": i % 20, "floor": "Ground", "spot_type": "standard"}
+                for i in range(SPOTS)
+            ])
+            db.execute(insert(Vehicle), [
+                {"id": i + 1, "license_plate": f"BENCH{i:05d}", "owner_name": "bench"}
+                for i in range(VEHICLES)
+            ])
+            db.add(PromoCode(id=1, code="BENCH", discount_type="percentage", discount_value=10,
+                             expiry_date=t0 + timedelta(days=3650), usage_limit=10**9))
+        for lo in range(0, n, 50_000):
+            db.execute(insert(Booking), [
+                {
+                    "user_id": 1, "spot_id": i % SPOTS + 1, "vehicle_id": i % VEHICLES + 1,
+                    "booking_uuid": f"bench-{i}", "name": "Bench User", "email": f"user{i % 997}@example.com",
+                    "phone": "0123456789", "start_time": t0 + timedelta(minutes=i),
+                    "end_time": t0 + timedelta(minutes=i + 120), "payment_method": "card",
+                    "payment_amount": 12.5, "payment_status": "paid", "discount_amount": 1.25,
+                    "promo_code_id": 1 if i % 10 == 0 else None, "status": "completed",
+                    "refund_status": "none", "refund_amount": 0, "excess_fee": 0,
+                    "created_at": t0 + timedelta(minutes=i),
+                }
+                for i in range(lo, min(lo + 50_000, n))
+            ])
+        db.commit()
+
+
+def drain(engine, encode):
+    with Session(engine) as db:
+        t0 = time.perf_counter()
+        size = sum(len(chunk) for chunk in encode(export_chunks(db)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, size
+
+
+def peak_memory(engine, encode):
+    # Separate pass: tracemalloc slows the export down several times over
+    tracemalloc.start()
+    drain(engine, encode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run():
+    engine = make_engine()
+    Base.metadata.create_all(bind=engine)
+    formats = [
+        ("csv", csv_lines),
+        ("ndjson", ndjson_lines),
+        ("csv.gz", lambda chunks: gzipped(csv_lines(chunks))),
+    ]
+    print(f"{'rows':>8} {'format':>7} {'rows/s':>9} {'MB out':>7} {'peak MB':>8}")
+    for n in ROWS:
+        seed(engine, n)
+        for name, encode in formats:
+            elapsed, size = drain(engine, encode)
+            peak = peak_memory(engine, encode)
+            print(f"{n:>8} {name:>7} {n / elapsed:>9.0f} {size / 1e6:>7.1f} {peak / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    run()
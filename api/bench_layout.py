@@ -0,0 +1,67 @@
+import random
+import time
+
+from models import ParkingSpot, SpotSchema
+from utils.layout import index_spots, assemble_layout
+
+# Floor sizes to compare (rows, cols). 40x60 is our largest multi-level floor today.
+SIZES = [(10, 10), (20, 20), (20, 40), (40, 60), (60, 80)]
+REPEAT = 3
+
+
+def make_floor(rows: int, cols: int):
+    spots = []
+    spot_id = 1
+    for r in range(rows):
+        for c in range(cols):
+            spots.append(ParkingSpot(id=spot_id, row=r, col=c, label="", spot_type="standard", is_blocked=False, floor="Ground"))
+            spot_id += 1
+    random.shuffle(spots)  # DB returns rows in no particular grid order
+    occupied = {s.id for s in spots[: len(spots) // 4]}
+    return spots, occupied
+
+
+def legacy_assemble(rows, cols, spots_db, occupied_ids_set):
+    # Previous get_layout loop: linear scan of the floor for every cell
+    spots_out = []
+    for r in range(rows):
+        for c in range(cols):
+            spot = next((s for s in spots_db if s.row == r and s.col == c), None)
+            spots_out.append(SpotSchema(
+                id=spot.id,
+                row=r,
+                col=c,
+                is_booked=spot.id in occupied_ids_set,
+                label=spot.label,
+                spot_type=spot.spot_type,
+                is_blocked=spot.is_blocked,
+            ))
+    return spots_out
+
+
+def indexed_assemble(rows, cols, spots_db, occupied_ids_set):
+    return assemble_layout(rows, cols, index_spots(spots_db), occupied_ids_set)
+
+
+def best_of(fn, *args):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run():
+    print(f"{'floor':>8} {'cells':>7} {'legacy ms':>11} {'indexed ms':>11} {'speedup':>8}")
+    for rows, cols in SIZES:
+        spots, occupied = make_floor(rows, cols)
+        assert legacy_assemble(rows, cols, spots, occupied) == indexed_assemble(rows, cols, spots, occupied)
+
+        legacy = best_of(legacy_assemble, rows, cols, spots, occupied)
+        indexed = best_of(indexed_assemble, rows, cols, spots, occupied)
+        print(f"{rows:>3}x{cols:<4} {rows * cols:>7} {legacy * 1000:>11.2f} {indexed * 1000:>11.2f} {legacy / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
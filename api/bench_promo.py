@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, PromoCode
+from services.promo_redemption import redeem_promo
+
+# Flash campaign: many parallel bookings racing for one limited code.
+# Set BENCH_DB_URL to run against MySQL instead of a throwaway SQLite file.
+THREADS = [4, 16, 64]
+ATTEMPTS_PER_THREAD = 25
+USAGE_LIMIT = 100
+BOOKING_WORK_SECONDS = 0.002  # rest of the booking transaction (spot lock, inserts)
+
+
+def make_engine():
+    url = os.getenv("BENCH_DB_URL")
+    if url:
+        return create_engine(url, pool_size=70)
+    path = os.path.join(tempfile.mkdtemp(), "bench_promo.db")
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+
+
+def reset(Session):
+    db = Session()
+    db.query(PromoCode).filter(PromoCode.code == "FLASH").delete()
+    promo = PromoCode(code="FLASH", discount_type="percentage", discount_value=50,
+                      expiry_date=datetime.utcnow() + timedelta(days=1), usage_limit=USAGE_LIMIT, current_uses=0)
+    db.add(promo)
+    db.commit()
+    promo_id = promo.id
+    db.close()
+    return promo_id
+
+
+def legacy_redeem(db, promo_id):
+    # Previous create_booking: check in Python, increment in Python, write at commit
+    promo = db.query(PromoCode).filter(PromoCode.id == promo_id).first()
+    if promo.current_uses < promo.usage_limit:
+        promo.current_uses += 1
+        return True
+    return False
+
+
+def atomic_redeem(db, promo_id):
+    return redeem_promo(db, promo_id, datetime.utcnow())
+
+
+def legacy_attempt(db, promo_id):
+    granted = legacy_redeem(db, promo_id)
+    time.sleep(BOOKING_WORK_SECONDS)
+    return granted
+
+
+def atomic_attempt(db, promo_id):
+    # Redemption runs last, right before commit
+    time.sleep(BOOKING_WORK_SECONDS)
+    return atomic_redeem(db, promo_id)
+
+
+def run_case(Session, promo_id, attempt, n_threads):
+    barrier = threading.Barrier(n_threads)
+    granted = []
+
+    def worker():
+        db = Session()
+        barrier.wait()
+        for _ in range(ATTEMPTS_PER_THREAD):
+            try:
+                ok = attempt(db, promo_id)
+                db.commit()
+                if ok:
+                    granted.append(1)
+            except Exception:
+                db.rollback()
+        db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    db = Session()
+    current_uses = db.query(PromoCode.current_uses).filter(PromoCode.id == promo_id).scalar()
+    db.close()
+    return len(granted), current_uses, elapsed
+
+
+def run():
+    engine = make_engine()
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    print(f"limit={USAGE_LIMIT}, {ATTEMPTS_PER_THREAD} attempts per thread")
+    print(f"{'mode':>7} {'threads':>8} {'granted':>8} {'db uses':>8} {'oversold':>9} {'attempts/s':>11}")
+    for n_threads in THREADS:
+        for mode, attempt in (("legacy", legacy_attempt), ("atomic", atomic_attempt)):
+            promo_id = reset(Session)
+            granted, current_uses, elapsed = run_case(Session, promo_id, attempt, n_threads)
+            attempts = n_threads * ATTEMPTS_PER_THREAD
+            print(f"{mode:>7} {n_threads:>8} {granted:>8} {current_uses:>8} {max(granted - USAGE_LIMIT, 0):>9} {attempts / elapsed:>11.0f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+import main
+from models import Base, Booking, ParkingSpot, PromoCode, Vehicle
+from utils.serializers import booking_json, booking_rows, dumps, paginated_json
+
+# Booking list pages: ORM rows -> BookingResponse -> FastAPI JSON, against the
+# column projection -> dict -> JSON bytes path. Set BENCH_DB_URL for MySQL.
+PAGE_SIZES = [50, 500, 5000]
+REPEAT_ROWS = 50_000  # rows serialized per measurement
+
+
+def make_engine():
+    url = os.getenv("BENCH_DB_URL")
+    if url:
+        return create_engine(url)
+    path = os.path.join(tempfile.mkdtemp(), "bench_serialization.db")
+    return create_engine(f"sqlite:///{path}")
+
+
+def seed(engine, n):
+    t0 = datetime(2026, 1, 1)
+    with Session(engine) as db:
+        db.execute(insert(ParkingSpot), [
+            {"id": i + 1, "row": i // 20, "col": i % 20, "floor": "Ground", "spot_type": "standard"} for i in range(200)
+        ])
+        db.execute(insert(Vehicle), [
+            {"id": i + 1, "license_plate": f"BENCH{i:05d}", "owner_name": "bench", "created_at": t0, "updated_at": t0}
+            for i in range(1000)
+        ])
+        db.add(PromoCode(id=1, code="BENCH", discount_type="fixed", discount_value=1,
+                         expiry_date=t0 + timedelta(days=365), usage_limit=10**9))
+        db.execute(insert(Booking), [
+            {
+                "user_id": 1, "spot_id": i % 200 + 1, "vehicle_id": i % 1000 + 1, "booking_uuid": f"bench-{i}",
+                "name": "Bench User", "email": "bench@example.com", "phone": "0123456789",
+                "start_time": t0 + timedelta(hours=i), "end_time": t0 + timedelta(hours=i + 2),
+                "payment_method": "card", "payment_amount": 12.5, "payment_status": "paid",
+                "discount_amount": 1, "promo_code_id": 1 if i % 4 == 0 else None, "status": "active",
+                "refund_status": "none", "refund_amount": 0, "excess_fee": 0,
+                "created_at": t0 + timedelta(minutes=i),
+            }
+            for i in range(n)
+        ])
+        db.commit()
+
+
+def orm_page(db, limit):
+    # Previous list path: joined ORM load, BookingResponse per row, then what
+    # FastAPI does with response_model (validate, dump to JSON mode, json.dumps)
+    bookings = db.query(Booking).options(*main.booking_response_options()).order_by(Booking.id).limit(limit).all()
+    items = [main.build_booking_response(b) for b in bookings]
+    page = main.PaginatedBookingResponse(items=items, total=limit, page=1, size=limit, pages=1)
+    return json.dumps(page.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def projected_page(db, limit):
+    rows = booking_rows(db).order_by(Booking.id).limit(limit).all()
+    return dumps(paginated_json([booking_json(row) for row in rows], limit, 1, limit, 1, None))
+
+
+def rows_per_second(engine, render, limit):
+    pages = max(REPEAT_ROWS // limit, 1)
+    with Session(engine) as db:
+        render(db, limit)  # warm up
+        t0 = time.perf_counter()
+        for _ in range(pages):
+            render(db, limit)
+            db.expunge_all()
+        elapsed = time.perf_counter() - t0
+    return pages * limit / elapsed
+
+
+def run():
+    engine = make_engine()
+    Base.metadata.create_all(bind=engine)
+    seed(engine, max(PAGE_SIZES))
+
+    with Session(engine) as db:
+        assert json.loads(orm_page(db, 50)) == json.loads(projected_page(db, 50))
+
+    paths = [("orm+pydantic", orm_page), ("projection", projected_page)]
+
+    print(f"{'page':>6} " + " ".join(f"{name:>16}" for name, _ in paths) + f" {'speedup':>8}")
+    for limit in PAGE_SIZES:
+        rates = [rows_per_second(engine, render, limit) for _, render in paths]
+        print(f"{limit:>6} " + " ".join(f"{rate:>16.0f}" for rate in rates) + f" {rates[1] / rates[0]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
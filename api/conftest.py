@@ -0,0 +1,59 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# main.py builds the MySQL engine at import time; give it a URL it can parse.
+# Tests never connect to it, they bind sessions to a throwaway SQLite file.
+for key, value in {
+    "DB_HOST": "localhost",
+    "DB_PORT": "3306",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_NAME": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+from models import Base
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries():
+    """Counts SQL statements sent through a session's engine: `with count_queries(db) as q: ...`."""
+    from contextlib import contextmanager
+
+    @contextmanager
+    def counting(session):
+        counter = QueryCounter()
+        engine = session.get_bind()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+
+    return counting
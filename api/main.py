@@ -1,29 +1,52 @@
 import os
+import asyncio
+import json
 from datetime import datetime, timedelta
 from typing import List, Optional
 from contextlib import asynccontextmanager
 
 from pydantic import BaseModel
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import create_engine, func, insert, or_
+from sqlalchemy.orm import sessionmaker, Session, joinedload
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 import io
 import math
+import numpy as np
 import os
 import random
 import string
 from fastapi.responses import StreamingResponse
 from utils.pdf import generate_booking_receipt
 from dotenv import load_dotenv
-from utils.email import send_email
 from utils.common import format_spot_id
+from utils.layout import index_spots, assemble_layout, provision_spots
+from utils.pagination import paginate_bookings, booking_counts
+from utils.booking_filters import BookingFilters
+from utils.serializers import booking_rows, booking_json, paginated_json, dumps
+from utils.booking_export import export_chunks, csv_lines, ndjson_lines, gzipped
+from services.availability import availability_index, holds_spot
+from services.occupancy import occupancy_matrix, to_datetime64
+from services.layout_cache import layout_cache, etag_matches
+from services.live_updates import live_updates
+from services.spot_catalog import SpotCatalog, spot_catalog
+from services.config_cache import config_cache, CONFIG_VERSION_KEY, CONFIG_REFRESH_SECONDS
+from services.idempotency import idempotency_store
+from services.pricing import price, price_batch, price_with_promo, promo_is_redeemable, promo_terms, spot_multiplier, overstay_fee, overstay_hours as pricing_overstay_hours
+from services.promo_cache import promo_cache
+from services.promo_redemption import redeem_promo, redeem_promo_up_to
+from services.holds import expire_holds, hold_deadline, hold_queue, occurrence_hold_deadline, schedule_holds
+from services.notifications import load_notifications, notification_queue
+from services.email_outbox import email_outbox, enqueue_email, purge_outbox
+from services.recurrence import expand_occurrences, conflicting_occurrences
+from services.lot_events import booking_changed, spot_changed, floor_changed, lot_resynced
 
 try:
     # from ddtrace import patch_all
@@ -45,7 +68,11 @@ from models import (
     UserCreate, Token, ParkingState, LayoutConfig, BookingRequest, SpotSchema,
     BookingCreate, BookingResponse, VehicleCreate, VehicleResponse, CancelBookingRequest,
     AnalyticsResponse, ChartData, UpdateSpot, PromoCode, PromoCodeCreate, PromoCodeResponse, SystemConfig,
-    UserResponse
+    UserResponse, OccupancyHeatmapResponse, FloorOccupancy, SpotCandidate, SpotSearchResponse,
+    FloorSummary, FloorLayout, MultiFloorLayoutResponse,
+    BatchBookingCreate, BatchBookingItemResult, BatchBookingResponse,
+    RecurringBookingCreate, RecurringBookingResponse, RecurringConflict,
+    QuoteRequest, QuoteResult, QuoteResponse
 )
 
 # Pydantic Models for Password Reset
@@ -77,6 +104,7 @@ class PaginatedBookingResponse(BaseModel):
     page: int
     size: int
     pages: int
+    next_cursor: Optional[str] = None # pass as ?cursor= for the next page
 
 # Load env vars
 load_dotenv()
@@ -106,150 +134,103 @@ async def lifespan(app: FastAPI):
     if not db.query(LayoutConfigDB).first():
         db.add(LayoutConfigDB(rows=5, cols=5))
         db.commit()
+    # Make sure every configured floor has its spots (older floors were created lazily)
+    for layout in db.query(LayoutConfigDB).all():
+        provision_spots(db, layout.floor, layout.rows, layout.cols)
+    db.commit()
+    # Warm the in-memory availability index and spot catalog
+    availability_index.load(db)
+    spot_catalog.load(db)
+    config_cache.load(db)
+    # Expire unpaid holds exactly at their deadline
+    schedule_holds(db)
+    hold_queue.start()
+    # Pre-alert / expiry / overstay emails go out at their deadlines
+    load_notifications(db, datetime.utcnow())
+    notification_queue.start()
+    # Emails are appended to the outbox and sent from here
+    email_outbox.start()
     db.close()
     
+    # Live layout pushes are delivered on this loop
+    live_updates.bind(asyncio.get_running_loop())
+    
     # Start background task for expiring pending bookings & email alerts
-    import asyncio
-    from utils.email import send_email
+    def monitor_tick():
+        db_session = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            # print(f"Running background monitor at {now}...")
+            
+            # 1. Expire Pending Bookings
+            # Holds normally expire on time via hold_queue; this sweep
+            # catches holds from workers that went away and pre-hold rows.
+            expire_holds(db_session, now)
+
+            # Resync the availability index and spot catalog with the DB
+            # (catches bookings, spot edits and resizes from other workers)
+            drift = availability_index.reconcile(db_session)
+            drifted_ids = drift["missing"] + drift["stale"] + drift["changed"]
+            spot_drift = spot_catalog.reconcile(db_session)
+            if drifted_ids:
+                print(f"Availability index drift corrected: {drift}")
+            if spot_drift["spots"] or spot_drift["floors"]:
+                print(f"Spot catalog drift corrected: {spot_drift}")
+            if drifted_ids or spot_drift["spots"] or spot_drift["floors"]:
+                drifted_spots = db_session.query(ParkingSpot).filter(or_(
+                    ParkingSpot.id.in_(db_session.query(Booking.spot_id).filter(Booking.id.in_(drifted_ids))),
+                    ParkingSpot.id.in_(spot_drift["spots"]),
+                )).all()
+                lot_resynced(drifted_spots, spot_drift["floors"])
+
+            # Drop idempotency keys past their replay window, and old sent emails
+            idempotency_store.purge(db_session)
+            purge_outbox(db_session, now)
+
+            # 2. Email Notifications
+            # Sent by notification_queue at each booking's deadline; this
+            # queues bookings whose next email comes up within the horizon
+            # (including ones changed through other workers).
+            load_notifications(db_session, now)
+
+            db_session.commit()
+        finally:
+            db_session.close()
 
     async def background_monitor():
         while True:
             # Check every 5 minutes (300 seconds)
             await asyncio.sleep(300) 
-            db_session = SessionLocal()
             try:
-                now = datetime.utcnow()
-                # print(f"Running background monitor at {now}...")
-                
-                # 1. Expire Pending Bookings
-                expiration_threshold = now - timedelta(minutes=15)
-                expired_bookings = db_session.query(Booking).filter(
-                    Booking.status == 'pending',
-                    Booking.created_at < expiration_threshold
-                ).all()
-                
-                for booking in expired_bookings:
-                    booking.status = 'expired'
-                    if booking.payment_status == 'pending':
-                         booking.payment_status = 'failed'
-                db_session.commit()
-
-                # 2. Email Notifications
-                active_bookings = db_session.query(Booking).filter(Booking.status == 'active').all()
-                for booking in active_bookings:
-                    if not booking.user or not booking.user.email:
-                        continue
-                        
-                    # ensure naive utc
-                    end_time_utc = booking.end_time if not booking.end_time.tzinfo else booking.end_time.replace(tzinfo=None)
-                    time_left = (end_time_utc - now).total_seconds() / 60.0 # minutes
-
-                    plate = booking.vehicle.license_plate if booking.vehicle else "Unknown"
-                    spot_str = format_spot_id(booking.spot.row, booking.spot.col, booking.spot.floor) if booking.spot else "N/A"
-                    end_str = end_time_utc.strftime("%Y-%m-%d %H:%M:%S")
-
-                    # A. Pre-Alert (10-20 mins before)
-                    if 10 <= time_left <= 20 and not booking.is_pre_alert_sent:
-                        html_body = f"""
-                            <h1>Parking Expiring Soon</h1>
-                            <p>Hello {booking.user.username},</p>
-                            <p>This is a friendly reminder that your parking session is about to expire.</p>
-                            
-                            <table class="details-table">
-                                <tr><th>Vehicle</th><td>{plate}</td></tr>
-                                <tr><th>Spot</th><td>{spot_str}</td></tr>
-                                <tr><th>Expires At</th><td>{end_str}</td></tr>
-                            </table>
-                            
-                            <div class="highlight-box">
-                                <strong>15 Minutes Remaining</strong>
-                            </div>
-                            
-                            <p>Please extend your session or return to your vehicle.</p>
-                            <center><a href="{FRONTEND_URL}/my-bookings" class="btn">View Booking</a></center>
-                        """
-                        send_email(booking.user.email, "Parking Expiring Soon - ParkPro", html_body, is_html=True)
-                        booking.is_pre_alert_sent = True
-
-                    # B. Expiry Alert (<= 0 mins)
-                    if time_left <= 0 and not booking.is_expiry_alert_sent:
-                        html_body = f"""
-                            <h1>Parking Expired</h1>
-                            <p>Hello {booking.user.username},</p>
-                            <div class="alert-box">
-                                <span class="alert-title">SESSION EXPIRED</span>
-                                Your parking time has finished. You are now accruing excess fees.
-                            </div>
-                            
-                            <table class="details-table">
-                                <tr><th>Vehicle</th><td>{plate}</td></tr>
-                                <tr><th>Spot</th><td>{spot_str}</td></tr>
-                                <tr><th>Expired At</th><td>{end_str}</td></tr>
-                            </table>
-                            
-                            <p>Please checkout immediately via the portal or app to finalize your payment.</p>
-                            <center><a href="{FRONTEND_URL}/my-bookings" class="btn" style="background-color: #ef4444;">Checkout Now</a></center>
-                        """
-                        send_email(booking.user.email, "Parking Expired - ParkPro", html_body, is_html=True)
-                        booking.is_expiry_alert_sent = True
-                        booking.last_overstay_sent_at = now
-
-                    # C. Overstay Reminder (Every 6 hours)
-                    if time_left < 0 and booking.is_expiry_alert_sent:
-                        last_sent = booking.last_overstay_sent_at
-                        if last_sent:
-                            last_sent = last_sent.replace(tzinfo=None) if last_sent.tzinfo else last_sent
-                            hours_since_last = (now - last_sent).total_seconds() / 3600.0
-                            if hours_since_last >= 6.0:
-                                # Calculate current excess fee
-                                overstay_duration_sec = (now - end_time_utc).total_seconds()
-                                overstay_hours_calc = math.ceil(overstay_duration_sec / 3600.0)
-                                
-                                # Fetch Rate (inside loop is inefficient but safe for low volume)
-                                hourly_rate_config = db_session.query(SystemConfig).filter(SystemConfig.key == "hourly_rate").first()
-                                base_rate = float(hourly_rate_config.value) if hourly_rate_config else 10.0
-                                
-                                multiplier = 1.0
-                                if booking.spot:
-                                    if booking.spot.spot_type == 'ev': 
-                                        multiplier = 1.5
-                                    elif booking.spot.spot_type == 'vip':
-                                        multiplier = 2.0
-                                
-                                current_excess = overstay_hours_calc * base_rate * multiplier
-                                
-                                plate = booking.vehicle.license_plate if booking.vehicle else "Unknown"
-                                spot_str = format_spot_id(booking.spot.row, booking.spot.col, booking.spot.floor) if booking.spot else "N/A"
-                                
-                                html_body = f"""
-                                    <h1>Overstay Fee Notice</h1>
-                                    <p>Hello {booking.user.username},</p>
-                                    <div class="alert-box">
-                                        <span class="alert-title">ACTION REQUIRED</span>
-                                        Your vehicle has exceeded the booked time by <strong>{int(overstay_hours_calc)} hours</strong>.
-                                    </div>
-                                    
-                                    <table class="details-table">
-                                        <tr><th>Vehicle</th><td>{plate}</td></tr>
-                                        <tr><th>Spot</th><td>{spot_str}</td></tr>
-                                        <tr><th>Estimated Fee</th><td><strong>MYR {current_excess:.2f}</strong></td></tr>
-                                    </table>
-                                    
-                                    <p>Please checkout immediately to avoid further charges.</p>
-                                    <center><a href="{FRONTEND_URL}/my-bookings" class="btn" style="background-color: #ef4444;">Pay & Exit</a></center>
-                                """
-                                send_email(booking.user.email, f"Rate Alert: Overstay Notice", html_body, is_html=True)
-                                booking.last_overstay_sent_at = now
-
-                db_session.commit()
-                db_session.close()
+                # Sync DB work runs in a worker thread, never on the event loop
+                await run_in_threadpool(monitor_tick)
             except Exception as e:
                 print(f"Error in background expiration task: {e}")
 
     asyncio.create_task(background_monitor())
     
+    async def config_refresher():
+        # Picks up /admin/config writes made through other workers
+        def refresh():
+            db_session = SessionLocal()
+            try:
+                config_cache.refresh(db_session)
+            finally:
+                db_session.close()
+        while True:
+            await asyncio.sleep(CONFIG_REFRESH_SECONDS)
+            try:
+                await run_in_threadpool(refresh)
+            except Exception as e:
+                print(f"Error refreshing config: {e}")
+    
+    asyncio.create_task(config_refresher())
+    
     yield
     # Shutdown (if needed)
+    hold_queue.stop()
+    notification_queue.stop()
+    email_outbox.stop()
 
 # Startup Marker
 print("----------------------------------------------------------------")
@@ -294,7 +275,8 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Plain def: FastAPI runs it in the threadpool, so its DB lookup doesn't block the loop
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -389,32 +371,20 @@ def get_current_user_profile(current_user: User = Depends(get_current_user)):
         phone=current_user.phone
     )
 
-@app.get("/layout", response_model=ParkingState)
-def get_layout(
-    start_time: str = None, 
-    end_time: str = None, 
-    floor: str = "Ground", # Default to Ground floor
-    db: Session = Depends(get_db)
-):
-    # Fetch layout for specific floor
-    layout = db.query(LayoutConfigDB).filter(LayoutConfigDB.floor == floor).first()
-    if not layout:
-        # If no config for this floor, fallback or return empty/default
-        # For seamless upgrades, if requesting "Ground" and no record exists but oldrecord does (no floor set), use that.
-        # But our migration added "Ground" to existing records. So this should be fine.
-        # If completely new floor requested (e.g. Level1) and not found, default to 5x5
-        layout = LayoutConfigDB(rows=5, cols=5, floor=floor) 
-    
+def parse_layout_window(start_time: str = None, end_time: str = None):
+    """
+    Returns (check_start, check_end, is_now) as naive UTC. Falls back to the
+    current instant when no (or an unparseable) range is given.
+    """
     # Check occupancy based on specific time range if provided, else current time (now)
     # If checking a future slot, we want to know what is booked THEN.
     from datetime import timezone
     
-    check_start = datetime.utcnow()
-    check_end = datetime.utcnow()
+    now = datetime.utcnow()
     
     if start_time and end_time:
         try:
-    # Parse ISO strings (likely with Z or offset)
+            # Parse ISO strings (likely with Z or offset)
             # Normalize to naive UTC as stored in DB
             s_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
             e_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
@@ -424,87 +394,184 @@ def get_layout(
             if e_dt.tzinfo:
                 e_dt = e_dt.astimezone(timezone.utc).replace(tzinfo=None)
                 
-            check_start = s_dt
-            check_end = e_dt
+            return s_dt, e_dt, False
         except ValueError:
             pass # Fallback to now if parse fails
             
+    return now, now, True
+
+@app.get("/layout", response_model=ParkingState)
+def get_layout(
+    request: Request = None,
+    start_time: str = None, 
+    end_time: str = None, 
+    floor: str = "Ground", # Default to Ground floor
+    db: Session = Depends(get_db)
+):
+    check_start, check_end, is_now = parse_layout_window(start_time, end_time)
+    etag, body = render_layout(floor, check_start, check_end, is_now, db)
+    
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def render_layout(floor: str, check_start: datetime, check_end: datetime, is_now: bool, db: Session):
+    """
+    Returns (etag, json_body) for a floor, served from the layout cache when current.
+    """
+    # "Now" views share one entry per floor; the cache TTL bounds their drift
+    cache_key = (floor, None, None) if is_now else (floor, check_start, check_end)
+    cached = layout_cache.get(cache_key)
+    if cached is None:
+        version = layout_cache.version
+        state = build_layout(floor, check_start, check_end, db)
+        cached = layout_cache.put(cache_key, state.model_dump_json().encode(), version)
+    return cached
+
+def query_occupied_spot_ids(db: Session, check_start: datetime, check_end: datetime, overstay_blocks: bool = True) -> set:
+    """
+    DB fallback for availability_index.occupied_spot_ids (used before the index is loaded).
+    With overstay_blocks=False only bookings overlapping the window count, as
+    in the booking overlap check.
+    """
     from sqlalchemy import or_, and_
     
-    occupied_spot_ids = db.query(Booking.spot_id).filter(
-        Booking.status.in_(['active', 'pending']),
-        or_(
-            # 1. Normal overlap: Booking interval overlaps with Check interval
-            and_(Booking.start_time < check_end, Booking.end_time > check_start),
-            
+    # 1. Normal overlap: Booking interval overlaps with Check interval
+    overlap = and_(Booking.start_time < check_end, Booking.end_time > check_start)
+    if overstay_blocks:
+        overlap = or_(
+            overlap,
             # 2. Overstay: Status is 'active' AND booking should have ended before check_start
             # This implies the car is still physically there (hasn't checked out), so it blocks the spot.
             # We treat 'active' overstayers as occupying the spot indefinitely until status changes.
             and_(Booking.status == 'active', Booking.end_time <= check_start)
         )
+    
+    occupied_spot_ids = db.query(Booking.spot_id).filter(
+        Booking.status.in_(['active', 'pending']),
+        holds_spot(datetime.utcnow()),
+        overlap
     ).all()
     
     # Flatten list of tuples [(1,), (2,)] -> {1, 2}
-    occupied_ids_set = {s[0] for s in occupied_spot_ids}
+    return {s[0] for s in occupied_spot_ids}
 
-    # Fetch spots for THIS floor only
+def build_layout(floor: str, check_start: datetime, check_end: datetime, db: Session) -> ParkingState:
+    # Fetch layout for specific floor
+    layout = db.query(LayoutConfigDB).filter(LayoutConfigDB.floor == floor).first()
+    if not layout:
+        # If no config for this floor, fallback or return empty/default
+        # For seamless upgrades, if requesting "Ground" and no record exists but oldrecord does (no floor set), use that.
+        # But our migration added "Ground" to existing records. So this should be fine.
+        # If completely new floor requested (e.g. Level1) and not found, default to 5x5
+        layout = LayoutConfigDB(rows=5, cols=5, floor=floor) 
+    
+    # Fetch spots for THIS floor only, keyed by (row, col) for O(1) cell lookup.
+    # Spots are provisioned when the layout is saved, so this endpoint never writes.
     spots_db = db.query(ParkingSpot).filter(ParkingSpot.floor == floor).all()
-    spots_out = []
+    spot_index = index_spots(spots_db)
     
-    # We must generate the grid based on the layout dimensions
-    # If spots exist in DB, use them. If not (new floor), they will be simulated as empty until admin saves?
-    # Actually, usually admin initializes the layout. 
-    # Let's ensure we return a structured grid.
+    if availability_index.loaded:
+        # Answered from the in-memory interval index, no bookings scan
+        occupied_ids_set = availability_index.occupied_spot_ids(
+            check_start, check_end, [s.id for s in spot_index.values()]
+        )
+    else:
+        occupied_ids_set = query_occupied_spot_ids(db, check_start, check_end)
     
-    for r in range(layout.rows):
-        for c in range(layout.cols):
-            spot = next((s for s in spots_db if s.row == r and s.col == c), None)
-            
-            # Determine status dynamically
-            is_booked = False
-            booked_by_username = None
-            spot_id = 0
-            label = ""
-            spot_type = "standard"
-            is_blocked = False
-            
-            if spot:
-                spot_id = spot.id
-                label = spot.label
-                spot_type = spot.spot_type
-                is_blocked = spot.is_blocked
-                if spot.id in occupied_ids_set:
-                    is_booked = True
-            else:
-                # Lazy create the spot so it has an ID for Admin editing
-                new_spot = ParkingSpot(row=r, col=c, floor=floor)
-                db.add(new_spot)
-                db.flush() # Get ID
-                db.refresh(new_spot)
-                spot_id = new_spot.id
-                label = new_spot.label # default ""
-                spot_type = new_spot.spot_type # default "standard"
-                # is_blocked default False
-            
-            spots_out.append(SpotSchema(
-                id=spot_id,
-                row=r,
-                col=c,
-                is_booked=is_booked,
-                label=label,
-                spot_type=spot_type,
-                is_blocked=is_blocked,
-                booked_by_username=booked_by_username
-            ))
-            
-    # Commit any newly created spots
-    try:
-        db.commit()
-    except:
-        db.rollback()
+    spots_out = assemble_layout(layout.rows, layout.cols, spot_index, occupied_ids_set)
         
     return ParkingState(rows=layout.rows, cols=layout.cols, spots=spots_out)
 
+def summarize_floor(spots: List[SpotSchema]) -> FloorSummary:
+    summary = FloorSummary(free={}, booked={}, blocked={})
+    for spot in spots:
+        if spot.is_blocked:
+            bucket = summary.blocked
+        elif spot.is_booked:
+            bucket = summary.booked
+        else:
+            bucket = summary.free
+        bucket[spot.spot_type] = bucket.get(spot.spot_type, 0) + 1
+    return summary
+
+@app.get("/layouts", response_model=MultiFloorLayoutResponse)
+def get_all_layouts(
+    start_time: str = None,
+    end_time: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Every floor's layout plus free/booked/blocked counts by spot type, from
+    one layout query, one spot query and a single occupancy lookup.
+    """
+    check_start, check_end, _ = parse_layout_window(start_time, end_time)
+    
+    layouts = db.query(LayoutConfigDB).order_by(LayoutConfigDB.floor).all()
+    
+    spots_by_floor = {}
+    for spot in db.query(ParkingSpot).filter(ParkingSpot.floor.in_([l.floor for l in layouts])).all():
+        spots_by_floor.setdefault(spot.floor, []).append(spot)
+    
+    if availability_index.loaded:
+        all_spot_ids = [s.id for spots in spots_by_floor.values() for s in spots]
+        occupied_ids_set = availability_index.occupied_spot_ids(check_start, check_end, all_spot_ids)
+    else:
+        occupied_ids_set = query_occupied_spot_ids(db, check_start, check_end)
+    
+    floors_out = []
+    for layout in layouts:
+        spot_index = index_spots(spots_by_floor.get(layout.floor, []))
+        spots_out = assemble_layout(layout.rows, layout.cols, spot_index, occupied_ids_set)
+        floors_out.append(FloorLayout(
+            floor=layout.floor,
+            rows=layout.rows,
+            cols=layout.cols,
+            spots=spots_out,
+            summary=summarize_floor(spots_out)
+        ))
+    
+    return MultiFloorLayoutResponse(floors=floors_out)
+
+def layout_snapshot_message(floor: str) -> str:
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        _, body = render_layout(floor, now, now, True, db)
+    finally:
+        db.close()
+    return f'{{"type": "snapshot", "floor": {json.dumps(floor)}, "layout": {body.decode()}}}'
+
+@app.websocket("/ws/layout")
+async def layout_stream(websocket: WebSocket, floor: str = "Ground"):
+    """
+    Live occupancy for a floor: a full snapshot on connect, then spot-level
+    deltas as bookings and spots change. A "resync" message means the client
+    should reload the floor (resize, or it fell too far behind).
+    """
+    await websocket.accept()
+    # Subscribe before taking the snapshot so no change slips in between
+    queue = live_updates.subscribe(floor)
+
+    async def pump():
+        while True:
+            await websocket.send_text(await queue.get())
+
+    pump_task = None
+    try:
+        await websocket.send_text(await run_in_threadpool(layout_snapshot_message, floor))
+        pump_task = asyncio.create_task(pump())
+        while True:
+            # Clients don't send anything; this just notices the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if pump_task:
+            pump_task.cancel()
+        live_updates.unsubscribe(floor, queue)
+
 class UpdateSpot(BaseModel):
     label: Optional[str] = None
     spot_type: Optional[str] = None # standard, ev, vip
@@ -524,6 +591,7 @@ def update_spot(spot_id: int, updates: UpdateSpot, current_user: User = Depends(
         spot.spot_type = updates.spot_type
         
     db.commit()
+    spot_changed(spot)
     return {"message": "Spot updated successfully"}
 
 
@@ -539,6 +607,7 @@ def toggle_spot_block(spot_id: int, current_user: User = Depends(get_current_use
     
     spot.is_blocked = not spot.is_blocked
     db.commit()
+    spot_changed(spot)
     
     status = "blocked" if spot.is_blocked else "unblocked"
     return {"message": f"Spot {status} successfully", "is_blocked": spot.is_blocked}
@@ -599,6 +668,131 @@ def get_analytics(current_user: User = Depends(get_current_user), db: Session =
 
 
 
+# Booking statuses that mean a car actually occupied the spot
+OCCUPANCY_STATUSES = ['active', 'completed']
+# 31 days of 15-minute slots
+MAX_HEATMAP_SLOTS = 31 * 24 * 4
+# Cap on spots x slots for the per-spot matrix (about 2 bytes of JSON per cell)
+MAX_HEATMAP_SPOT_CELLS = 200_000
+
+@app.get("/admin/analytics/occupancy", response_model=OccupancyHeatmapResponse)
+def get_occupancy_heatmap(
+    start_time: str = None,
+    days: int = 7,
+    slot_minutes: int = 15,
+    floor: str = None,
+    include_spots: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Floor x spot x time-slot occupancy matrix for capacity planning.
+    Defaults to the last 7 days in 15-minute slots across every configured floor.
+    The per-spot matrix is only returned with include_spots=true, for windows
+    small enough to fit MAX_HEATMAP_SPOT_CELLS.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if slot_minutes <= 0 or days <= 0:
+        raise HTTPException(status_code=400, detail="days and slot_minutes must be positive")
+    n_slots = (days * 24 * 60) // slot_minutes
+    if n_slots == 0 or n_slots > MAX_HEATMAP_SLOTS:
+        raise HTTPException(status_code=400, detail=f"Requested window must cover between 1 and {MAX_HEATMAP_SLOTS} slots")
+    
+    from datetime import timezone
+    from sqlalchemy import or_
+    
+    now = datetime.utcnow()
+    if start_time:
+        try:
+            window_start = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid start_time")
+        if window_start.tzinfo:
+            window_start = window_start.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        # Window ending at the current slot boundary
+        slot_end = now.replace(second=0, microsecond=0) - timedelta(minutes=now.minute % slot_minutes) + timedelta(minutes=slot_minutes)
+        window_start = slot_end - timedelta(minutes=slot_minutes * n_slots)
+    window_end = window_start + timedelta(minutes=slot_minutes * n_slots)
+    
+    layouts_query = db.query(LayoutConfigDB)
+    if floor:
+        layouts_query = layouts_query.filter(LayoutConfigDB.floor == floor)
+    layouts = sorted(layouts_query.all(), key=lambda l: l.floor)
+    
+    spots = db.query(
+        ParkingSpot.id, ParkingSpot.floor, ParkingSpot.row, ParkingSpot.col, ParkingSpot.label
+    ).filter(
+        ParkingSpot.floor.in_([l.floor for l in layouts])
+    ).order_by(ParkingSpot.floor, ParkingSpot.row, ParkingSpot.col).all()
+    if include_spots and len(spots) * n_slots > MAX_HEATMAP_SPOT_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"include_spots is limited to {MAX_HEATMAP_SPOT_CELLS} spot-slots; narrow the window, use longer slots or pick a floor"
+        )
+    
+    bookings = db.query(
+        Booking.spot_id, Booking.start_time, Booking.end_time, Booking.status
+    ).filter(
+        Booking.status.in_(OCCUPANCY_STATUSES),
+        Booking.start_time < window_end,
+        # Active overstays are still parked even though end_time has passed
+        or_(Booking.end_time > window_start, Booking.status == 'active')
+    ).all()
+    
+    spot_ids = np.array([s.id for s in spots], dtype=np.int64)
+    if bookings:
+        b_spot_ids, b_starts, b_ends, b_statuses = zip(*bookings)
+        starts = to_datetime64(b_starts)
+        ends = to_datetime64(b_ends)
+        now64 = np.datetime64(now, "s")
+        overstaying = (np.array(b_statuses) == 'active') & (ends < now64)
+        ends = np.where(overstaying, now64, ends)
+    else:
+        b_spot_ids, starts, ends = (), to_datetime64([]), to_datetime64([])
+    
+    occupied = occupancy_matrix(
+        spot_ids, b_spot_ids, starts, ends, window_start, slot_minutes, n_slots
+    ) > 0
+    
+    spot_floors = np.array([s.floor for s in spots], dtype=object)
+    spot_rows = np.array([s.row for s in spots], dtype=np.int64)
+    spot_cols = np.array([s.col for s in spots], dtype=np.int64)
+    slots = [window_start + timedelta(minutes=slot_minutes * i) for i in range(n_slots)]
+    
+    floors_out = []
+    for layout in layouts:
+        # Ignore orphaned spots outside the current floor dimensions
+        mask = (spot_floors == layout.floor) & (spot_rows < layout.rows) & (spot_cols < layout.cols)
+        idx = np.nonzero(mask)[0]
+        floor_matrix = occupied[idx]
+        per_slot = floor_matrix.sum(axis=0)
+        peak = int(per_slot.max()) if n_slots else 0
+        floors_out.append(FloorOccupancy(
+            floor=layout.floor,
+            rows=layout.rows,
+            cols=layout.cols,
+            capacity=len(idx),
+            spot_ids=spot_ids[idx].tolist(),
+            spot_labels=[spots[i].label or format_spot_id(spots[i].row, spots[i].col) for i in idx],
+            occupied=per_slot.tolist(),
+            peak_occupied=peak,
+            peak_slot=slots[int(per_slot.argmax())] if peak else None,
+            occupancy=floor_matrix.astype(np.uint8).tolist() if include_spots else None
+        ))
+    
+    return OccupancyHeatmapResponse(
+        window_start=window_start,
+        window_end=window_end,
+        slot_minutes=slot_minutes,
+        slots=slots,
+        floors=floors_out
+    )
+
+
+
 # Define LayoutConfig Pydantic model at cleaner scope if needed, assuming it's imported or defined above.
 # Need to check if LayoutConfig has 'floor' field. If not, we should update the Pydantic model too?
 # Let's assume we need to update Pydantic model first. 
@@ -633,7 +827,11 @@ def update_layout(config: LayoutConfig, current_user: User = Depends(get_current
         (ParkingSpot.row >= config.rows) | (ParkingSpot.col >= config.cols)
     ).delete()
     
+    # Create spots for any new cells in one bulk insert
+    provision_spots(db, floor_name, config.rows, config.cols)
+    
     db.commit()
+    floor_changed(db, floor_name)
     # Return layout for the specific floor
     return get_layout(floor=floor_name, db=db)
 
@@ -647,17 +845,131 @@ def get_floors(db: Session = Depends(get_db)):
     floor_list = [f[0] for f in floors] if floors else ["Ground"]
     return sorted(floor_list)
 
+MAX_SEARCH_RESULTS = 50
+
+def loaded_spot_catalog(db: Session) -> SpotCatalog:
+    """The spot catalog, loaded on first use if startup hasn't done it yet."""
+    if not spot_catalog.loaded:
+        spot_catalog.load(db)
+    return spot_catalog
+
+@app.get("/spots/search", response_model=SpotSearchResponse)
+def search_spots(
+    start_time: str,
+    end_time: str,
+    spot_type: str = None,
+    floor: str = None,
+    count: int = 1,
+    db: Session = Depends(get_db)
+):
+    """
+    Best available spots for a time range. Candidates come from the spot
+    catalog (preferred floor first, then front rows) and are checked against
+    the availability index, stopping as soon as `count` are found.
+    """
+    if count < 1 or count > MAX_SEARCH_RESULTS:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_SEARCH_RESULTS}")
+    
+    check_start, check_end, is_now = parse_layout_window(start_time, end_time)
+    if is_now:
+        raise HTTPException(status_code=400, detail="Invalid start_time or end_time")
+    if check_end <= check_start:
+        raise HTTPException(status_code=400, detail="End time must be after start time")
+    
+    catalog = loaded_spot_catalog(db)
+    
+    # Same rule as the create_booking overlap check, so every result can be
+    # booked: an overstay doesn't hold the spot for later windows.
+    if availability_index.loaded:
+        is_free = lambda spot_id: availability_index.is_free(spot_id, check_start, check_end, overstay_blocks=False)
+    else:
+        occupied = query_occupied_spot_ids(db, check_start, check_end, overstay_blocks=False)
+        is_free = lambda spot_id: spot_id not in occupied
+    
+    results = []
+    for spot in catalog.candidates(spot_type, floor):
+        if is_free(spot.id):
+            results.append(SpotCandidate(
+                id=spot.id,
+                floor=spot.floor,
+                row=spot.row,
+                col=spot.col,
+                label=spot.label,
+                spot_type=spot.spot_type,
+                spot_info=format_spot_id(spot.row, spot.col, spot.floor)
+            ))
+            if len(results) == count:
+                break
+    
+    from datetime import timezone
+    return SpotSearchResponse(
+        start_time=check_start.replace(tzinfo=timezone.utc),
+        end_time=check_end.replace(tzinfo=timezone.utc),
+        requested=count,
+        spots=results
+    )
+
+@app.post("/quotes", response_model=QuoteResponse)
+def create_quotes(quote_request: QuoteRequest, db: Session = Depends(get_db)):
+    """
+    Prices many (spot, start, end, promo) tuples in one call, e.g. every free
+    bay on the booking page. Spot types and promos come from in-memory
+    caches and the prices are computed in one vectorized pass. Quotes don't
+    reserve promo uses.
+    """
+    now = datetime.utcnow()
+    hourly_rate = config_cache.get().hourly_rate
+    
+    codes = {item.promo_code.upper() for item in quote_request.items if item.promo_code}
+    promos = {}
+    for code in codes:
+        promo = promo_cache.lookup(db, code)
+        if promo_is_redeemable(promo, now):
+            promos[code] = promo
+    
+    catalog = loaded_spot_catalog(db)
+    results = [QuoteResult(index=i, spot_id=item.spot_id) for i, item in enumerate(quote_request.items)]
+    priced = []  # (index, start, end, spot_type, promo)
+    for i, item in enumerate(quote_request.items):
+        start_time = to_naive_utc(item.start_time)
+        end_time = to_naive_utc(item.end_time)
+        spot = catalog.get(item.spot_id)
+        if spot is None:
+            results[i].error = "Spot not found or not bookable"
+        elif end_time <= start_time:
+            results[i].error = "End time must be after start time"
+        else:
+            priced.append((i, start_time, end_time, spot.spot_type, promos.get(item.promo_code.upper()) if item.promo_code else None))
+    
+    terms = [promo_terms(p[4]) for p in priced]
+    base, discount, total = price_batch(
+        [p[1] for p in priced], [p[2] for p in priced], [p[3] for p in priced], hourly_rate,
+        [t[0] for t in terms], [t[1] for t in terms]
+    )
+    for n, (i, _, _, spot_type, promo) in enumerate(priced):
+        result = results[i]
+        result.spot_type = spot_type
+        result.base_amount = float(base[n])
+        result.discount_amount = float(discount[n])
+        result.total_amount = float(total[n])
+        result.promo_applied = promo is not None
+    
+    return QuoteResponse(hourly_rate=hourly_rate, quotes=results)
+
 @app.get("/admin/config", response_model=List[ConfigItem])
 def get_system_config(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    configs = db.query(SystemConfig).all()
+    configs = db.query(SystemConfig).filter(SystemConfig.key != CONFIG_VERSION_KEY).all()
     return [ConfigItem(key=c.key, value=c.value, description=c.description) for c in configs]
 
 @app.post("/admin/config")
 def update_system_config(update_data: ConfigUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
+    # Maintained by config_cache.bump(); writing it would break version ordering
+    if any(item.key == CONFIG_VERSION_KEY for item in update_data.configs):
+        raise HTTPException(status_code=400, detail=f"{CONFIG_VERSION_KEY} cannot be set directly")
     
     for item in update_data.configs:
         config = db.query(SystemConfig).filter(SystemConfig.key == item.key).first()
@@ -669,9 +981,11 @@ def update_system_config(update_data: ConfigUpdate, current_user: User = Depends
             # Create if not exists
             new_config = SystemConfig(key=item.key, value=item.value, description=item.description)
             db.add(new_config)
-            
-    db.commit()
+    
+    # Other workers notice the new version on their next refresh
+    config_cache.bump(db)
     db.commit()
+    config_cache.load(db)
     return {"message": "Configuration updated successfully"}
 
 @app.get("/config/public")
@@ -680,13 +994,8 @@ def get_public_config(db: Session = Depends(get_db)):
     Fetch public configuration values (e.g. pricing) that don't require auth.
     """
     public_keys = ["hourly_rate", "cancellation_rule_1_hours", "cancellation_rule_2_hours", "cancellation_rule_2_percent"]
-    configs = db.query(SystemConfig).filter(SystemConfig.key.in_(public_keys)).all()
-    
-    result = {}
-    for c in configs:
-        result[c.key] = c.value
-        
-    return result
+    values = config_cache.get().values
+    return {key: values[key] for key in public_keys if key in values}
 
 # Promo Code Models
 class PromoCodeCreate(BaseModel):
@@ -737,6 +1046,7 @@ def create_promo(promo_data: PromoCodeCreate, current_user: User = Depends(get_c
     db.add(new_promo)
     db.commit()
     db.refresh(new_promo)
+    promo_cache.clear()
     
     return PromoCodeResponse(
         id=new_promo.id,
@@ -761,6 +1071,7 @@ def toggle_promo(promo_id: int, current_user: User = Depends(get_current_user),
         
     promo.is_active = not promo.is_active
     db.commit()
+    promo_cache.clear()
     return {"message": f"Promo code {'activated' if promo.is_active else 'deactivated'}", "is_active": promo.is_active}
 
 @app.delete("/admin/promos/{promo_id}")
@@ -774,6 +1085,7 @@ def delete_promo(promo_id: int, current_user: User = Depends(get_current_user),
         
     db.delete(promo)
     db.commit()
+    promo_cache.clear()
     return {"message": "Promo code deleted successfully"}
 
 @app.put("/admin/promos/{promo_id}/update", response_model=PromoCodeResponse)
@@ -800,6 +1112,7 @@ def update_promo(promo_id: int, promo_data: PromoCodeCreate, current_user: User
     
     db.commit()
     db.refresh(promo)
+    promo_cache.clear()
     
     return PromoCodeResponse(
         id=promo.id,
@@ -815,9 +1128,10 @@ def update_promo(promo_id: int, promo_data: PromoCodeCreate, current_user: User
 
 @app.post("/promos/check", response_model=PromoCodeResponse)
 def check_promo_code(code: str, db: Session = Depends(get_db)):
-    promo = db.query(PromoCode).filter(PromoCode.code == code.upper(), PromoCode.is_active == True).first()
+    # Served from the in-memory promo cache (unknown codes are cached too)
+    promo = promo_cache.lookup(db, code)
     
-    if not promo:
+    if not promo or not promo.is_active:
         raise HTTPException(status_code=404, detail="Invalid promo code")
         
     if promo.expiry_date < datetime.utcnow():
@@ -912,6 +1226,32 @@ def create_or_update_vehicle(vehicle_data: VehicleCreate, current_user: User = D
         db.refresh(new_vehicle)
         return new_vehicle
 
+def lock_spots(db: Session, spot_ids: List[int]):
+    """
+    Takes row locks on the given spots for the rest of the transaction.
+    A no-op UPDATE still locks the matched rows (InnoDB row locks, SQLite's
+    write lock), so concurrent bookings for the same spot queue here while
+    other spots stay bookable. Call before the overlap check and commit soon after.
+    """
+    db.query(ParkingSpot).filter(
+        ParkingSpot.id.in_(sorted(set(spot_ids)))
+    ).update({ParkingSpot.booked_by_id: ParkingSpot.booked_by_id}, synchronize_session=False)
+
+def find_overlapping_bookings(db: Session, spot_ids: List[int], start_time: datetime, end_time: datetime):
+    """
+    Live bookings on these spots overlapping [start_time, end_time). Uses a
+    locking read so it sees bookings committed while we waited in lock_spots()
+    rather than the transaction's older snapshot. Pending bookings whose hold
+    has expired no longer count.
+    """
+    return db.query(Booking.id, Booking.spot_id, Booking.start_time, Booking.end_time).filter(
+        Booking.spot_id.in_(spot_ids),
+        Booking.status.in_(['active', 'pending']),
+        holds_spot(datetime.utcnow()),
+        Booking.start_time < end_time,
+        Booking.end_time > start_time
+    ).with_for_update(read=True).all()
+
 def log_booking_audit(db: Session, booking_id: int, user_id: int, action: str, old_status: str = None, new_status: str = None, details: str = None):
     audit_log = BookingAuditLog(
         booking_id=booking_id,
@@ -924,24 +1264,11 @@ def log_booking_audit(db: Session, booking_id: int, user_id: int, action: str, o
     db.add(audit_log)
 
 def calculate_refund_amount(booking: Booking, cancellation_time: datetime, db: Session) -> tuple[float, str]:
-    # Default values
-    rule_1_hours = 24
-    rule_2_hours = 2
-    rule_2_percent = 50
-    
-    # Fetch from DB
-    try:
-        configs = db.query(SystemConfig).all()
-        config_map = {c.key: c.value for c in configs}
-        
-        if "cancellation_rule_1_hours" in config_map:
-            rule_1_hours = int(config_map["cancellation_rule_1_hours"])
-        if "cancellation_rule_2_hours" in config_map:
-            rule_2_hours = int(config_map["cancellation_rule_2_hours"])
-        if "cancellation_rule_2_percent" in config_map:
-            rule_2_percent = float(config_map["cancellation_rule_2_percent"])
-    except Exception as e:
-        print(f"Error fetching config: {e}") 
+    # From the config snapshot (defaults apply when a key is unset)
+    config = config_cache.get()
+    rule_1_hours = config.cancellation_rule_1_hours
+    rule_2_hours = config.cancellation_rule_2_hours
+    rule_2_percent = config.cancellation_rule_2_percent
 
     hours_before_start = (booking.start_time - cancellation_time).total_seconds() / 3600
     
@@ -954,7 +1281,21 @@ def calculate_refund_amount(booking: Booking, cancellation_time: datetime, db: S
         return 0, "No refund - late cancellation"
 
 @app.post("/bookings", response_model=BookingResponse)
-def create_booking(booking_data: BookingCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_booking(
+    booking_data: BookingCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    # Retries with the same key replay the first response instead of booking again
+    if idempotency_key:
+        return idempotency_store.run(
+            db, f"bookings:{current_user.id}", idempotency_key, booking_data,
+            lambda: place_booking(booking_data, current_user, db)
+        )
+    return place_booking(booking_data, current_user, db)
+
+def place_booking(booking_data: BookingCreate, current_user: User, db: Session) -> BookingResponse:
     from datetime import datetime
     
     # Check if spot exists and is available
@@ -997,15 +1338,14 @@ def create_booking(booking_data: BookingCreate, current_user: User = Depends(get
         raise HTTPException(status_code=400, detail="End time must be after start time")
 
     # OVERLAP CHECK
-    # Check if this spot is already booked for the requested duration
-    overlapping_booking = db.query(Booking).filter(
-        Booking.spot_id == spot.id,
-        Booking.status.in_(['active', 'pending']),
-        Booking.start_time < end_time_naive,
-        Booking.end_time > start_time_naive
-    ).first()
+    # Cheap reject from the in-memory index before taking any lock
+    if availability_index.loaded and not availability_index.is_free(spot.id, start_time_naive, end_time_naive):
+        raise HTTPException(status_code=400, detail="This spot is already booked for the selected time range.")
     
-    if overlapping_booking:
+    # Authoritative check under the spot's row lock, so two requests for the
+    # same spot can't both pass it. Bookings on other spots don't wait.
+    lock_spots(db, [spot.id])
+    if find_overlapping_bookings(db, [spot.id], start_time_naive, end_time_naive):
         raise HTTPException(status_code=400, detail="This spot is already booked for the selected time range.")
         
     # Handle vehicle
@@ -1044,47 +1384,21 @@ def create_booking(booking_data: BookingCreate, current_user: User = Depends(get
     
     
     # Calculate Payment (Server-side Authority)
-    # Fetch base rate
-    hourly_rate_config = db.query(SystemConfig).filter(SystemConfig.key == "hourly_rate").first()
-    hourly_rate = float(hourly_rate_config.value) if hourly_rate_config else 10.0
-    
-    # Calculate duration in hours
-    duration_hours = (end_time_naive - start_time_naive).total_seconds() / 3600.0
-    
-    # Apply Spot Type Multiplier
-    multiplier = 1.0
-    if spot.spot_type == 'ev':
-        multiplier = 1.5
-    elif spot.spot_type == 'vip':
-        multiplier = 2.0
-        
-    calculated_base_amount = duration_hours * hourly_rate * multiplier
-    
-    # Round to 2 decimals
-    original_amount = round(calculated_base_amount, 2)
-    
-    final_amount = original_amount
-    discount_amount = 0.0
+    promo = None
     promo_code_id = None
-    
     if booking_data.promo_code:
         promo = db.query(PromoCode).filter(PromoCode.code == booking_data.promo_code.upper(), PromoCode.is_active == True).first()
-        if promo:
-            # Validate again just in case
-            if promo.expiry_date > datetime.utcnow() and promo.current_uses < promo.usage_limit:
-                if promo.discount_type == "percentage":
-                    discount_amount = (original_amount * float(promo.discount_value)) / 100
-                else:
-                    discount_amount = float(promo.discount_value)
-                
-                # Cap discount at original amount (no negative price)
-                discount_amount = min(discount_amount, original_amount)
-                final_amount = original_amount - discount_amount
-                
-                promo_code_id = promo.id
-                
-                # Update usage
-                promo.current_uses += 1
+        # Validate again just in case, then take a use with a conditional
+        # UPDATE (can't oversubscribe; row locked only until the commit below)
+        now = datetime.utcnow()
+        if promo_is_redeemable(promo, now) and redeem_promo(db, promo.id, now):
+            promo_code_id = promo.id
+        else:
+            promo = None
+    
+    quote = price(start_time_naive, end_time_naive, spot.spot_type, config_cache.get().hourly_rate, promo)
+    final_amount = quote.total_amount
+    discount_amount = quote.discount_amount
                 
     # Create detailed booking record
     import uuid
@@ -1104,7 +1418,8 @@ def create_booking(booking_data: BookingCreate, current_user: User = Depends(get
         payment_amount=final_amount,
         discount_amount=discount_amount,
         promo_code_id=promo_code_id,
-        status="pending"
+        status="pending",
+        hold_expires_at=hold_deadline(datetime.utcnow())
     )
     
     db.add(booking)
@@ -1121,6 +1436,8 @@ def create_booking(booking_data: BookingCreate, current_user: User = Depends(get
     
     db.commit()
     db.refresh(booking)
+    booking_changed(booking)
+    hold_queue.schedule(booking.id, booking.hold_expires_at)
     
 
     
@@ -1151,70 +1468,386 @@ def create_booking(booking_data: BookingCreate, current_user: User = Depends(get
         latest_order_id=booking.latest_order_id
     )
 
+def booking_response_options():
+    """
+    Eager loads for everything BookingResponse touches, so a page of N
+    bookings is one joined query instead of 1 + 3N lazy loads.
+    """
+    return (
+        joinedload(Booking.spot),
+        joinedload(Booking.vehicle),
+        joinedload(Booking.promo_code),
+    )
+
+def to_naive_utc(value: datetime) -> datetime:
+    # DB stores naive UTC; clients send ISO strings with Z/offsets
+    from datetime import timezone
+    if value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def build_booking_response(booking: Booking, can_cancel: bool = False) -> BookingResponse:
+    from datetime import timezone
+    return BookingResponse(
+        id=booking.id,
+        booking_uuid=booking.booking_uuid,
+        spot_info=format_spot_id(booking.spot.row, booking.spot.col, booking.spot.floor),
+        name=booking.name,
+        email=booking.email,
+        phone=booking.phone,
+        vehicle=VehicleResponse.model_validate(booking.vehicle),
+        start_time=booking.start_time.replace(tzinfo=timezone.utc),
+        end_time=booking.end_time.replace(tzinfo=timezone.utc),
+        payment_method=booking.payment_method,
+        payment_amount=float(booking.payment_amount),
+        payment_status=booking.payment_status,
+        discount_amount=float(booking.discount_amount),
+        promo_code=booking.promo_code.code if booking.promo_code else None,
+        status=booking.status,
+        refund_status=booking.refund_status,
+        refund_amount=float(booking.refund_amount),
+        excess_fee=float(booking.excess_fee or 0),
+        created_at=booking.created_at.replace(tzinfo=timezone.utc) if booking.created_at else None,
+        can_cancel=can_cancel,
+        latest_order_id=booking.latest_order_id
+    )
+
+def resolve_vehicles(db: Session, plates: List[str], user: User, name: str, phone: str, email: str) -> dict:
+    """
+    Looks up vehicles by plate in one query and bulk-creates the missing ones.
+    Returns {license_plate: Vehicle}.
+    """
+    plates = sorted({p.upper() for p in plates})
+    vehicles = {v.license_plate: v for v in db.query(Vehicle).filter(Vehicle.license_plate.in_(plates)).all()}
+    for vehicle in vehicles.values():
+        # Claim unowned vehicles, as in create_booking
+        if vehicle.user_id is None:
+            vehicle.user_id = user.id
+    missing = [p for p in plates if p not in vehicles]
+    if missing:
+        db.execute(insert(Vehicle), [
+            {"license_plate": p, "owner_name": name, "phone": phone, "email": email, "user_id": user.id}
+            for p in missing
+        ])
+        vehicles.update({v.license_plate: v for v in db.query(Vehicle).filter(Vehicle.license_plate.in_(missing)).all()})
+    return vehicles
+
+def bulk_insert_bookings(db: Session, rows: List[dict], user_id: int, audit_details: List[str]) -> List[Booking]:
+    """
+    Inserts pending bookings and their "created" audit entries with one bulk
+    INSERT each. Rows must carry a pre-generated booking_uuid, which is used to
+    read back the new ids (MySQL has no RETURNING for multi-row inserts).
+    """
+    db.execute(insert(Booking), rows)
+    uuids = [r["booking_uuid"] for r in rows]
+    by_uuid = {
+        b.booking_uuid: b
+        for b in db.query(Booking).options(*booking_response_options()).filter(Booking.booking_uuid.in_(uuids)).all()
+    }
+    bookings = [by_uuid[u] for u in uuids]
+    db.execute(insert(BookingAuditLog), [
+        {
+            "booking_id": b.id,
+            "user_id": user_id,
+            "action": "created",
+            "old_status": None,
+            "new_status": "pending",
+            "details": details
+        }
+        for b, details in zip(bookings, audit_details)
+    ])
+    return bookings
+
+@app.post("/bookings/batch", response_model=BatchBookingResponse)
+def create_batch_booking(batch: BatchBookingCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Books many bays in one transaction (fleet/event bookings). Each item is
+    validated on its own and reported in `results`; items that pass are
+    priced once against the same rate/promo and inserted together.
+    """
+    import uuid
+    from sqlalchemy import tuple_
+    
+    now = datetime.utcnow()
+    errors = {}
+    
+    # 1. Time validation
+    timed = []
+    for i, item in enumerate(batch.items):
+        start_time = to_naive_utc(item.start_time)
+        end_time = to_naive_utc(item.end_time)
+        if start_time < now - timedelta(minutes=5):
+            errors[i] = "Booking start time cannot be in the past"
+        elif end_time <= start_time:
+            errors[i] = "End time must be after start time"
+        else:
+            timed.append((i, item, start_time, end_time))
+    
+    # 2. Resolve every spot in one query
+    keys = {(item.floor, item.row, item.col) for _, item, _, _ in timed}
+    spots = {}
+    if keys:
+        spots = {
+            (s.floor, s.row, s.col): s
+            for s in db.query(ParkingSpot).filter(tuple_(ParkingSpot.floor, ParkingSpot.row, ParkingSpot.col).in_(keys)).all()
+        }
+    candidates = []
+    for i, item, start_time, end_time in timed:
+        spot = spots.get((item.floor, item.row, item.col))
+        if not spot:
+            errors[i] = "Spot not found"
+        elif spot.is_blocked:
+            errors[i] = "Spot is under maintenance"
+        else:
+            candidates.append((i, item, spot, start_time, end_time))
+    
+    # 3. Lock the spots, then one overlap query for the whole batch window.
+    #    Items accepted earlier in the batch block later ones on the same spot.
+    accepted = []
+    if candidates:
+        spot_ids = [spot.id for _, _, spot, _, _ in candidates]
+        lock_spots(db, spot_ids)
+        taken = {}
+        window_start = min(c[3] for c in candidates)
+        window_end = max(c[4] for c in candidates)
+        for _, spot_id, b_start, b_end in find_overlapping_bookings(db, spot_ids, window_start, window_end):
+            taken.setdefault(spot_id, []).append((b_start, b_end))
+        for i, item, spot, start_time, end_time in candidates:
+            intervals = taken.setdefault(spot.id, [])
+            if any(b_start < end_time and b_end > start_time for b_start, b_end in intervals):
+                errors[i] = "This spot is already booked for the selected time range."
+            else:
+                intervals.append((start_time, end_time))
+                accepted.append((i, item, spot, start_time, end_time))
+    
+    bookings_by_index = {}
+    total_amount = 0.0
+    if accepted:
+        vehicles = resolve_vehicles(
+            db, [item.license_plate for _, item, _, _, _ in accepted],
+            current_user, batch.name, batch.phone, batch.email
+        )
+        db.flush()  # vehicle claims, so they don't wait for the commit
+        
+        # 4. Price the whole batch in one pass; the promo covers as many
+        #    items as it has uses left. Redeemed last, right before the
+        #    insert and commit, so the promo row is locked only briefly.
+        promo = None
+        if batch.promo_code:
+            promo = db.query(PromoCode).filter(PromoCode.code == batch.promo_code.upper(), PromoCode.is_active == True).first()
+            if not promo_is_redeemable(promo, now):
+                promo = None
+        promo_uses = redeem_promo_up_to(db, promo.id, now, len(accepted)) if promo else 0
+        _, discounts, totals, promo_applied = price_with_promo(
+            [a[3] for a in accepted], [a[4] for a in accepted], [a[2].spot_type for a in accepted],
+            config_cache.get().hourly_rate, promo, promo_uses
+        )
+        
+        rows = []
+        audit_details = []
+        for n, (i, item, spot, start_time, end_time) in enumerate(accepted):
+            final_amount = float(totals[n])
+            total_amount += final_amount
+            
+            vehicle = vehicles[item.license_plate.upper()]
+            rows.append({
+                "user_id": current_user.id,
+                "spot_id": spot.id,
+                "vehicle_id": vehicle.id,
+                "booking_uuid": str(uuid.uuid4()),
+                "name": batch.name,
+                "email": batch.email,
+                "phone": batch.phone,
+                "start_time": start_time,
+                "end_time": end_time,
+                "payment_method": batch.payment_method,
+                "payment_amount": final_amount,
+                "discount_amount": float(discounts[n]),
+                "promo_code_id": promo.id if promo_applied[n] else None,
+                "status": "pending",
+                "hold_expires_at": hold_deadline(now)
+            })
+            audit_details.append(f"Batch booking created for {vehicle.license_plate}. Amount: {final_amount}")
+        
+        # 5. One bulk insert for bookings, one for the audit trail
+        bookings = bulk_insert_bookings(db, rows, current_user.id, audit_details)
+        db.commit()
+        
+        for (i, _, _, _, _), booking in zip(accepted, bookings):
+            booking_changed(booking)
+            hold_queue.schedule(booking.id, booking.hold_expires_at)
+            bookings_by_index[i] = booking
+    
+    results = []
+    for i in range(len(batch.items)):
+        if i in bookings_by_index:
+            results.append(BatchBookingItemResult(index=i, success=True, booking=build_booking_response(bookings_by_index[i])))
+        else:
+            results.append(BatchBookingItemResult(index=i, success=False, error=errors.get(i)))
+    
+    return BatchBookingResponse(
+        booked=len(bookings_by_index),
+        failed=len(batch.items) - len(bookings_by_index),
+        total_amount=round(total_amount, 2),
+        results=results
+    )
+
+@app.post("/bookings/recurring", response_model=RecurringBookingResponse)
+def create_recurring_booking(rule: RecurringBookingCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Books the same bay on a daily/weekly rule. Occurrences are conflict-checked
+    against existing bookings in one vectorized pass; conflicting dates are
+    reported back and the rest are inserted in one bulk insert. Each
+    occurrence is paid on its own and holds its spot until shortly before it
+    starts (occurrence_hold_deadline), so unpaid later dates don't expire
+    with the first one.
+    """
+    import uuid
+    from datetime import timezone
+    
+    # Dates are walked in the start's timezone; a naive time is UTC, so an
+    # aware/naive pair is compared (and expanded) in one frame
+    start_time = rule.start_time
+    end_time = to_naive_utc(rule.end_time)
+    if start_time.tzinfo:
+        end_time = end_time.replace(tzinfo=timezone.utc).astimezone(start_time.tzinfo)
+    if to_naive_utc(end_time) <= to_naive_utc(start_time):
+        raise HTTPException(status_code=400, detail="End time must be after start time")
+    if to_naive_utc(start_time) < datetime.utcnow() - timedelta(minutes=5):
+        raise HTTPException(status_code=400, detail="Booking start time cannot be in the past")
+    if rule.weekdays is not None and (not rule.weekdays or any(d < 0 or d > 6 for d in rule.weekdays)):
+        raise HTTPException(status_code=400, detail="weekdays must be values from 0 (Mon) to 6 (Sun)")
+    
+    try:
+        occurrences = expand_occurrences(
+            start_time, end_time, rule.frequency, rule.until,
+            interval=rule.interval, weekdays=rule.weekdays
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not occurrences:
+        raise HTTPException(status_code=400, detail="Recurrence rule produces no occurrences")
+    occurrences = [(to_naive_utc(s), to_naive_utc(e)) for s, e in occurrences]
+    starts = to_datetime64([s for s, _ in occurrences])
+    ends = to_datetime64([e for _, e in occurrences])
+    if np.any(starts[1:] < ends[:-1]):
+        raise HTTPException(status_code=400, detail="Occurrences overlap each other; shorten the booking or widen the interval")
+    
+    spot = db.query(ParkingSpot).filter(
+        ParkingSpot.row == rule.row,
+        ParkingSpot.col == rule.col,
+        ParkingSpot.floor == rule.floor
+    ).first()
+    if not spot:
+        raise HTTPException(status_code=404, detail="Spot not found")
+    if spot.is_blocked:
+        raise HTTPException(status_code=400, detail="Spot is under maintenance")
+    
+    # One lock, one overlap query spanning the whole series, one vectorized check
+    lock_spots(db, [spot.id])
+    existing = find_overlapping_bookings(db, [spot.id], occurrences[0][0], occurrences[-1][1])
+    conflicts_mask = conflicting_occurrences(
+        starts, ends,
+        to_datetime64([b.start_time for b in existing]),
+        to_datetime64([b.end_time for b in existing])
+    )
+    
+    conflicts = [
+        RecurringConflict(
+            start_time=s.replace(tzinfo=timezone.utc),
+            end_time=e.replace(tzinfo=timezone.utc),
+            reason="This spot is already booked for the selected time range."
+        )
+        for (s, e), clash in zip(occurrences, conflicts_mask) if clash
+    ]
+    free = [occ for occ, clash in zip(occurrences, conflicts_mask) if not clash]
+    if not free:
+        db.rollback()
+        return RecurringBookingResponse(booked=0, total_amount=0.0, bookings=[], conflicts=conflicts)
+    
+    promo = None
+    if rule.promo_code:
+        promo = db.query(PromoCode).filter(PromoCode.code == rule.promo_code.upper(), PromoCode.is_active == True).first()
+        if not promo_is_redeemable(promo, datetime.utcnow()):
+            promo = None
+    promo_uses = redeem_promo_up_to(db, promo.id, datetime.utcnow(), len(free)) if promo else 0
+    _, discounts, totals, promo_applied = price_with_promo(
+        [s for s, _ in free], [e for _, e in free], [spot.spot_type] * len(free),
+        config_cache.get().hourly_rate, promo, promo_uses
+    )
+    
+    vehicle = resolve_vehicles(db, [rule.license_plate], current_user, rule.name, rule.phone, rule.email)[rule.license_plate.upper()]
+    
+    rows = []
+    audit_details = []
+    total_amount = 0.0
+    now = datetime.utcnow()
+    for n, (start_time, end_time) in enumerate(free):
+        final_amount = float(totals[n])
+        total_amount += final_amount
+        rows.append({
+            "user_id": current_user.id,
+            "spot_id": spot.id,
+            "vehicle_id": vehicle.id,
+            "booking_uuid": str(uuid.uuid4()),
+            "name": rule.name,
+            "email": rule.email,
+            "phone": rule.phone,
+            "start_time": start_time,
+            "end_time": end_time,
+            "payment_method": rule.payment_method,
+            "payment_amount": final_amount,
+            "discount_amount": float(discounts[n]),
+            "promo_code_id": promo.id if promo_applied[n] else None,
+            "status": "pending",
+            "hold_expires_at": occurrence_hold_deadline(now, start_time)
+        })
+        audit_details.append(f"Recurring booking {n + 1}/{len(free)} ({rule.frequency}) created for {vehicle.license_plate}. Amount: {final_amount}")
+    
+    bookings = bulk_insert_bookings(db, rows, current_user.id, audit_details)
+    db.commit()
+    
+    for booking in bookings:
+        booking_changed(booking)
+        hold_queue.schedule(booking.id, booking.hold_expires_at)
+    
+    return RecurringBookingResponse(
+        booked=len(bookings),
+        total_amount=round(total_amount, 2),
+        bookings=[build_booking_response(b) for b in bookings],
+        conflicts=conflicts
+    )
+
 @app.get("/bookings", response_model=PaginatedBookingResponse)
 def get_user_bookings(
     page: int = 1,
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
-    from datetime import datetime, timezone
-    
     query = db.query(Booking).filter(
         Booking.user_id == current_user.id
     )
     
+    # Per-user count is an index range scan on (user_id, created_at, id)
     total = query.count()
     total_pages = math.ceil(total / limit)
     
-    bookings = query.order_by(Booking.created_at.desc())\
-        .offset((page - 1) * limit)\
-        .limit(limit)\
-        .all()
+    rows, next_cursor = paginate_bookings(
+        booking_rows(db).filter(Booking.user_id == current_user.id), limit, page, cursor
+    )
     
-    result = []
-    for booking in bookings:
-        can_cancel = (
-            (booking.status == "active" or booking.status == "pending") and 
-            booking.start_time > datetime.utcnow()
-        )
-        
-        # Ensure times are sent as UTC (ISO string with Z)
-        # DB stores naive UTC, so we must attach UTC tzinfo
-        response_start = booking.start_time.replace(tzinfo=timezone.utc)
-        response_end = booking.end_time.replace(tzinfo=timezone.utc)
-        response_created = booking.created_at.replace(tzinfo=timezone.utc) if booking.created_at else None
-        
-        result.append(BookingResponse(
-            id=booking.id,
-            booking_uuid=booking.booking_uuid,
-            spot_info=format_spot_id(booking.spot.row, booking.spot.col, booking.spot.floor),
-            name=booking.name,
-            email=booking.email,
-            phone=booking.phone,
-            vehicle=VehicleResponse.model_validate(booking.vehicle),
-            start_time=response_start,
-            end_time=response_end,
-            payment_method=booking.payment_method,
-            payment_amount=float(booking.payment_amount),
-            payment_status=booking.payment_status,
-            discount_amount=float(booking.discount_amount),
-            promo_code=booking.promo_code.code if booking.promo_code else None,
-            status=booking.status,
-            refund_status=booking.refund_status,
-            refund_amount=float(booking.refund_amount),
-            excess_fee=float(booking.excess_fee or 0),
-            created_at=response_created,
-            can_cancel=can_cancel,
-            latest_order_id=booking.latest_order_id
-        ))
+    now = datetime.utcnow()
+    items = [
+        booking_json(row, can_cancel=row.status in ("active", "pending") and row.start_time > now)
+        for row in rows
+    ]
     
-    return PaginatedBookingResponse(
-        items=result,
-        total=total,
-        page=page,
-        size=limit,
-        pages=total_pages
+    # Rows go straight to JSON bytes; the response_model is documentation only
+    return Response(
+        content=dumps(paginated_json(items, total, page, limit, total_pages, next_cursor)),
+        media_type="application/json"
     )
 
 
@@ -1231,21 +1864,19 @@ def close_booking(booking_id: int, current_user: User = Depends(get_current_user
     if booking.status != "active":
         raise HTTPException(status_code=400, detail=f"Booking is {booking.status}, cannot close.")
 
-    from datetime import datetime, timezone
     now = datetime.utcnow()
     
-    excess_fee = 0.0
-    if now > booking.end_time:
-        duration_over = (now - booking.end_time).total_seconds() / 3600
-        import math
-        hours_over = math.ceil(duration_over)
-        excess_fee = float(hours_over * 10.0)
+    excess_fee = overstay_fee(
+        booking.end_time, now, config_cache.get().hourly_rate,
+        booking.spot.spot_type if booking.spot else None
+    )
     
     booking.status = "completed"
     booking.excess_fee = excess_fee
     
     db.commit()
     db.refresh(booking)
+    booking_changed(booking)
     
 
     
@@ -1255,121 +1886,83 @@ def close_booking(booking_id: int, current_user: User = Depends(get_current_user
         "active", "completed", f"Admin closed booking. Excess Fee: {excess_fee}"
     )
 
-    response_start = booking.start_time.replace(tzinfo=timezone.utc)
-    response_end = booking.end_time.replace(tzinfo=timezone.utc)
-    response_created = booking.created_at.replace(tzinfo=timezone.utc) if booking.created_at else None
-
-    return BookingResponse(
-        id=booking.id,
-        booking_uuid=booking.booking_uuid,
-        spot_info=format_spot_id(booking.spot.row, booking.spot.col, booking.spot.floor),
-        name=booking.name,
-        email=booking.email,
-        phone=booking.phone,
-        vehicle=VehicleResponse.model_validate(booking.vehicle),
-        start_time=response_start,
-        end_time=response_end,
-        payment_method=booking.payment_method,
-        payment_amount=float(booking.payment_amount),
-        payment_status=booking.payment_status,
-        discount_amount=float(booking.discount_amount),
-        promo_code=booking.promo_code.code if booking.promo_code else None,
-        status=booking.status,
-        refund_status=booking.refund_status,
-        refund_amount=float(booking.refund_amount),
-        excess_fee=float(booking.excess_fee),
-        created_at=response_created,
-        can_cancel=False,
-        latest_order_id=booking.latest_order_id
-    )
+    row = booking_rows(db).filter(Booking.id == booking.id).one()
+    return Response(content=dumps(booking_json(row)), media_type="application/json")
 
 @app.get("/admin/bookings", response_model=PaginatedBookingResponse)
 def get_all_bookings(
     page: int = 1,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    filters: BookingFilters = Depends(),
     current_user: User = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    from datetime import datetime, timezone
+    # Filtering happens in SQL on indexed columns, not in the dashboard
+    query = filters.apply(db.query(Booking))
     
-    query = db.query(Booking)
-    
-    total = query.count()
+    # Counting is the expensive part; cache it briefly per filter set
+    total = booking_counts.get(("all", filters.cache_key()), query.count)
     total_pages = math.ceil(total / limit)
         
-    bookings = query.order_by(Booking.created_at.desc())\
-        .offset((page - 1) * limit)\
-        .limit(limit)\
-        .all()
+    rows, next_cursor = paginate_bookings(filters.apply(booking_rows(db)), limit, page, cursor)
     
     # Fetch hourly rate once
-    hourly_rate_config = db.query(SystemConfig).filter(SystemConfig.key == "hourly_rate").first()
-    base_rate = float(hourly_rate_config.value) if hourly_rate_config else 10.0
-
-    result = []
-    current_time_utc = datetime.utcnow()
+    base_rate = config_cache.get().hourly_rate
 
-    for booking in bookings:
-        can_cancel = (
-            (booking.status == "active" or booking.status == "pending") and 
-            booking.start_time > datetime.utcnow()
-        )
-        
-        # Ensure times are sent as UTC
-        response_start = booking.start_time.replace(tzinfo=timezone.utc)
-        response_end = booking.end_time.replace(tzinfo=timezone.utc)
-        response_created = booking.created_at.replace(tzinfo=timezone.utc) if booking.created_at else None
-        
-        # Calculate Estimated Excess Fee for Active Bookings
+    now = datetime.utcnow()
+    items = []
+    for row in rows:
+        # Estimated excess fee for active bookings
         estimated_excess_fee = 0.0
-        if booking.status == "active":
-            booking_end_utc = booking.end_time if not booking.end_time.tzinfo else booking.end_time.replace(tzinfo=None)
-            if current_time_utc > booking_end_utc:
-                diff_seconds = (current_time_utc - booking_end_utc).total_seconds()
-                overstay_hours = math.ceil(diff_seconds / 3600.0)
-                
-                multiplier = 1.0
-                if booking.spot and booking.spot.spot_type == 'ev':
-                    multiplier = 1.5
-                elif booking.spot and booking.spot.spot_type == 'vip':
-                    multiplier = 2.0
-                
-                estimated_excess_fee = overstay_hours * base_rate * multiplier
-
-        result.append(BookingResponse(
-            id=booking.id,
-            booking_uuid=booking.booking_uuid,
-            spot_info=format_spot_id(booking.spot.row, booking.spot.col, booking.spot.floor),
-            name=booking.name,
-            email=booking.email,
-            phone=booking.phone,
-            vehicle=VehicleResponse.model_validate(booking.vehicle),
-            start_time=response_start,
-            end_time=response_end,
-            payment_method=booking.payment_method,
-            payment_amount=float(booking.payment_amount),
-            payment_status=booking.payment_status,
-            discount_amount=float(booking.discount_amount),
-            promo_code=booking.promo_code.code if booking.promo_code else None,
-            status=booking.status,
-            refund_status=booking.refund_status,
-            refund_amount=float(booking.refund_amount),
-            excess_fee=float(booking.excess_fee) if booking.excess_fee else 0.0,
-            estimated_excess_fee=estimated_excess_fee,
-            created_at=response_created,
-            can_cancel=can_cancel,
-            latest_order_id=booking.latest_order_id
+        if row.status == "active":
+            estimated_excess_fee = overstay_fee(row.end_time, now, base_rate, row.spot_type)
+        items.append(booking_json(
+            row,
+            can_cancel=row.status in ("active", "pending") and row.start_time > now,
+            estimated_excess_fee=estimated_excess_fee
         ))
     
-    return PaginatedBookingResponse(
-        items=result,
-        total=total,
-        page=page,
-        size=limit,
-        pages=total_pages
+    return Response(
+        content=dumps(paginated_json(items, total, page, limit, total_pages, next_cursor)),
+        media_type="application/json"
+    )
+
+@app.get("/admin/bookings/export")
+def export_bookings(
+    format: str = "csv",
+    gzip: bool = False,
+    filters: BookingFilters = Depends(),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Streams the (filtered) booking history as CSV or NDJSON for finance,
+    read in chunks through a server-side cursor. Memory stays flat however
+    many rows match.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    
+    chunks = export_chunks(db, filters)
+    if format == "csv":
+        body, media_type = csv_lines(chunks), "text/csv"
+    else:
+        body, media_type = ndjson_lines(chunks), "application/x-ndjson"
+    
+    filename = f"bookings_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format}"
+    if gzip:
+        body, media_type, filename = gzipped(body), "application/gzip", filename + ".gz"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @app.get("/bookings/{booking_id}/receipt")
@@ -1435,6 +2028,7 @@ def cancel_booking(
     booking.cancellation_time = current_time
     
     db.commit()
+    booking_changed(booking)
     
     # Send Cancellation Email
     try:
@@ -1454,12 +2048,15 @@ def cancel_booking(
                     
                     <p>We hope to see you again soon.</p>
                 """
-                send_email(
-                    booking.email,
-                    "Booking Cancelled - ParkPro",
-                    html_body,
-                    is_html=True
-                 )
+                with db.begin_nested():
+                    enqueue_email(
+                        db,
+                        booking.email,
+                        "Booking Cancelled - ParkPro",
+                        html_body,
+                        is_html=True,
+                        dedupe_key=f"booking-cancelled:{booking.id}"
+                     )
     except Exception as e:
         print(f"Failed to send cancellation email: {e}")
         
@@ -1497,20 +2094,19 @@ def cancel_booking(
             
             <p>We hope to see you again soon.</p>
         """
-        send_email(
-            booking.user.email,
-            "Booking Cancelled - ParkPro",
-            html_body_user,
-            is_html=True
-        )
+        with db.begin_nested():
+            enqueue_email(
+                db,
+                booking.user.email,
+                "Booking Cancelled - ParkPro",
+                html_body_user,
+                is_html=True,
+                dedupe_key=f"booking-cancelled:{booking.id}"
+            )
         
         # Send Email to Admin(s)
-        # Fetch from DB Config first, fallback to Env
-        admin_emails_config = db.query(SystemConfig).filter(SystemConfig.key == "admin_notification_emails").first()
-        
-        admin_emails = []
-        if admin_emails_config and admin_emails_config.value:
-            admin_emails = [e.strip() for e in admin_emails_config.value.split(",") if e.strip()]
+        # From the config snapshot first, fallback to Env
+        admin_emails = list(config_cache.get().admin_notification_emails)
         
         if not admin_emails:
             # Fallback to env or sender
@@ -1522,11 +2118,14 @@ def cancel_booking(
                 
         for email in admin_emails:
             if email: # Safety check
-                send_email(
-                    email,
-                    f"Booking Cancelled: #{booking.id}",
-                    f"Admin Alert:\n\nUser {booking.user.username} (Email: {booking.user.email}) has cancelled booking #{booking.id}.\n\nReason: {cancel_data.cancellation_reason or 'Not provided'}\nRefund: MYR {refund_amount:.2f} ({refund_reason})\nTime: {datetime.utcnow()}"
-                )
+                with db.begin_nested():
+                    enqueue_email(
+                        db,
+                        email,
+                        f"Booking Cancelled: #{booking.id}",
+                        f"Admin Alert:\n\nUser {booking.user.username} (Email: {booking.user.email}) has cancelled booking #{booking.id}.\n\nReason: {cancel_data.cancellation_reason or 'Not provided'}\nRefund: MYR {refund_amount:.2f} ({refund_reason})\nTime: {datetime.utcnow()}",
+                        dedupe_key=f"booking-cancelled-admin:{booking.id}"
+                    )
     except Exception as e:
         print(f"Failed to send cancellation emails: {e}")
 
@@ -1673,21 +2272,14 @@ def calculate_exit_fee(booking_id: int, current_user: User = Depends(get_current
     message = "On time departure"
     
     # Get Rate
-    hourly_rate_config = db.query(SystemConfig).filter(SystemConfig.key == "hourly_rate").first()
-    base_rate = float(hourly_rate_config.value) if hourly_rate_config else 10.0
+    base_rate = config_cache.get().hourly_rate
     
-    # Get Multiplier
-    multiplier = 1.0
-    if booking.spot and booking.spot.spot_type == 'ev':
-        multiplier = 1.5
-    elif booking.spot and booking.spot.spot_type == 'vip':
-        multiplier = 2.0
+    spot_type = booking.spot.spot_type if booking.spot else None
+    multiplier = spot_multiplier(spot_type)
     
     if actual_end > booked_end:
-        diff_seconds = (actual_end - booked_end).total_seconds()
-        overstay_hours = math.ceil(diff_seconds / 3600.0)
-        
-        extra_fee = overstay_hours * base_rate * multiplier
+        overstay_hours = pricing_overstay_hours(booked_end, actual_end)
+        extra_fee = overstay_fee(booked_end, actual_end, base_rate, spot_type)
         message = f"Overstayed by {int(overstay_hours)} hour(s)"
         
     return ExitCalculationResponse(
@@ -1741,6 +2333,7 @@ def complete_booking_admin(booking_id: int, req: CompleteBookingRequest, current
     ))
     
     db.commit()
+    booking_changed(booking)
     return {"message": "Booking completed successfully", "total_amount": final_amount}
 
 @app.post("/admin/bookings/{booking_id}/notify-overstay")
@@ -1763,21 +2356,13 @@ def notify_overstay(booking_id: int, current_user: User = Depends(get_current_us
     if actual_end_time <= booked_end_time:
          raise HTTPException(status_code=400, detail="Booking has not expired yet")
          
-    overstay_duration = actual_end_time - booked_end_time
-    overstay_hours = math.ceil(overstay_duration.total_seconds() / 3600.0)
-    
-    # Get config (redundant fetch but safe)
-    hourly_rate_config = db.query(SystemConfig).filter(SystemConfig.key == "hourly_rate").first()
-    base_rate = float(hourly_rate_config.value) if hourly_rate_config else 10.0
-    
-    # Simple multiplier logic for fee preview in email
-    multiplier = 1.0
-    if booking.spot and booking.spot.spot_type == 'ev':
-        multiplier = 1.5
-    elif booking.spot and booking.spot.spot_type == 'vip':
-        multiplier = 2.0
-            
-    excess_fee = overstay_hours * base_rate * multiplier
+    overstay_hours = pricing_overstay_hours(booked_end_time, actual_end_time)
+    
+    # Fee preview for the email
+    excess_fee = overstay_fee(
+        booked_end_time, actual_end_time, config_cache.get().hourly_rate,
+        booking.spot.spot_type if booking.spot else None
+    )
     
     if booking.user and booking.user.email:
         html_body = f"""
@@ -1797,12 +2382,14 @@ def notify_overstay(booking_id: int, current_user: User = Depends(get_current_us
             <p>Please return to your vehicle and checkout immediately.</p>
             <center><a href="{FRONTEND_URL}/my-bookings" class="btn" style="background-color: #ef4444;">Pay Now</a></center>
         """
-        send_email(
+        enqueue_email(
+            db,
             booking.user.email,
             "Urgent: Parking Overstay Fee Notification",
             html_body,
             is_html=True
         )
+        db.commit()
         return {"message": "Notification email sent successfully", "excess_fee": excess_fee}
     else:
         raise HTTPException(status_code=400, detail="User email not found")
@@ -1841,12 +2428,14 @@ def forgot_password(req: PasswordResetRequest, db: Session = Depends(get_db)):
             <p style="font-size: 14px;">This OTP is valid for <strong>15 minutes</strong>.</p>
             <p style="font-size: 14px; color: #6b7280;">If you did not request this, please ignore this email.</p>
         """
-        send_email(
+        enqueue_email(
+            db,
             req.email,
             "Password Reset OTP - ParkPro",
             html_body,
             is_html=True
         )
+        db.commit()
     except Exception as e:
         print(f"Failed to send OTP: {e}")
         
@@ -1937,12 +2526,15 @@ def process_manual_refund(
             
             <p>It should appear in your account shortly.</p>
         """
-        send_email(
-            booking.user.email,
-            "Refund Processed - ParkPro",
-            html_body,
-            is_html=True
-         )
+        with db.begin_nested():
+            enqueue_email(
+                db,
+                booking.user.email,
+                "Refund Processed - ParkPro",
+                html_body,
+                is_html=True,
+                dedupe_key=f"refund-processed:{booking.id}"
+             )
     except Exception as e:
         print(f"Failed to send refund email: {e}")
         
@@ -0,0 +1,49 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME")
+BOOKING_HOLD_MINUTES = int(os.getenv("BOOKING_HOLD_MINUTES", "15"))
+
+SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def migrate():
+    db = SessionLocal()
+    try:
+        print("Checking for hold_expires_at column...")
+        try:
+            db.execute(text("SELECT hold_expires_at FROM bookings LIMIT 1"))
+            print("Column hold_expires_at already exists.")
+        except Exception:
+            print("Column missing. Adding hold_expires_at column...")
+            db.execute(text("ALTER TABLE bookings ADD COLUMN hold_expires_at DATETIME NULL"))
+            db.execute(text("CREATE INDEX ix_bookings_hold_expires_at ON bookings (hold_expires_at)"))
+            db.commit()
+            print("Column added.")
+
+        # Existing pending bookings keep the old 15-minute window from creation
+        result = db.execute(text(
+            "UPDATE bookings SET hold_expires_at = DATE_ADD(created_at, INTERVAL :minutes MINUTE) "
+            "WHERE status = 'pending' AND hold_expires_at IS NULL"
+        ), {"minutes": BOOKING_HOLD_MINUTES})
+        db.commit()
+        print(f"Backfilled {result.rowcount} pending holds.")
+            
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,54 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME")
+
+SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Composite indexes for keyset pagination of booking lists (newest first)
+# and the admin list filters
+INDEXES = {
+    "ix_bookings_created_at_id": "CREATE INDEX ix_bookings_created_at_id ON bookings (created_at, id)",
+    "ix_bookings_user_created_at_id": "CREATE INDEX ix_bookings_user_created_at_id ON bookings (user_id, created_at, id)",
+    "ix_bookings_status_created_at_id": "CREATE INDEX ix_bookings_status_created_at_id ON bookings (status, created_at, id)",
+    "ix_bookings_payment_status_created_at_id": "CREATE INDEX ix_bookings_payment_status_created_at_id ON bookings (payment_status, created_at, id)",
+    "ix_bookings_refund_status_created_at_id": "CREATE INDEX ix_bookings_refund_status_created_at_id ON bookings (refund_status, created_at, id)",
+    "ix_bookings_email_created_at_id": "CREATE INDEX ix_bookings_email_created_at_id ON bookings (email, created_at, id)",
+    "ix_bookings_status_end_time": "CREATE INDEX ix_bookings_status_end_time ON bookings (status, end_time)",
+    "ix_bookings_spot_start_time": "CREATE INDEX ix_bookings_spot_start_time ON bookings (spot_id, start_time)",
+    "ix_bookings_start_time": "CREATE INDEX ix_bookings_start_time ON bookings (start_time)",
+    "ix_bookings_end_time": "CREATE INDEX ix_bookings_end_time ON bookings (end_time)",
+}
+
+def migrate():
+    db = SessionLocal()
+    try:
+        existing = {ix["name"] for ix in inspect(engine).get_indexes("bookings")}
+        for name, ddl in INDEXES.items():
+            if name in existing:
+                print(f"Index {name} already exists.")
+                continue
+            print(f"Creating index {name}...")
+            db.execute(text(ddl))
+            db.commit()
+            print("Index created.")
+            
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_NAME = os.getenv("DB_NAME")
+
+SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+INDEX_NAME = "uq_parking_spots_floor_row_col"
+
+def migrate():
+    db = SessionLocal()
+    try:
+        existing = {ix["name"] for ix in inspect(engine).get_indexes("parking_spots")}
+        if INDEX_NAME in existing:
+            print(f"Index {INDEX_NAME} already exists.")
+            return
+
+        # Pre-multilevel rows count as Ground, like the model default
+        result = db.execute(text("UPDATE parking_spots SET floor = 'Ground' WHERE floor IS NULL"))
+        print(f"Set floor on {result.rowcount} spots.")
+
+        # Workers provisioning the same floor at once could insert a cell twice.
+        # Keep the oldest spot per cell and move any bookings onto it.
+        rows = db.execute(text("""
+            SELECT s.id, k.keep_id
+            FROM parking_spots s
+            JOIN (SELECT floor, `row`, col, MIN(id) AS keep_id
+                  FROM parking_spots GROUP BY floor, `row`, col HAVING COUNT(*) > 1) k
+              ON s.floor = k.floor AND s.`row` = k.`row` AND s.col = k.col
+            WHERE s.id <> k.keep_id
+        """)).fetchall()
+        for dup_id, keep_id in rows:
+            db.execute(text("UPDATE bookings SET spot_id = :keep WHERE spot_id = :dup"), {"keep": keep_id, "dup": dup_id})
+            db.execute(text("DELETE FROM parking_spots WHERE id = :dup"), {"dup": dup_id})
+        print(f"Removed {len(rows)} duplicate spots.")
+        db.commit()
+
+        print(f"Creating index {INDEX_NAME}...")
+        db.execute(text(f"CREATE UNIQUE INDEX {INDEX_NAME} ON parking_spots (floor, `row`, col)"))
+        db.commit()
+        print("Index created.")
+            
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
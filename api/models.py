@@ -1,9 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Numeric, Enum
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Numeric, Enum, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Literal, Optional
+from datetime import date, datetime
 from enum import Enum as PyEnum
 
 Base = declarative_base()
@@ -41,6 +41,11 @@ class ParkingSpot(Base):
 
     booked_by = relationship("User")
 
+    __table_args__ = (
+        # One spot per grid cell, however many workers provision the floor
+        UniqueConstraint("floor", "row", "col", name="uq_parking_spots_floor_row_col"),
+    )
+
 class BookingStatus(PyEnum):
     PENDING = "pending"
     ACTIVE = "active"
@@ -119,6 +124,22 @@ class Booking(Base):
     is_pre_alert_sent = Column(Boolean, default=False)
     is_expiry_alert_sent = Column(Boolean, default=False)
     last_overstay_sent_at = Column(DateTime, nullable=True)
+    hold_expires_at = Column(DateTime, nullable=True, index=True) # pending bookings stop holding the spot after this
+
+    __table_args__ = (
+        # Keyset pagination: newest first, id as tie-breaker
+        Index("ix_bookings_created_at_id", "created_at", "id"),
+        Index("ix_bookings_user_created_at_id", "user_id", "created_at", "id"),
+        # Admin list filters (utils/booking_filters.py), newest first within each
+        Index("ix_bookings_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_bookings_payment_status_created_at_id", "payment_status", "created_at", "id"),
+        Index("ix_bookings_refund_status_created_at_id", "refund_status", "created_at", "id"),
+        Index("ix_bookings_email_created_at_id", "email", "created_at", "id"),
+        Index("ix_bookings_status_end_time", "status", "end_time"),
+        Index("ix_bookings_spot_start_time", "spot_id", "start_time"),
+        Index("ix_bookings_start_time", "start_time"),
+        Index("ix_bookings_end_time", "end_time"),
+    )
 
 class BookingAuditLog(Base):
     __tablename__ = "booking_audit_log"
@@ -151,6 +172,37 @@ class PasswordReset(Base):
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    id = Column(Integer, primary_key=True, index=True)
+    key_hash = Column(String(64), unique=True, nullable=False) # sha256 of scope + client key
+    fingerprint = Column(String(64), nullable=False) # sha256 of the request payload
+    status_code = Column(Integer, nullable=True) # NULL while the first request is in flight
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    dedupe_key = Column(String(64), unique=True, nullable=True) # sha256 of caller key + recipient; NULL = never deduped
+    to_email = Column(String(100), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    is_html = Column(Boolean, default=False)
+    status = Column(String(20), default="pending") # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=False) # retry time; lease expiry while sending
+    lease_token = Column(String(32), nullable=True) # identifies the sender batch holding a 'sending' row
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Sender claim scan: due rows in arrival order
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
 
 
 # Pydantic Schemas
@@ -201,6 +253,60 @@ class ParkingState(BaseModel):
     cols: int
     spots: List[SpotSchema]
 
+class FloorSummary(BaseModel):
+    # Counts keyed by spot_type (standard, ev, vip)
+    free: Dict[str, int]
+    booked: Dict[str, int]
+    blocked: Dict[str, int]
+
+class FloorLayout(BaseModel):
+    floor: str
+    rows: int
+    cols: int
+    spots: List[SpotSchema]
+    summary: FloorSummary
+
+class MultiFloorLayoutResponse(BaseModel):
+    floors: List[FloorLayout]
+
+class SpotCandidate(BaseModel):
+    id: int
+    floor: str
+    row: int
+    col: int
+    label: str = ""
+    spot_type: str = "standard"
+    spot_info: str
+
+class SpotSearchResponse(BaseModel):
+    start_time: datetime
+    end_time: datetime
+    requested: int
+    spots: List[SpotCandidate]
+
+class QuoteItem(BaseModel):
+    spot_id: int
+    start_time: datetime
+    end_time: datetime
+    promo_code: Optional[str] = None
+
+class QuoteRequest(BaseModel):
+    items: List[QuoteItem] = Field(..., min_length=1, max_length=1000)
+
+class QuoteResult(BaseModel):
+    index: int
+    spot_id: int
+    spot_type: Optional[str] = None
+    base_amount: float = 0.0
+    discount_amount: float = 0.0
+    total_amount: float = 0.0
+    promo_applied: bool = False
+    error: Optional[str] = None
+
+class QuoteResponse(BaseModel):
+    hourly_rate: float
+    quotes: List[QuoteResult]
+
 class LayoutConfig(BaseModel):
     rows: int
     cols: int
@@ -296,6 +402,62 @@ class BookingResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BatchBookingItem(BaseModel):
+    row: int
+    col: int
+    floor: Optional[str] = "Ground"
+    license_plate: str
+    start_time: datetime
+    end_time: datetime
+
+class BatchBookingCreate(BaseModel):
+    name: str
+    email: str
+    phone: str
+    payment_method: str
+    promo_code: Optional[str] = None
+    items: List[BatchBookingItem] = Field(..., min_length=1, max_length=200)
+
+class BatchBookingItemResult(BaseModel):
+    index: int
+    success: bool
+    booking: Optional[BookingResponse] = None
+    error: Optional[str] = None
+
+class BatchBookingResponse(BaseModel):
+    booked: int
+    failed: int
+    total_amount: float
+    results: List[BatchBookingItemResult]
+
+class RecurringBookingCreate(BaseModel):
+    row: int
+    col: int
+    floor: Optional[str] = "Ground"
+    license_plate: str
+    name: str
+    email: str
+    phone: str
+    start_time: datetime  # first occurrence
+    end_time: datetime
+    frequency: Literal["daily", "weekly"]
+    interval: int = Field(1, ge=1, le=52)
+    weekdays: Optional[List[int]] = None  # 0=Mon .. 6=Sun
+    until: date  # last date an occurrence may start on
+    payment_method: str
+    promo_code: Optional[str] = None
+
+class RecurringConflict(BaseModel):
+    start_time: datetime
+    end_time: datetime
+    reason: str
+
+class RecurringBookingResponse(BaseModel):
+    booked: int
+    total_amount: float
+    bookings: List[BookingResponse]
+    conflicts: List[RecurringConflict]
+
 class CancelBookingRequest(BaseModel):
     cancellation_reason: Optional[str] = None
 
@@ -310,6 +472,25 @@ class AnalyticsResponse(BaseModel):
     revenue_chart: List[ChartData]
     occupancy_chart: List[ChartData]
 
+class FloorOccupancy(BaseModel):
+    floor: str
+    rows: int
+    cols: int
+    capacity: int
+    spot_ids: List[int]
+    spot_labels: List[str]
+    occupied: List[int] # occupied spot count per slot
+    peak_occupied: int
+    peak_slot: Optional[datetime] = None
+    occupancy: Optional[List[List[int]]] = None # spot x slot, 1 = occupied
+
+class OccupancyHeatmapResponse(BaseModel):
+    window_start: datetime
+    window_end: datetime
+    slot_minutes: int
+    slots: List[datetime]
+    floors: List[FloorOccupancy]
+
 class BookingRequest(BaseModel):
     row: int
     col: int
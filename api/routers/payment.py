@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Booking, BookingStatus
 from services.ringgitpay import ringgitpay_service
 from datetime import datetime
+from typing import Optional
 import os
-from utils.email import send_email
+from services.email_outbox import enqueue_email
 from utils.common import format_spot_id
+from services.lot_events import booking_changed
+from services.idempotency import idempotency_store
 
 router = APIRouter(prefix="/payment", tags=["payment"])
 
@@ -15,7 +19,16 @@ API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
 @router.post("/initiate/{booking_id}")
-def initiate_payment(booking_id: int, db: Session = Depends(get_db)):
+def initiate_payment(booking_id: int, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    # A retried initiation replays the same order ID instead of minting a new one
+    if idempotency_key:
+        return idempotency_store.run(
+            db, f"payment_initiate:{booking_id}", idempotency_key, {"booking_id": booking_id},
+            lambda: start_payment(booking_id, db)
+        )
+    return start_payment(booking_id, db)
+
+def start_payment(booking_id: int, db: Session):
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
@@ -139,12 +152,16 @@ def update_booking_status_logic(db: Session, booking: Booking, status_code: str,
                     </center>
                  """
                  
-                 send_email(
-                    booking.email,
-                    "Booking Confirmed - ParkPro",
-                    html_body,
-                    is_html=True
-                 )
+                 # Return and callback both report success; send it once
+                 with db.begin_nested():
+                     enqueue_email(
+                        db,
+                        booking.email,
+                        "Booking Confirmed - ParkPro",
+                        html_body,
+                        is_html=True,
+                        dedupe_key=f"booking-confirmed:{booking.id}"
+                     )
         except Exception as e:
             print(f"Failed to send confirmation email from payment callback: {e}")
 
@@ -157,6 +174,7 @@ def update_booking_status_logic(db: Session, booking: Booking, status_code: str,
              booking.payment_status = 'failed'
              
     db.commit()
+    booking_changed(booking)
 
 @router.post("/check-status/{booking_id}")
 def check_payment_status(booking_id: int, order_id: str = None, transaction_ref: str = None, db: Session = Depends(get_db)):
@@ -185,6 +203,14 @@ def check_payment_status(booking_id: int, order_id: str = None, transaction_ref:
     
     return {"status": booking.payment_status, "message": "Could not verify with gateway"}
 
+def apply_payment_result(db: Session, order_id: str, status_code: str, transaction_ref: str = None):
+    # Sync DB work for the async gateway endpoints; run it in the threadpool
+    booking_id = extract_booking_id(order_id)
+    if booking_id:
+        booking = db.query(Booking).filter(Booking.id == booking_id).first()
+        if booking:
+            update_booking_status_logic(db, booking, status_code, transaction_ref)
+
 @router.post("/return")
 async def payment_return(request: Request, db: Session = Depends(get_db)):
     form_data = await request.form()
@@ -195,11 +221,7 @@ async def payment_return(request: Request, db: Session = Depends(get_db)):
     transaction_ref = rp_data.get('rp_transactionRef')
     
     if order_id:
-        booking_id = extract_booking_id(order_id)
-        if booking_id:
-            booking = db.query(Booking).filter(Booking.id == booking_id).first()
-            if booking:
-                update_booking_status_logic(db, booking, status_code, transaction_ref)
+        await run_in_threadpool(apply_payment_result, db, order_id, status_code, transaction_ref)
 
     if status_code == 'RP00':
         return RedirectResponse(url=f"{FRONTEND_URL}/payment-status?status=success", status_code=303)
@@ -232,10 +254,6 @@ async def payment_callback(request: Request, db: Session = Depends(get_db)):
     status_code = rp_data.get('rp_statusCode')
     transaction_ref = rp_data.get('rp_transactionRef')
     
-    booking_id = extract_booking_id(order_id)
-    if booking_id:
-        booking = db.query(Booking).filter(Booking.id == booking_id).first()
-        if booking:
-            update_booking_status_logic(db, booking, status_code, transaction_ref)
+    await run_in_threadpool(apply_payment_result, db, order_id, status_code, transaction_ref)
 
     return "OK"
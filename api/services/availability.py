@@ -0,0 +1,152 @@
+import bisect
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models import Booking
+
+# Only these statuses hold a spot; everything else is dropped from the index
+LIVE_STATUSES = ("active", "pending")
+
+
+def hold_is_live(status: str, hold_expires_at: Optional[datetime], now: datetime) -> bool:
+    """A pending booking stops holding its spot the moment its hold expires."""
+    return status != "pending" or hold_expires_at is None or hold_expires_at > now
+
+
+def holds_spot(now: datetime):
+    """SQL filter matching hold_is_live for live statuses."""
+    return or_(
+        Booking.status == "active",
+        and_(
+            Booking.status == "pending",
+            or_(Booking.hold_expires_at.is_(None), Booking.hold_expires_at > now)
+        )
+    )
+
+
+class AvailabilityIndex:
+    """
+    In-process view of live (active/pending) bookings, kept as a sorted list of
+    intervals per spot so "is spot X free in [start, end)" never needs a DB scan.
+
+    Loaded from the bookings table at startup and kept current by calling
+    track() whenever a booking changes status. reconcile() compares against the
+    DB and resyncs if anything drifted (e.g. writes from another worker).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # spot_id -> sorted [(start_time, booking_id)]
+        self._by_spot: Dict[int, List[Tuple[datetime, int]]] = {}
+        # booking_id -> (spot_id, start_time, end_time, status, hold_expires_at)
+        self._bookings: Dict[int, Tuple[int, datetime, datetime, str, Optional[datetime]]] = {}
+        self.loaded = False
+
+    def _load_rows(self, db: Session):
+        return db.query(
+            Booking.id, Booking.spot_id, Booking.start_time, Booking.end_time, Booking.status,
+            Booking.hold_expires_at
+        ).filter(Booking.status.in_(LIVE_STATUSES)).all()
+
+    def load(self, db: Session):
+        rows = self._load_rows(db)
+        with self._lock:
+            self._by_spot = {}
+            self._bookings = {}
+            for row in rows:
+                self._put(*row)
+            self.loaded = True
+
+    def _put(self, booking_id: int, spot_id: int, start_time: datetime, end_time: datetime, status: str,
+             hold_expires_at: Optional[datetime] = None):
+        self._discard(booking_id)
+        self._bookings[booking_id] = (spot_id, start_time, end_time, status, hold_expires_at)
+        bisect.insort(self._by_spot.setdefault(spot_id, []), (start_time, booking_id))
+
+    def _discard(self, booking_id: int):
+        entry = self._bookings.pop(booking_id, None)
+        if entry is None:
+            return
+        spot_id, start_time = entry[0], entry[1]
+        intervals = self._by_spot.get(spot_id)
+        if intervals is None:
+            return
+        i = bisect.bisect_left(intervals, (start_time, booking_id))
+        if i < len(intervals) and intervals[i] == (start_time, booking_id):
+            intervals.pop(i)
+        if not intervals:
+            del self._by_spot[spot_id]
+
+    def track(self, booking: Booking):
+        """
+        Record the booking's current state: live bookings are (re)indexed,
+        cancelled/expired/completed ones are removed.
+        """
+        with self._lock:
+            if booking.status in LIVE_STATUSES:
+                self._put(booking.id, booking.spot_id, booking.start_time, booking.end_time, booking.status,
+                          booking.hold_expires_at)
+            else:
+                self._discard(booking.id)
+
+    def _spot_occupied(self, spot_id: int, start: datetime, end: datetime, overstay_blocks: bool, now: datetime) -> bool:
+        intervals = self._by_spot.get(spot_id)
+        if not intervals:
+            return False
+        # Only bookings starting before `end` can overlap
+        stop = bisect.bisect_left(intervals, (end,))
+        for i in range(stop):
+            _, b_start, b_end, status, hold_expires_at = self._bookings[intervals[i][1]]
+            if not hold_is_live(status, hold_expires_at, now):
+                continue
+            if b_end > start:
+                return True
+            # An 'active' booking past its end time is an overstay: the car is still there
+            if overstay_blocks and status == "active":
+                return True
+        return False
+
+    def is_free(self, spot_id: int, start: datetime, end: datetime, overstay_blocks: bool = False) -> bool:
+        with self._lock:
+            return not self._spot_occupied(spot_id, start, end, overstay_blocks, datetime.utcnow())
+
+    def occupied_spot_ids(self, start: datetime, end: datetime, spot_ids: Optional[Iterable[int]] = None) -> Set[int]:
+        """
+        Spots held in [start, end), matching GET /layout semantics (active
+        overstays keep blocking their spot).
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            candidates = self._by_spot.keys() if spot_ids is None else spot_ids
+            return {s for s in candidates if self._spot_occupied(s, start, end, True, now)}
+
+    def reconcile(self, db: Session) -> Dict[str, List[int]]:
+        """
+        Compares the index against the DB and resyncs it. Returns the booking
+        ids that had drifted so the caller can log them.
+        """
+        rows = self._load_rows(db)
+        db_state = {r[0]: tuple(r[1:]) for r in rows}
+        with self._lock:
+            drift = {
+                "missing": sorted(set(db_state) - set(self._bookings)),
+                "stale": sorted(set(self._bookings) - set(db_state)),
+                "changed": sorted(
+                    b_id for b_id in set(db_state) & set(self._bookings)
+                    if db_state[b_id] != self._bookings[b_id]
+                ),
+            }
+            if any(drift.values()):
+                self._by_spot = {}
+                self._bookings = {}
+                for booking_id, entry in db_state.items():
+                    self._put(booking_id, *entry)
+            self.loaded = True
+        return drift
+
+
+availability_index = AvailabilityIndex()
@@ -0,0 +1,105 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+from sqlalchemy import Integer, cast
+from sqlalchemy.orm import Session
+
+from models import SystemConfig
+
+# Bumped in the same transaction as every /admin/config write. Workers compare
+# it against their snapshot to know when to reload.
+CONFIG_VERSION_KEY = "config_version"
+CONFIG_REFRESH_SECONDS = float(os.getenv("CONFIG_REFRESH_SECONDS", "5"))
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    version: int = 0
+    hourly_rate: float = 10.0
+    cancellation_rule_1_hours: int = 24
+    cancellation_rule_2_hours: int = 2
+    cancellation_rule_2_percent: float = 50.0
+    admin_notification_emails: Tuple[str, ...] = ()
+    values: Dict[str, str] = field(default_factory=dict)  # raw key -> value, for untyped/public keys
+
+
+_TYPED_KEYS = {
+    "hourly_rate": float,
+    "cancellation_rule_1_hours": int,
+    "cancellation_rule_2_hours": int,
+    "cancellation_rule_2_percent": float,
+}
+
+
+def build_snapshot(rows) -> ConfigSnapshot:
+    values = {r.key: r.value for r in rows}
+    fields = {}
+    for key, parse in _TYPED_KEYS.items():
+        if key in values:
+            try:
+                fields[key] = parse(values[key])
+            except ValueError:
+                print(f"Ignoring invalid config {key}={values[key]!r}")
+    emails = values.get("admin_notification_emails") or ""
+    fields["admin_notification_emails"] = tuple(e.strip() for e in emails.split(",") if e.strip())
+    try:
+        fields["version"] = int(values.get(CONFIG_VERSION_KEY, 0))
+    except ValueError:
+        fields["version"] = 0
+    values.pop(CONFIG_VERSION_KEY, None)
+    return ConfigSnapshot(values=values, **fields)
+
+
+class ConfigCache:
+    """
+    In-process, immutable SystemConfig snapshot. Hot paths read `get()`
+    without touching the DB; a background task polls the single version row
+    (`refresh`) so writes made through any worker reach all of them within
+    CONFIG_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = ConfigSnapshot()
+        self.loaded = False
+
+    def get(self) -> ConfigSnapshot:
+        return self._snapshot
+
+    def load(self, db: Session) -> ConfigSnapshot:
+        snapshot = build_snapshot(db.query(SystemConfig).all())
+        with self._lock:
+            # Never step back to an older snapshot loaded concurrently
+            if not self.loaded or snapshot.version >= self._snapshot.version:
+                self._snapshot = snapshot
+            self.loaded = True
+            return self._snapshot
+
+    def refresh(self, db: Session) -> bool:
+        """Reloads if another worker bumped the version. Returns True on reload."""
+        row = db.query(SystemConfig.value).filter(SystemConfig.key == CONFIG_VERSION_KEY).first()
+        try:
+            version = int(row.value) if row else 0
+        except ValueError:
+            version = 0
+        if self.loaded and version == self._snapshot.version:
+            return False
+        self.load(db)
+        return True
+
+    def bump(self, db: Session):
+        """
+        Increments the version in the caller's transaction; commit, then
+        `load` to pick up the change in this worker immediately.
+        """
+        updated = db.query(SystemConfig).filter(SystemConfig.key == CONFIG_VERSION_KEY).update(
+            {SystemConfig.value: cast(SystemConfig.value, Integer) + 1},
+            synchronize_session=False
+        )
+        if not updated:
+            db.add(SystemConfig(key=CONFIG_VERSION_KEY, value="1", description="Bumped on every config change"))
+
+
+config_cache = ConfigCache()
@@ -0,0 +1,102 @@
+import heapq
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Optional
+
+
+class DeadlineQueue:
+    """
+    Runs `handler(keys)` for keys whose deadline (naive UTC) has passed, on a
+    single daemon thread that sleeps exactly until the earliest deadline
+    instead of polling. Scheduling an earlier deadline wakes it up.
+
+    schedule() on an existing key moves its deadline; cancel() drops it.
+    Stale heap entries are skipped lazily when popped.
+    """
+
+    def __init__(self, name: str, handler: Callable[[List[Hashable]], None]):
+        self.name = name
+        self.handler = handler
+        self._cond = threading.Condition()
+        self._heap: List[tuple] = []  # (deadline, seq, key)
+        self._deadlines: Dict[Hashable, datetime] = {}
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def schedule(self, key: Hashable, deadline: datetime):
+        with self._cond:
+            if self._deadlines.get(key) == deadline:
+                return
+            self._deadlines[key] = deadline
+            self._seq += 1
+            heapq.heappush(self._heap, (deadline, self._seq, key))
+            # Only the new head changes how long the worker should sleep
+            if self._heap[0][2] == key:
+                self._cond.notify()
+
+    def cancel(self, key: Hashable):
+        with self._cond:
+            self._deadlines.pop(key, None)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._deadlines)
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self._cond:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: datetime) -> List[Hashable]:
+        with self._cond:
+            due = []
+            while True:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    return due
+                _, _, key = heapq.heappop(self._heap)
+                del self._deadlines[key]
+                due.append(key)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    self._drop_stale()
+                    if self._heap:
+                        wait = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+            due = self.pop_due(datetime.utcnow())
+            if not due:
+                continue
+            try:
+                self.handler(due)
+            except Exception as e:
+                print(f"Error in {self.name} deadline handler: {e}")
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from sqlalchemy import event, func, insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import EmailOutbox
+from utils.email import SMTPSession, is_permanent_failure
+
+# Sender threads per worker process, each with its own SMTP connection
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "4"))
+OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+# Fallback poll for rows written by other workers and for retries
+OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+RETRY_BASE = timedelta(seconds=30)
+RETRY_MAX = timedelta(hours=1)
+# A row still 'sending' after this belongs to a sender that died; it is retried
+SEND_LEASE = timedelta(minutes=5)
+OUTBOX_RETENTION = timedelta(days=int(os.getenv("EMAIL_OUTBOX_RETENTION_DAYS", "7")))
+
+
+def _dedupe_hash(dedupe_key: str, to_email: str) -> str:
+    return hashlib.sha256(f"{dedupe_key}\0{to_email.strip().lower()}".encode("utf-8")).hexdigest()
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str, is_html: bool = False,
+                  dedupe_key: Optional[str] = None, now: Optional[datetime] = None) -> bool:
+    """
+    Appends an email to the outbox in the caller's transaction, so it goes
+    out only if that transaction commits and survives restarts; the caller
+    never waits on SMTP. With a dedupe_key each recipient gets the message at
+    most once (INSERT IGNORE on the unique hash). False for a duplicate.
+    Callers that carry on when the email can't be queued run this inside
+    db.begin_nested(), so a failed insert doesn't abort their transaction.
+    """
+    now = now or datetime.utcnow()
+    stmt = insert(EmailOutbox).values(
+        dedupe_key=_dedupe_hash(dedupe_key, to_email) if dedupe_key else None,
+        to_email=to_email,
+        subject=subject[:255],
+        body=body,
+        is_html=is_html,
+        status="pending",
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+    ).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+    inserted = db.execute(stmt).rowcount == 1
+    if inserted and not db.info.get("outbox_wake"):
+        # Wake the senders once the row is visible to them
+        db.info["outbox_wake"] = True
+        event.listen(db, "after_commit", _wake_senders, once=True)
+    return inserted
+
+
+def _wake_senders(session: Session):
+    session.info.pop("outbox_wake", None)
+    email_outbox.wake()
+
+
+def claim_batch(db: Session, now: datetime, limit: int = OUTBOX_BATCH_SIZE) -> List[EmailOutbox]:
+    """
+    Leases up to `limit` due rows with one conditional UPDATE tagged with a
+    fresh token, so concurrent senders (threads or workers) never share a row.
+    A row whose lease expired (its sender died mid-send) counts as a failed
+    attempt, so an email that keeps killing senders ends up 'failed' after
+    MAX_ATTEMPTS instead of being retried forever.
+    """
+    due = [row.id for row in db.query(EmailOutbox.id).filter(
+        EmailOutbox.status.in_(("pending", "sending")),
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(limit)]
+    if not due:
+        return []
+    # Conditional on 'sending', so only one sender counts each expired lease
+    expired = db.query(EmailOutbox).filter(
+        EmailOutbox.id.in_(due),
+        EmailOutbox.status == "sending",
+        EmailOutbox.next_attempt_at <= now
+    )
+    attempts = func.coalesce(EmailOutbox.attempts, 0) + 1
+    expired.filter(attempts >= MAX_ATTEMPTS).update({
+        EmailOutbox.attempts: attempts,
+        EmailOutbox.status: "failed",
+        EmailOutbox.last_error: "Send lease expired",
+        EmailOutbox.lease_token: None,
+    }, synchronize_session=False)
+    expired.update({
+        EmailOutbox.attempts: attempts,
+        EmailOutbox.status: "pending",
+        EmailOutbox.lease_token: None,
+    }, synchronize_session=False)
+    token = uuid.uuid4().hex
+    db.query(EmailOutbox).filter(
+        EmailOutbox.id.in_(due),
+        EmailOutbox.status == "pending",
+        EmailOutbox.next_attempt_at <= now
+    ).update({
+        EmailOutbox.status: "sending",
+        EmailOutbox.next_attempt_at: now + SEND_LEASE,
+        EmailOutbox.lease_token: token,
+    }, synchronize_session=False)
+    db.commit()
+    return db.query(EmailOutbox).filter(EmailOutbox.lease_token == token).order_by(EmailOutbox.id).all()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return min(RETRY_BASE * (2 ** (attempts - 1)), RETRY_MAX)
+
+
+def deliver_batch(db: Session, rows: List[EmailOutbox], smtp: SMTPSession, now: datetime) -> int:
+    """
+    Sends leased rows over one SMTP session and records the outcome: sent,
+    retry with exponential backoff, or failed (permanent error or out of
+    attempts). Outcomes are committed per batch; a crash mid-batch means
+    those rows are resent after the lease (at-least-once).
+    """
+    sent = 0
+    for row in rows:
+        try:
+            smtp.send(row.to_email, row.subject, row.body, row.is_html)
+        except Exception as e:
+            row.attempts = (row.attempts or 0) + 1
+            row.last_error = str(e)[:1000]
+            row.lease_token = None
+            if is_permanent_failure(e) or row.attempts >= MAX_ATTEMPTS:
+                row.status = "failed"
+                print(f"Email {row.id} to {row.to_email} failed: {e}")
+            else:
+                row.status = "pending"
+                row.next_attempt_at = now + retry_delay(row.attempts)
+            continue
+        row.status = "sent"
+        row.sent_at = datetime.utcnow()
+        row.lease_token = None
+        sent += 1
+    db.commit()
+    return sent
+
+
+def purge_outbox(db: Session, now: datetime) -> int:
+    """Drops sent emails past the retention window; failed ones are kept for inspection."""
+    deleted = db.query(EmailOutbox).filter(
+        EmailOutbox.status == "sent",
+        EmailOutbox.sent_at < now - OUTBOX_RETENTION
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+class OutboxSender:
+    """
+    Drains `email_outbox` on a few daemon threads, each holding one pooled
+    SMTP connection. Woken right after a transaction that enqueued email
+    commits; otherwise polls for retries and other workers' rows.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, workers: int = EMAIL_WORKERS,
+                 smtp_factory: Callable[[], SMTPSession] = SMTPSession):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.smtp_factory = smtp_factory
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopped.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"email-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def wake(self):
+        self._wake.set()
+
+    def drain_once(self, smtp: SMTPSession) -> int:
+        """Claims and sends one batch; returns how many rows it handled."""
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            rows = claim_batch(db, now)
+            if rows:
+                deliver_batch(db, rows, smtp, now)
+            return len(rows)
+        finally:
+            db.close()
+
+    def _run(self):
+        smtp = self.smtp_factory()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    handled = self.drain_once(smtp)
+                except Exception as e:
+                    print(f"Error draining email outbox: {e}")
+                    handled = 0
+                if not handled:
+                    self._wake.wait(OUTBOX_POLL_SECONDS)
+                    self._wake.clear()
+        finally:
+            smtp.close()
+
+
+email_outbox = OutboxSender()
@@ -0,0 +1,93 @@
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload
+
+from database import SessionLocal
+from models import Booking
+from services.deadlines import DeadlineQueue
+from services.lot_events import booking_changed
+from services.promo_redemption import release_promo
+
+# How long an unpaid (pending) booking holds its spot
+HOLD_TTL = timedelta(minutes=int(os.getenv("BOOKING_HOLD_MINUTES", "15")))
+# Occurrences of a recurring series are paid one at a time; each holds its
+# spot until this long before it starts
+SERIES_PAYMENT_LEAD = timedelta(hours=int(os.getenv("SERIES_PAYMENT_LEAD_HOURS", "24")))
+
+
+def hold_deadline(now: datetime) -> datetime:
+    return now + HOLD_TTL
+
+
+def occurrence_hold_deadline(now: datetime, start_time: datetime) -> datetime:
+    """
+    Hold for one occurrence of a recurring series: SERIES_PAYMENT_LEAD before
+    it starts, or the usual HOLD_TTL for occurrences starting sooner than that.
+    """
+    return max(hold_deadline(now), start_time - SERIES_PAYMENT_LEAD)
+
+
+def expire_holds(db: Session, now: datetime, booking_ids: Optional[Iterable[int]] = None) -> List[Booking]:
+    """
+    Expires pending bookings whose hold has run out (or, for rows from before
+    holds existed, that are older than HOLD_TTL), fails their payment and
+    gives back promo uses. Each booking is claimed with a conditional UPDATE,
+    so concurrent callers never expire (or release) one twice.
+    """
+    query = db.query(Booking).options(joinedload(Booking.spot)).filter(
+        Booking.status == 'pending',
+        or_(
+            Booking.hold_expires_at <= now,
+            and_(Booking.hold_expires_at.is_(None), Booking.created_at < now - HOLD_TTL)
+        )
+    )
+    if booking_ids is not None:
+        query = query.filter(Booking.id.in_(list(booking_ids)))
+
+    expired = []
+    released = {}
+    for booking in query.all():
+        claimed = db.query(Booking).filter(
+            Booking.id == booking.id,
+            Booking.status == 'pending'
+        ).update({Booking.status: 'expired'}, synchronize_session=False)
+        if not claimed:
+            continue
+        if booking.payment_status == 'pending':
+            booking.payment_status = 'failed'
+        if booking.promo_code_id:
+            released[booking.promo_code_id] = released.get(booking.promo_code_id, 0) + 1
+        expired.append(booking)
+    # Unpaid bookings give their promo uses back
+    for promo_id, uses in released.items():
+        release_promo(db, promo_id, uses)
+    db.commit()
+    for booking in expired:
+        booking_changed(booking)
+    return expired
+
+
+def _expire_due(booking_ids):
+    db = SessionLocal()
+    try:
+        expire_holds(db, datetime.utcnow(), booking_ids)
+    finally:
+        db.close()
+
+
+# Fires each hold at its hold_expires_at instead of on the monitor's tick.
+# Bookings that got paid in the meantime are skipped by the status check.
+hold_queue = DeadlineQueue("booking-holds", _expire_due)
+
+
+def schedule_holds(db: Session):
+    """Queues every live hold; called at startup."""
+    rows = db.query(Booking.id, Booking.hold_expires_at).filter(
+        Booking.status == 'pending',
+        Booking.hold_expires_at.isnot(None)
+    ).all()
+    for booking_id, hold_expires_at in rows:
+        hold_queue.schedule(booking_id, hold_expires_at)
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import IdempotencyKey
+
+IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+# A claim this old without a stored response belongs to a request that died
+IN_FLIGHT_TIMEOUT = timedelta(seconds=int(os.getenv("IDEMPOTENCY_IN_FLIGHT_SECONDS", "60")))
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key handling for POST endpoints. The first request with a key
+    claims a row in `idempotency_keys` (unique key_hash, so concurrent
+    duplicates across workers race on the insert), runs the handler and
+    stores its response. Retries within the TTL replay that response.
+
+    Completed responses are also kept in a small in-process LRU so a retry
+    hitting the same worker skips the DB as well.
+    """
+
+    def __init__(self, max_entries: int = int(os.getenv("IDEMPOTENCY_CACHE_ENTRIES", "2048"))):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._completed = OrderedDict()  # key_hash -> (expires_at, fingerprint, status_code, body)
+
+    def run(self, db: Session, scope: str, key: str, payload: Any, handler: Callable[[], Any]):
+        key_hash = _sha256(f"{scope}\0{key}")
+        fingerprint = _sha256(json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")))
+
+        replay = self._cached(key_hash, fingerprint)
+        if replay is not None:
+            return replay
+        replay = self._claim(db, key_hash, fingerprint)
+        if replay is not None:
+            return replay
+
+        try:
+            result = handler()
+        except HTTPException as e:
+            db.rollback()
+            if e.status_code < 500:
+                # Deterministic rejections are part of the contract; replay them too
+                self._store(db, key_hash, fingerprint, e.status_code, {"detail": e.detail})
+            else:
+                self._release(db, key_hash)
+            raise
+        except Exception:
+            db.rollback()
+            self._release(db, key_hash)
+            raise
+        self._store(db, key_hash, fingerprint, 200, jsonable_encoder(result))
+        return result
+
+    def purge(self, db: Session) -> int:
+        now = datetime.utcnow()
+        removed = db.query(IdempotencyKey).filter(IdempotencyKey.expires_at < now).delete(synchronize_session=False)
+        db.commit()
+        with self._lock:
+            for key_hash in [k for k, v in self._completed.items() if v[0] < now]:
+                del self._completed[key_hash]
+        return removed
+
+    def _claim(self, db: Session, key_hash: str, fingerprint: str) -> Optional[JSONResponse]:
+        now = datetime.utcnow()
+        db.add(IdempotencyKey(key_hash=key_hash, fingerprint=fingerprint, created_at=now, expires_at=now + IDEMPOTENCY_TTL))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        row = db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).first()
+        if row is None:
+            # Purged between our insert and read; claim again
+            return self._claim(db, key_hash, fingerprint)
+
+        if row.expires_at > now:
+            if row.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            if row.status_code is not None:
+                body = json.loads(row.response_body)
+                self._remember(key_hash, row.expires_at, fingerprint, row.status_code, body)
+                return self._replay(row.status_code, body)
+            if row.created_at > now - IN_FLIGHT_TIMEOUT:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+
+        # Expired, or abandoned in flight: take it over. Guarded on the
+        # observed created_at so only one retry wins.
+        taken = db.query(IdempotencyKey).filter(
+            IdempotencyKey.key_hash == key_hash,
+            IdempotencyKey.created_at == row.created_at
+        ).update({
+            IdempotencyKey.fingerprint: fingerprint,
+            IdempotencyKey.status_code: None,
+            IdempotencyKey.response_body: None,
+            IdempotencyKey.created_at: now,
+            IdempotencyKey.expires_at: now + IDEMPOTENCY_TTL
+        }, synchronize_session=False)
+        db.commit()
+        if not taken:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+        return None
+
+    def _store(self, db: Session, key_hash: str, fingerprint: str, status_code: int, body):
+        expires_at = datetime.utcnow() + IDEMPOTENCY_TTL
+        db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).update({
+            IdempotencyKey.status_code: status_code,
+            IdempotencyKey.response_body: json.dumps(body),
+            IdempotencyKey.expires_at: expires_at
+        }, synchronize_session=False)
+        db.commit()
+        self._remember(key_hash, expires_at, fingerprint, status_code, body)
+
+    def _release(self, db: Session, key_hash: str):
+        db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).delete(synchronize_session=False)
+        db.commit()
+
+    def _remember(self, key_hash: str, expires_at: datetime, fingerprint: str, status_code: int, body):
+        with self._lock:
+            self._completed[key_hash] = (expires_at, fingerprint, status_code, body)
+            self._completed.move_to_end(key_hash)
+            while len(self._completed) > self.max_entries:
+                self._completed.popitem(last=False)
+
+    def _cached(self, key_hash: str, fingerprint: str) -> Optional[JSONResponse]:
+        with self._lock:
+            entry = self._completed.get(key_hash)
+            if entry is None:
+                return None
+            expires_at, stored_fingerprint, status_code, body = entry
+            if expires_at <= datetime.utcnow():
+                del self._completed[key_hash]
+                return None
+            self._completed.move_to_end(key_hash)
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        return self._replay(status_code, body)
+
+    @staticmethod
+    def _replay(status_code: int, body) -> JSONResponse:
+        return JSONResponse(status_code=status_code, content=body, headers={REPLAY_HEADER: "true"})
+
+
+idempotency_store = IdempotencyStore()
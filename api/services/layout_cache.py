@@ -0,0 +1,73 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+# Upper bound on how stale a cached layout can be. Covers writes made by other
+# uvicorn workers (each has its own version counter) and "now" windows
+# drifting as bookings start and end.
+LAYOUT_CACHE_TTL_SECONDS = float(os.getenv("LAYOUT_CACHE_TTL_SECONDS", 5))
+LAYOUT_CACHE_MAX_ENTRIES = int(os.getenv("LAYOUT_CACHE_MAX_ENTRIES", 512))
+
+
+class LayoutCache:
+    """
+    Rendered /layout responses per (floor, time window), invalidated by a
+    monotonic lot version. Anything that changes bookings or spots calls bump().
+
+    The ETag is a hash of the response body, so a 304 is only ever sent for
+    identical content, whichever worker rendered it.
+    """
+
+    def __init__(self, ttl_seconds: float = LAYOUT_CACHE_TTL_SECONDS, max_entries: int = LAYOUT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (version, stored_at, etag, body)
+        self._entries: Dict[Hashable, Tuple[int, float, str, bytes]] = {}
+        self.version = 0
+
+    def bump(self) -> int:
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            return self.version
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            version, stored_at, etag, body = entry
+            if version != self.version or time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            return etag, body
+
+    def put(self, key: Hashable, body: bytes, version: int) -> Tuple[str, bytes]:
+        """
+        Stores a body rendered at `version` (read before building it, so a
+        bump that raced with the render leaves nothing stale behind).
+        """
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        with self._lock:
+            if version == self.version:
+                if len(self._entries) >= self.max_entries:
+                    # Drop the oldest entry (dicts keep insertion order)
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (version, time.monotonic(), etag, body)
+        return etag, body
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Accept weak validators too (proxies may add W/ when compressing)
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+layout_cache = LayoutCache()
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+# Per-subscriber backlog before we give up on deltas and ask the client to resync
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", 256))
+
+RESYNC_MESSAGE = json.dumps({"type": "resync"})
+
+
+class LiveUpdateBroker:
+    """
+    Fans out layout change events to WebSocket subscribers, grouped by floor.
+
+    Each event is serialized once and the same string is queued for every
+    subscriber of the floor, so one change reaches thousands of clients with
+    a single dict lookup plus one put_nowait each. publish() is safe to call
+    from request threads; delivery happens on the event loop.
+    """
+
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self, floor: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[floor].add(queue)
+        return queue
+
+    def unsubscribe(self, floor: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(floor)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[floor]
+
+    def subscriber_count(self, floor: str) -> int:
+        return len(self._subscribers.get(floor, ()))
+
+    def publish(self, floor: str, message: dict):
+        if self._loop is None or self._loop.is_closed():
+            return
+        payload = json.dumps(message)
+        self._loop.call_soon_threadsafe(self._fan_out, floor, payload)
+
+    def _fan_out(self, floor: str, payload: str):
+        for queue in list(self._subscribers.get(floor, ())):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and tell it to fetch a fresh snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_MESSAGE)
+
+
+live_updates = LiveUpdateBroker()
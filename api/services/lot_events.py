@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from models import Booking, ParkingSpot
+from services.availability import availability_index
+from services.layout_cache import layout_cache
+from services.live_updates import live_updates
+from services.notifications import schedule_notification
+from services.spot_catalog import spot_catalog
+
+# Single place to call after a booking or spot change is committed. Keeps the
+# availability index, spot catalog, /layout cache, live subscribers and the
+# notification queue in step. All of these are per worker: changes committed
+# through other workers reach them via the reconciliation in monitor_tick
+# (lot_resynced), so with several workers they can lag by one monitor interval.
+
+
+def spot_delta(spot: ParkingSpot, is_booked: bool) -> dict:
+    return {
+        "id": spot.id,
+        "row": spot.row,
+        "col": spot.col,
+        "is_booked": is_booked,
+        "label": spot.label or "",
+        "spot_type": spot.spot_type or "standard",
+        "is_blocked": bool(spot.is_blocked),
+    }
+
+
+def _publish_spot(spot: ParkingSpot):
+    now = datetime.utcnow()
+    is_booked = bool(availability_index.occupied_spot_ids(now, now, [spot.id]))
+    live_updates.publish(spot.floor, {
+        "type": "delta",
+        "floor": spot.floor,
+        "spots": [spot_delta(spot, is_booked)],
+    })
+
+
+def booking_changed(booking: Booking):
+    availability_index.track(booking)
+    schedule_notification(booking)
+    layout_cache.bump()
+    if booking.spot is not None:
+        _publish_spot(booking.spot)
+
+
+def spot_changed(spot: ParkingSpot):
+    spot_catalog.update_spot(spot)
+    layout_cache.bump()
+    _publish_spot(spot)
+
+
+def floor_changed(db: Session, floor: str):
+    """
+    Grid resized or re-provisioned: deltas can't describe that, so subscribers
+    are told to reload the floor.
+    """
+    spot_catalog.load_floor(db, floor)
+    layout_cache.bump()
+    live_updates.publish(floor, {"type": "resync", "floor": floor})
+
+
+def lot_resynced(spots: List[ParkingSpot], floors: List[str] = ()):
+    """
+    Bookings on these spots, or the spots and floor grids themselves, changed
+    outside this worker and were picked up by the availability index and spot
+    catalog reconciliation. Resized floors are told to reload.
+    """
+    layout_cache.bump()
+    for floor in floors:
+        live_updates.publish(floor, {"type": "resync", "floor": floor})
+    for spot in spots:
+        if spot.floor not in floors:
+            _publish_spot(spot)
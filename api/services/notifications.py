@@ -0,0 +1,214 @@
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload
+
+from database import SessionLocal
+from models import Booking
+from services.config_cache import config_cache
+from services.deadlines import DeadlineQueue
+from services.email_outbox import enqueue_email
+from services.pricing import overstay_fee, overstay_hours
+from utils.common import format_spot_id
+
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
+
+# Pre-alert goes out 15 minutes before the booked end; it is skipped if fewer
+# than 10 minutes are left by the time it can be sent (short or late bookings).
+PRE_ALERT_LEAD = timedelta(minutes=15)
+PRE_ALERT_MIN_LEFT = timedelta(minutes=10)
+OVERSTAY_REMINDER_INTERVAL = timedelta(hours=6)
+# How far ahead the DB refill looks; must exceed the refill interval
+NOTIFICATION_HORIZON = timedelta(minutes=int(os.getenv("NOTIFICATION_HORIZON_MINUTES", "60")))
+
+PRE_ALERT = "pre_alert"
+EXPIRY = "expiry"
+OVERSTAY = "overstay"
+
+
+def next_notification(end_time: datetime, pre_alert_sent: bool, expiry_alert_sent: bool,
+                      last_overstay_sent_at: Optional[datetime], now: datetime):
+    """(kind, due_at) of an active booking's next email."""
+    if not pre_alert_sent and end_time - now >= PRE_ALERT_MIN_LEFT:
+        return PRE_ALERT, end_time - PRE_ALERT_LEAD
+    if not expiry_alert_sent:
+        return EXPIRY, end_time
+    return OVERSTAY, (last_overstay_sent_at or end_time) + OVERSTAY_REMINDER_INTERVAL
+
+
+def _not_set(flag):
+    return or_(flag == False, flag.is_(None))
+
+
+def _claim(db: Session, booking: Booking, kind: str, now: datetime) -> bool:
+    """
+    Marks the email as sent with a conditional UPDATE, so with several
+    workers (each with its own queue) exactly one sends it.
+    """
+    query = db.query(Booking).filter(Booking.id == booking.id, Booking.status == 'active')
+    if kind == PRE_ALERT:
+        values = {Booking.is_pre_alert_sent: True}
+        query = query.filter(_not_set(Booking.is_pre_alert_sent))
+    elif kind == EXPIRY:
+        values = {Booking.is_expiry_alert_sent: True, Booking.last_overstay_sent_at: now}
+        query = query.filter(_not_set(Booking.is_expiry_alert_sent))
+    else:
+        values = {Booking.last_overstay_sent_at: now}
+        last = booking.last_overstay_sent_at
+        query = query.filter(
+            Booking.is_expiry_alert_sent == True,
+            Booking.last_overstay_sent_at == last if last is not None else Booking.last_overstay_sent_at.is_(None)
+        )
+    return query.update(values, synchronize_session=False) == 1
+
+
+def _details_table(plate: str, spot_str: str, label: str, value: str) -> str:
+    return f"""
+                            <table class="details-table">
+                                <tr><th>Vehicle</th><td>{plate}</td></tr>
+                                <tr><th>Spot</th><td>{spot_str}</td></tr>
+                                <tr><th>{label}</th><td>{value}</td></tr>
+                            </table>"""
+
+
+def render_notification(booking: Booking, kind: str, now: datetime):
+    """(subject, html body) for one of the monitor emails."""
+    plate = booking.vehicle.license_plate if booking.vehicle else "Unknown"
+    spot_str = format_spot_id(booking.spot.row, booking.spot.col, booking.spot.floor) if booking.spot else "N/A"
+    end_str = booking.end_time.strftime("%Y-%m-%d %H:%M:%S")
+    username = booking.user.username
+
+    if kind == PRE_ALERT:
+        return "Parking Expiring Soon - ParkPro", f"""
+                            <h1>Parking Expiring Soon</h1>
+                            <p>Hello {username},</p>
+                            <p>This is a friendly reminder that your parking session is about to expire.</p>
+                            {_details_table(plate, spot_str, "Expires At", end_str)}
+
+                            <div class="highlight-box">
+                                <strong>15 Minutes Remaining</strong>
+                            </div>
+
+                            <p>Please extend your session or return to your vehicle.</p>
+                            <center><a href="{FRONTEND_URL}/my-bookings" class="btn">View Booking</a></center>
+                        """
+    if kind == EXPIRY:
+        return "Parking Expired - ParkPro", f"""
+                            <h1>Parking Expired</h1>
+                            <p>Hello {username},</p>
+                            <div class="alert-box">
+                                <span class="alert-title">SESSION EXPIRED</span>
+                                Your parking time has finished. You are now accruing excess fees.
+                            </div>
+                            {_details_table(plate, spot_str, "Expired At", end_str)}
+
+                            <p>Please checkout immediately via the portal or app to finalize your payment.</p>
+                            <center><a href="{FRONTEND_URL}/my-bookings" class="btn" style="background-color: #ef4444;">Checkout Now</a></center>
+                        """
+    current_excess = overstay_fee(
+        booking.end_time, now, config_cache.get().hourly_rate,
+        booking.spot.spot_type if booking.spot else None
+    )
+    return "Rate Alert: Overstay Notice", f"""
+                                    <h1>Overstay Fee Notice</h1>
+                                    <p>Hello {username},</p>
+                                    <div class="alert-box">
+                                        <span class="alert-title">ACTION REQUIRED</span>
+                                        Your vehicle has exceeded the booked time by <strong>{int(overstay_hours(booking.end_time, now))} hours</strong>.
+                                    </div>
+                                    {_details_table(plate, spot_str, "Estimated Fee", f"<strong>MYR {current_excess:.2f}</strong>")}
+
+                                    <p>Please checkout immediately to avoid further charges.</p>
+                                    <center><a href="{FRONTEND_URL}/my-bookings" class="btn" style="background-color: #ef4444;">Pay & Exit</a></center>
+                                """
+
+
+def send_due_notifications(db: Session, now: datetime, booking_ids: Iterable[int]) -> List[tuple]:
+    """
+    Queues whatever is due for these bookings in the email outbox and
+    requeues their next deadline. Each claim and its outbox row commit
+    together, so an alert is neither lost nor sent twice.
+    Returns the (booking_id, kind) pairs this call claimed.
+    """
+    bookings = db.query(Booking).options(
+        joinedload(Booking.user), joinedload(Booking.spot), joinedload(Booking.vehicle)
+    ).filter(Booking.id.in_(list(booking_ids)), Booking.status == 'active').all()
+
+    claimed = []
+    requeue = []
+    for booking in bookings:
+        kind, due_at = next_notification(
+            booking.end_time, booking.is_pre_alert_sent, booking.is_expiry_alert_sent,
+            booking.last_overstay_sent_at, now
+        )
+        if due_at > now:
+            requeue.append(booking)
+            continue
+        if not booking.user or not booking.user.email:
+            # Nobody to tell; requeueing an overdue deadline would spin
+            continue
+        requeue.append(booking)
+        if _claim(db, booking, kind, now):
+            claimed.append((booking.id, kind))
+            subject, html_body = render_notification(booking, kind, now)
+            # Same transaction as the claim: the alert is queued iff it is claimed
+            # (Overstay reminders repeat, so only the one-off alerts carry a dedupe key)
+            enqueue_email(db, booking.user.email, subject, html_body, is_html=True,
+                          dedupe_key=None if kind == OVERSTAY else f"{kind}:{booking.id}")
+    db.commit()
+
+    # Requeue from the committed state (reloaded on access), which includes
+    # what other workers claimed
+    for booking in requeue:
+        schedule_notification(booking, now)
+    return claimed
+
+
+def _send_due(booking_ids):
+    db = SessionLocal()
+    try:
+        send_due_notifications(db, datetime.utcnow(), booking_ids)
+    finally:
+        db.close()
+
+
+# One entry per active booking, keyed by booking id, due at its next email.
+notification_queue = DeadlineQueue("booking-notifications", _send_due)
+
+
+def schedule_notification(booking: Booking, now: Optional[datetime] = None):
+    """Queues (or drops) a booking's next email after any change to it."""
+    if booking.status != 'active':
+        notification_queue.cancel(booking.id)
+        return
+    now = now or datetime.utcnow()
+    _, due_at = next_notification(
+        booking.end_time, booking.is_pre_alert_sent, booking.is_expiry_alert_sent,
+        booking.last_overstay_sent_at, now
+    )
+    # Bookings further out are picked up by a later refill
+    if due_at <= now + NOTIFICATION_HORIZON:
+        notification_queue.schedule(booking.id, due_at)
+    else:
+        notification_queue.cancel(booking.id)
+
+
+def load_notifications(db: Session, now: datetime):
+    """
+    Queues active bookings whose next email falls within the horizon: those
+    ending soon (an index range on (status, end_time)) and overstays. Run at
+    startup and on each monitor tick; it also picks up bookings changed
+    through other workers. Re-queuing an unchanged deadline is a no-op.
+    """
+    rows = db.query(
+        Booking.id, Booking.status, Booking.end_time, Booking.is_pre_alert_sent,
+        Booking.is_expiry_alert_sent, Booking.last_overstay_sent_at
+    ).filter(
+        Booking.status == 'active',
+        Booking.end_time <= now + NOTIFICATION_HORIZON + PRE_ALERT_LEAD
+    ).all()
+    for row in rows:
+        schedule_notification(row, now)
+    return len(rows)
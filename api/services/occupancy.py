@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import Sequence
+
+import numpy as np
+
+
+def to_datetime64(values: Sequence[datetime]) -> np.ndarray:
+    return np.array(values, dtype="datetime64[s]")
+
+
+def occupancy_matrix(
+    spot_ids: Sequence[int],
+    booking_spot_ids: Sequence[int],
+    starts: np.ndarray,
+    ends: np.ndarray,
+    window_start: datetime,
+    slot_minutes: int,
+    n_slots: int,
+) -> np.ndarray:
+    """
+    Returns a (len(spot_ids), n_slots) int32 matrix counting the bookings that
+    cover each spot during each time slot. A booking covers every slot it
+    touches, so a 10:05-10:20 booking fills both the 10:00 and 10:15 slots.
+
+    Computed as a difference array (+1 at the first slot, -1 after the last)
+    and a cumulative sum along the time axis, so cost is O(bookings + cells)
+    with no per-booking Python loop.
+    """
+    n_spots = len(spot_ids)
+    counts = np.zeros((n_spots, n_slots), dtype=np.int32)
+    if n_spots == 0 or n_slots == 0 or len(booking_spot_ids) == 0:
+        return counts
+
+    spot_ids = np.asarray(spot_ids, dtype=np.int64)
+    booking_spot_ids = np.asarray(booking_spot_ids, dtype=np.int64)
+
+    # Map each booking to its row in the matrix; drop bookings on unknown spots
+    order = np.argsort(spot_ids)
+    pos = np.searchsorted(spot_ids, booking_spot_ids, sorter=order)
+    pos = np.clip(pos, 0, n_spots - 1)
+    rows = order[pos]
+    known = spot_ids[rows] == booking_spot_ids
+
+    origin = np.datetime64(window_start, "s")
+    slot = np.timedelta64(slot_minutes * 60, "s")
+    first = np.floor((starts - origin) / slot)
+    last = np.ceil((ends - origin) / slot)
+    first = np.clip(first, 0, n_slots).astype(np.int64)
+    last = np.clip(last, 0, n_slots).astype(np.int64)
+
+    valid = known & (last > first)
+    rows, first, last = rows[valid], first[valid], last[valid]
+
+    diff = np.zeros((n_spots, n_slots + 1), dtype=np.int32)
+    np.add.at(diff, (rows, first), 1)
+    np.add.at(diff, (rows, last), -1)
+    counts[:] = np.cumsum(diff, axis=1)[:, :n_slots]
+    return counts
@@ -0,0 +1,102 @@
+import math
+from datetime import datetime
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import PromoCode
+
+# Hourly rate multiplier per spot type; anything else pays the base rate
+SPOT_TYPE_MULTIPLIERS = {"ev": 1.5, "vip": 2.0}
+
+
+class Quote(NamedTuple):
+    base_amount: float
+    discount_amount: float
+    total_amount: float
+
+
+def spot_multiplier(spot_type: Optional[str]) -> float:
+    return SPOT_TYPE_MULTIPLIERS.get(spot_type, 1.0)
+
+
+def promo_is_redeemable(promo: Optional[PromoCode], now: datetime) -> bool:
+    return bool(promo and promo.is_active and promo.expiry_date > now and promo.current_uses < promo.usage_limit)
+
+
+def promo_terms(promo: Optional[PromoCode]) -> Tuple[float, float]:
+    """(percent off, fixed amount off) for a promo; (0, 0) for none."""
+    if promo is None:
+        return 0.0, 0.0
+    if promo.discount_type == "percentage":
+        return float(promo.discount_value), 0.0
+    return 0.0, float(promo.discount_value)
+
+
+def price_batch(
+    starts: Sequence[datetime],
+    ends: Sequence[datetime],
+    spot_types: Sequence[Optional[str]],
+    hourly_rate: float,
+    discount_percent: Optional[Sequence[float]] = None,
+    discount_fixed: Optional[Sequence[float]] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Prices many bookings at once: returns (base, discount, total) arrays.
+    Base is duration x rate x spot multiplier rounded to cents; the discount
+    (percent of base, or a fixed amount) is capped so totals never go
+    negative, and rounded to cents here, once. Single bookings go through here too so quotes and charges
+    always agree to the cent.
+    """
+    n = len(starts)
+    if n == 0:
+        empty = np.zeros(0)
+        return empty, empty, empty
+    hours = (np.array(ends, dtype="datetime64[us]") - np.array(starts, dtype="datetime64[us]")) / np.timedelta64(1, "h")
+    multipliers = np.array([spot_multiplier(t) for t in spot_types], dtype=np.float64)
+    base = np.round(hours * float(hourly_rate) * multipliers, 2)
+
+    percent = np.zeros(n) if discount_percent is None else np.asarray(discount_percent, dtype=np.float64)
+    fixed = np.zeros(n) if discount_fixed is None else np.asarray(discount_fixed, dtype=np.float64)
+    discount = np.round(np.minimum(base * percent / 100.0 + fixed, base), 2)
+    return base, discount, np.round(base - discount, 2)
+
+
+def price_with_promo(
+    starts: Sequence[datetime],
+    ends: Sequence[datetime],
+    spot_types: Sequence[Optional[str]],
+    hourly_rate: float,
+    promo: Optional[PromoCode] = None,
+    uses_left: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    price_batch for a multi-booking request sharing one promo: the discount
+    goes to the first `uses_left` bookings only. Also returns the boolean
+    mask of bookings that got it.
+    """
+    applied = np.arange(len(starts)) < (uses_left if promo else 0)
+    percent, fixed = promo_terms(promo)
+    base, discount, total = price_batch(
+        starts, ends, spot_types, hourly_rate,
+        np.where(applied, percent, 0.0), np.where(applied, fixed, 0.0)
+    )
+    return base, discount, total, applied
+
+
+def price(start: datetime, end: datetime, spot_type: Optional[str], hourly_rate: float, promo: Optional[PromoCode] = None) -> Quote:
+    """Prices one booking; pass `promo` only once it has been validated."""
+    percent, fixed = promo_terms(promo)
+    base, discount, total = price_batch([start], [end], [spot_type], hourly_rate, [percent], [fixed])
+    return Quote(float(base[0]), float(discount[0]), float(total[0]))
+
+
+def overstay_hours(booked_end: datetime, actual_end: datetime) -> int:
+    """Started hours past the booked end; 0 when on time."""
+    if actual_end <= booked_end:
+        return 0
+    return math.ceil((actual_end - booked_end).total_seconds() / 3600.0)
+
+
+def overstay_fee(booked_end: datetime, actual_end: datetime, hourly_rate: float, spot_type: Optional[str]) -> float:
+    return overstay_hours(booked_end, actual_end) * hourly_rate * spot_multiplier(spot_type)
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models import PromoCode
+
+# Read-only copy of a promo_codes row. Same attribute names as the model, so
+# services.pricing helpers accept either.
+CachedPromo = namedtuple("CachedPromo", [
+    "id", "code", "discount_type", "discount_value", "expiry_date",
+    "usage_limit", "current_uses", "is_active",
+])
+
+PROMO_CACHE_TTL_SECONDS = float(os.getenv("PROMO_CACHE_TTL_SECONDS", "30"))
+PROMO_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("PROMO_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+PROMO_CACHE_MAX_ENTRIES = int(os.getenv("PROMO_CACHE_MAX_ENTRIES", "4096"))
+
+
+class PromoCache:
+    """
+    Code -> promo lookups for the promo check and quotes, with negative
+    caching so keystroke-by-keystroke checks of unknown codes don't reach the
+    DB either. Expiry and limits are evaluated by the caller on the cached
+    row. Admin promo writes clear it here; other workers converge within the
+    TTL. Usage counts may lag by up to the TTL, which is fine for an advisory
+    check: redemption itself is a conditional UPDATE (services.promo_redemption).
+    """
+
+    def __init__(
+        self,
+        ttl: float = PROMO_CACHE_TTL_SECONDS,
+        negative_ttl: float = PROMO_CACHE_NEGATIVE_TTL_SECONDS,
+        max_entries: int = PROMO_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # code -> (expires_at monotonic, CachedPromo or None)
+
+    def lookup(self, db: Session, code: str) -> Optional[CachedPromo]:
+        code = code.upper()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(code)
+                return entry[1]
+
+        row = db.query(PromoCode).filter(PromoCode.code == code).first()
+        promo = None
+        if row is not None:
+            promo = CachedPromo(
+                row.id, row.code, row.discount_type, float(row.discount_value), row.expiry_date,
+                row.usage_limit, row.current_uses or 0, bool(row.is_active),
+            )
+        ttl = self.ttl if promo is not None else self.negative_ttl
+        with self._lock:
+            self._entries[code] = (now + ttl, promo)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return promo
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+promo_cache = PromoCache()
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from models import PromoCode
+
+# Promo usage is counted with conditional UPDATEs instead of
+# read-check-increment in Python, so parallel bookings can't oversubscribe a
+# limited code. Callers run these right before commit: the promo row is only
+# write-locked from the UPDATE to the end of the transaction.
+
+
+def redeem_promo(db: Session, promo_id: int, now: datetime, uses: int = 1) -> bool:
+    """Atomically takes `uses` redemptions. False if the code can't cover them."""
+    claimed = db.query(PromoCode).filter(
+        PromoCode.id == promo_id,
+        PromoCode.is_active == True,
+        PromoCode.expiry_date > now,
+        PromoCode.current_uses + uses <= PromoCode.usage_limit
+    ).update({PromoCode.current_uses: PromoCode.current_uses + uses}, synchronize_session=False)
+    return claimed == 1
+
+
+def redeem_promo_up_to(db: Session, promo_id: int, now: datetime, wanted: int) -> int:
+    """
+    For multi-booking requests: takes as many of `wanted` redemptions as are
+    left and returns how many were granted (possibly 0). The locking read
+    sees the latest committed count; the lock is the same one the UPDATE
+    takes, held until the caller commits.
+    """
+    row = db.query(PromoCode.current_uses, PromoCode.usage_limit).filter(
+        PromoCode.id == promo_id
+    ).with_for_update().first()
+    if row is None:
+        return 0
+    uses = min(wanted, row.usage_limit - row.current_uses)
+    if uses <= 0 or not redeem_promo(db, promo_id, now, uses):
+        return 0
+    return uses
+
+
+def release_promo(db: Session, promo_id: int, uses: int = 1):
+    """Gives redemptions back, e.g. when an unpaid booking expires."""
+    db.query(PromoCode).filter(
+        PromoCode.id == promo_id,
+        PromoCode.current_uses >= uses
+    ).update({PromoCode.current_uses: PromoCode.current_uses - uses}, synchronize_session=False)
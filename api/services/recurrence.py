@@ -0,0 +1,76 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAX_OCCURRENCES = 366
+
+
+def expand_occurrences(
+    start: datetime,
+    end: datetime,
+    frequency: str,
+    until: date,
+    interval: int = 1,
+    weekdays: Optional[Sequence[int]] = None,
+    limit: int = MAX_OCCURRENCES,
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Expands a recurrence rule into (start, end) pairs, first occurrence
+    included. Dates are walked in the timezone of `start`, so "every weekday at
+    08:00+08:00" stays on local weekdays after conversion to UTC.
+
+    - daily: every `interval` days
+    - weekly: every `interval` weeks, on `weekdays` (0=Mon .. 6=Sun; defaults
+      to the weekday of `start`)
+
+    `weekdays` also filters daily rules (e.g. daily, Mon-Fri). Raises
+    ValueError when the rule would produce more than `limit` occurrences.
+    """
+    if frequency not in ("daily", "weekly"):
+        raise ValueError(f"Unsupported frequency: {frequency}")
+    if weekdays is None and frequency == "weekly":
+        weekdays = [start.weekday()]
+    allowed = set(weekdays) if weekdays is not None else None
+
+    duration = end - start
+    first_day = start.date()
+    week_origin = first_day - timedelta(days=first_day.weekday())
+    occurrences = []
+    day = first_day
+    while day <= until:
+        if frequency == "daily":
+            on_rule = (day - first_day).days % interval == 0
+        else:
+            on_rule = ((day - week_origin).days // 7) % interval == 0
+        if on_rule and (allowed is None or day.weekday() in allowed):
+            if len(occurrences) >= limit:
+                raise ValueError(f"Recurrence expands to more than {limit} occurrences")
+            occ_start = datetime.combine(day, start.timetz())
+            occurrences.append((occ_start, occ_start + duration))
+        day += timedelta(days=1)
+    return occurrences
+
+
+def conflicting_occurrences(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    existing_starts: np.ndarray,
+    existing_ends: np.ndarray,
+) -> np.ndarray:
+    """
+    Boolean mask of occurrences that overlap any existing booking, in one
+    vectorized pass. Existing bookings are sorted by start; for each
+    occurrence, searchsorted finds the bookings that start before it ends and
+    a running max of their ends says whether any of them is still going when
+    it starts. O((n + m) log m) instead of one overlap query per occurrence.
+    """
+    if len(existing_starts) == 0:
+        return np.zeros(len(starts), dtype=bool)
+    order = np.argsort(existing_starts)
+    sorted_starts = existing_starts[order]
+    running_end = np.maximum.accumulate(existing_ends[order])
+
+    n_before = np.searchsorted(sorted_starts, ends, side="left")
+    latest_end = running_end[np.maximum(n_before - 1, 0)]
+    return (n_before > 0) & (latest_end > starts)
@@ -0,0 +1,148 @@
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import LayoutConfigDB, ParkingSpot
+
+CatalogSpot = namedtuple("CatalogSpot", ["id", "floor", "row", "col", "label", "spot_type"])
+
+
+class SpotCatalog:
+    """
+    Bookable spots (inside the floor grid, not blocked) grouped by
+    spot_type -> floor, each list in (row, col) order. Lets the search walk
+    straight to candidates of the requested type instead of loading floors.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_type: Dict[str, Dict[str, List[CatalogSpot]]] = {}
+        self._by_id: Dict[int, CatalogSpot] = {}
+        self._bounds: Dict[str, tuple] = {}  # floor -> (rows, cols)
+        self._state: Dict[int, tuple] = {}  # every spot, blocked or not, for reconcile()
+        self.loaded = False
+
+    def load(self, db: Session):
+        layouts = db.query(LayoutConfigDB).all()
+        spots = db.query(ParkingSpot).all()
+        with self._lock:
+            self._by_type = {}
+            self._by_id = {}
+            self._state = {}
+            self._bounds = {l.floor: (l.rows, l.cols) for l in layouts}
+            for spot in spots:
+                self._add(spot)
+            self._sort()
+            self.loaded = True
+
+    def load_floor(self, db: Session, floor: str):
+        layout = db.query(LayoutConfigDB).filter(LayoutConfigDB.floor == floor).first()
+        spots = db.query(ParkingSpot).filter(ParkingSpot.floor == floor).all()
+        with self._lock:
+            for spot_id in [s_id for s_id, state in self._state.items() if state[0] == floor]:
+                self._remove(spot_id)
+            if layout:
+                self._bounds[floor] = (layout.rows, layout.cols)
+            else:
+                self._bounds.pop(floor, None)
+            for spot in spots:
+                self._add(spot)
+            self._sort()
+
+    def update_spot(self, spot: ParkingSpot):
+        with self._lock:
+            self._remove(spot.id)
+            self._add(spot)
+            self._sort()
+
+    def reconcile(self, db: Session) -> Dict[str, List]:
+        """
+        Compares the catalog against the DB and reloads it if spots or floor
+        grids were changed through another worker. Returns the changed spot
+        ids and the floors whose grid changed, so the caller can push them.
+        """
+        if not self.loaded:
+            self.load(db)
+            return {"spots": [], "floors": []}
+        layouts = db.query(LayoutConfigDB).all()
+        spots = db.query(ParkingSpot).all()
+        db_bounds = {l.floor: (l.rows, l.cols) for l in layouts}
+        db_state = {spot.id: self._spot_state(spot) for spot in spots}
+        with self._lock:
+            drift = {
+                "spots": sorted(
+                    spot_id for spot_id in set(db_state) | set(self._state)
+                    if db_state.get(spot_id) != self._state.get(spot_id)
+                ),
+                "floors": sorted(
+                    floor for floor in set(db_bounds) | set(self._bounds)
+                    if db_bounds.get(floor) != self._bounds.get(floor)
+                ),
+            }
+            if any(drift.values()):
+                self._by_type = {}
+                self._by_id = {}
+                self._state = {}
+                self._bounds = db_bounds
+                for spot in spots:
+                    self._add(spot)
+                self._sort()
+        return drift
+
+    def get(self, spot_id: int) -> Optional[CatalogSpot]:
+        with self._lock:
+            return self._by_id.get(spot_id)
+
+    @staticmethod
+    def _spot_state(spot: ParkingSpot) -> tuple:
+        return (spot.floor, spot.row, spot.col, spot.label or "", spot.spot_type or "standard", bool(spot.is_blocked))
+
+    def _add(self, spot: ParkingSpot):
+        self._state[spot.id] = self._spot_state(spot)
+        bounds = self._bounds.get(spot.floor)
+        if spot.is_blocked or bounds is None or spot.row >= bounds[0] or spot.col >= bounds[1]:
+            return
+        entry = CatalogSpot(spot.id, spot.floor, spot.row, spot.col, spot.label or "", spot.spot_type or "standard")
+        self._by_id[spot.id] = entry
+        self._by_type.setdefault(entry.spot_type, {}).setdefault(entry.floor, []).append(entry)
+
+    def _remove(self, spot_id: int):
+        self._state.pop(spot_id, None)
+        entry = self._by_id.pop(spot_id, None)
+        if entry is None:
+            return
+        floors = self._by_type.get(entry.spot_type, {})
+        spots = floors.get(entry.floor)
+        if spots is not None:
+            spots.remove(entry)
+            if not spots:
+                del floors[entry.floor]
+
+    def _sort(self):
+        for floors in self._by_type.values():
+            for spots in floors.values():
+                spots.sort(key=lambda s: (s.row, s.col))
+
+    def candidates(self, spot_type: Optional[str] = None, floor: Optional[str] = None):
+        """
+        Yields spots in ranking order: the preferred floor first, then the
+        remaining floors by name; within a floor, front rows first. Floors are
+        only materialized when the caller reaches them.
+        """
+        with self._lock:
+            types = [spot_type] if spot_type else sorted(self._by_type)
+            floor_names = sorted({f for t in types for f in self._by_type.get(t, {})})
+        if floor in floor_names:
+            floor_names.remove(floor)
+            floor_names.insert(0, floor)
+        for floor_name in floor_names:
+            with self._lock:
+                per_floor = [s for t in types for s in self._by_type.get(t, {}).get(floor_name, ())]
+            if len(types) > 1:
+                per_floor.sort(key=lambda s: (s.row, s.col))
+            yield from per_floor
+
+
+spot_catalog = SpotCatalog()
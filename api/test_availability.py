@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from models import Booking
+from services.availability import AvailabilityIndex
+
+T0 = datetime(2030, 1, 1, 9, 0)
+
+
+def make_booking(booking_id, spot_id, start_h, end_h, status="active"):
+    return Booking(
+        id=booking_id,
+        spot_id=spot_id,
+        start_time=T0 + timedelta(hours=start_h),
+        end_time=T0 + timedelta(hours=end_h),
+        status=status,
+    )
+
+
+def test_overlap_and_status_changes():
+    index = AvailabilityIndex()
+    booking = make_booking(1, 10, 1, 3, status="pending")
+    index.track(booking)
+
+    assert not index.is_free(10, T0 + timedelta(hours=2), T0 + timedelta(hours=4))
+    # [start, end) intervals: back-to-back bookings don't clash
+    assert index.is_free(10, T0 + timedelta(hours=3), T0 + timedelta(hours=4))
+    assert index.is_free(10, T0, T0 + timedelta(hours=1))
+    assert index.is_free(11, T0 + timedelta(hours=2), T0 + timedelta(hours=4))
+
+    booking.status = "cancelled"
+    index.track(booking)
+    assert index.is_free(10, T0 + timedelta(hours=2), T0 + timedelta(hours=4))
+
+
+def test_active_overstay_blocks_layout_only():
+    index = AvailabilityIndex()
+    index.track(make_booking(1, 10, 0, 1, status="active"))
+    index.track(make_booking(2, 11, 0, 1, status="pending"))
+
+    later = T0 + timedelta(hours=5)
+    assert index.occupied_spot_ids(later, later) == {10}
+    assert index.is_free(10, later, later + timedelta(hours=1))
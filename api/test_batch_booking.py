@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+from models import (
+    BatchBookingCreate, BatchBookingItem, Booking, BookingAuditLog, LayoutConfigDB, ParkingSpot, PromoCode, User,
+    Vehicle,
+)
+from services.config_cache import ConfigCache
+
+DRIVER = User(id=7, username="fleet", role="customer", email="fleet@example.com")
+
+
+@pytest.fixture(autouse=True)
+def default_rate(monkeypatch):
+    # Default snapshot: 10.00/hour
+    monkeypatch.setattr(main, "config_cache", ConfigCache())
+
+
+def test_batch_reports_each_item_and_books_the_rest_together(session_factory, count_queries):
+    db = session_factory()
+    start = (datetime.utcnow() + timedelta(days=1)).replace(microsecond=0)
+    db.add(LayoutConfigDB(floor="Ground", rows=1, cols=4))
+    spots = [
+        ParkingSpot(floor="Ground", row=0, col=0),
+        ParkingSpot(floor="Ground", row=0, col=1, spot_type="ev"),
+        ParkingSpot(floor="Ground", row=0, col=2),
+        ParkingSpot(floor="Ground", row=0, col=3, is_blocked=True),
+    ]
+    db.add_all(spots)
+    db.add(Vehicle(license_plate="FLEET1", owner_name="someone"))
+    # 2 of 5 uses left
+    db.add(PromoCode(code="FLEET", discount_type="fixed", discount_value=2,
+                     expiry_date=start + timedelta(days=30), usage_limit=5, current_uses=3))
+    db.flush()
+    db.add(Booking(user_id=1, spot_id=spots[2].id, vehicle_id=1, name="n", email="e", phone="p",
+                   start_time=start + timedelta(hours=4), end_time=start + timedelta(hours=6),
+                   payment_method="card", payment_amount=20, status="active"))
+    db.commit()
+
+    def item(col, plate, hours_in, hours, row=0):
+        return BatchBookingItem(row=row, col=col, floor="Ground", license_plate=plate,
+                                start_time=start + timedelta(hours=hours_in),
+                                end_time=start + timedelta(hours=hours_in + hours))
+
+    batch = BatchBookingCreate(
+        name="Fleet", email="fleet@example.com", phone="0123", payment_method="card", promo_code="fleet",
+        items=[
+            item(0, "fleet1", 0, 2),   # 0: booked, promo
+            item(1, "FLEET2", 0, 2),   # 1: booked, promo (ev: 1.5x)
+            item(0, "FLEET3", 1, 2),   # 2: clashes with item 0
+            item(2, "FLEET4", -48, 1), # 3: in the past
+            item(3, "FLEET5", 0, 1),   # 4: blocked
+            item(0, "FLEET6", 0, 1, row=9),  # 5: no such spot
+            item(2, "FLEET7", 0, 1),   # 6: booked, promo used up
+            item(2, "FLEET8", 5, 1),   # 7: clashes with the existing booking
+        ],
+    )
+    with count_queries(db) as queries:
+        response = main.create_batch_booking(batch, current_user=DRIVER, db=db)
+
+    assert (response.booked, response.failed) == (3, 5)
+    # The promo is redeemed last: only the booking inserts run while it is locked
+    redeemed = next(n for n, sql in enumerate(queries.statements) if sql.startswith("UPDATE promo_codes"))
+    assert {sql.split("(")[0].strip() for sql in queries.statements[redeemed + 1:] if not sql.startswith("SELECT")} == {
+        "INSERT INTO bookings", "INSERT INTO booking_audit_log"
+    }
+    assert [r.index for r in response.results] == list(range(8))
+    assert [r.success for r in response.results] == [True, True, False, False, False, False, True, False]
+    errors = [r.error for r in response.results]
+    assert errors[2] == errors[7] == "This spot is already booked for the selected time range."
+    assert errors[3] == "Booking start time cannot be in the past"
+    assert errors[4] == "Spot is under maintenance"
+    assert errors[5] == "Spot not found"
+
+    booked = {r.index: r.booking for r in response.results if r.success}
+    assert [(booked[i].payment_amount, booked[i].promo_code) for i in (0, 1, 6)] == [
+        (18.0, "FLEET"), (28.0, "FLEET"), (10.0, None)
+    ]
+    assert response.total_amount == 56.0
+    assert db.query(PromoCode.current_uses).scalar() == 5
+
+    # The uuid readback matched each inserted row to its item
+    db.expire_all()
+    for i, spot in ((0, spots[0]), (1, spots[1]), (6, spots[2])):
+        row = db.get(Booking, booked[i].id)
+        assert row.booking_uuid == booked[i].booking_uuid
+        assert (row.spot_id, row.start_time, row.status) == (spot.id, start, "pending")
+        assert row.vehicle.license_plate == batch.items[i].license_plate.upper()
+        assert row.hold_expires_at is not None
+    # The existing vehicle is reused, the others created once
+    assert db.query(Vehicle).count() == 3
+
+    audit = db.query(BookingAuditLog).order_by(BookingAuditLog.booking_id).all()
+    assert [(a.booking_id, a.action, a.new_status, a.user_id) for a in audit] == [
+        (booked[i].id, "created", "pending", DRIVER.id) for i in (0, 1, 6)
+    ]
+
+
+def test_batch_with_nothing_bookable_writes_nothing(session_factory):
+    db = session_factory()
+    start = datetime.utcnow() + timedelta(days=1)
+    batch = BatchBookingCreate(
+        name="Fleet", email="fleet@example.com", phone="0123", payment_method="card",
+        items=[BatchBookingItem(row=0, col=0, license_plate="X1", start_time=start, end_time=start - timedelta(hours=1))],
+    )
+    response = main.create_batch_booking(batch, current_user=DRIVER, db=db)
+    assert (response.booked, response.failed, response.total_amount) == (0, 1, 0.0)
+    assert response.results[0].error == "End time must be after start time"
+    assert db.query(Booking).count() == 0
@@ -0,0 +1,58 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+from models import Booking, ParkingSpot, PromoCode, Vehicle
+from utils.booking_export import EXPORT_FIELDS, csv_lines, export_chunks, gzipped, ndjson_lines
+from utils.booking_filters import BookingFilters
+
+
+def seed(db, n):
+    t0 = datetime(2026, 2, 1, 8, 0, 0, 123456)
+    db.add_all([
+        ParkingSpot(id=1, row=1, col=2, floor="Ground", spot_type="ev"),
+        Vehicle(id=1, license_plate="WXY1234", owner_name="o"),
+        PromoCode(id=1, code="SAVE10", discount_type="percentage", discount_value=10, expiry_date=t0, usage_limit=5),
+    ])
+    db.add_all([
+        Booking(user_id=1, spot_id=1, vehicle_id=1, name="Tan, Mei", email="m@example.com", phone="p",
+                start_time=t0, end_time=t0, payment_method="card", payment_amount=12.5,
+                discount_amount=1.25, promo_code_id=1 if i == 0 else None,
+                status="completed" if i % 2 else "active", created_at=t0)
+        for i in range(n)
+    ])
+    db.commit()
+
+
+def test_csv_streams_all_rows_in_chunks(session_factory):
+    db = session_factory()
+    seed(db, 7)
+
+    chunks = list(csv_lines(export_chunks(db, chunk_rows=3)))
+    assert len(chunks) == 3  # header rides with the first chunk
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert [int(r["id"]) for r in rows] == list(range(1, 8))
+    first = rows[0]
+    assert first["name"] == "Tan, Mei"
+    assert first["created_at"] == "2026-02-01T08:00:00Z"
+    assert first["payment_amount"] == "12.50"
+    assert first["promo_code"] == "SAVE10"
+    assert rows[1]["promo_code"] == "" and rows[1]["cancellation_time"] == ""
+
+
+def test_ndjson_gzip_and_filters(session_factory):
+    db = session_factory()
+    seed(db, 4)
+
+    body = b"".join(gzipped(ndjson_lines(export_chunks(db, BookingFilters(status="completed")))))
+    records = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+    assert [r["id"] for r in records] == [2, 4]
+    assert list(records[0]) == EXPORT_FIELDS
+    assert records[0]["spot_type"] == "ev" and records[0]["refund_amount"] == "0.00"
+
+
+def test_empty_csv_export_still_has_header(session_factory):
+    db = session_factory()
+    assert b"".join(csv_lines(export_chunks(db))).decode().strip() == ",".join(EXPORT_FIELDS)
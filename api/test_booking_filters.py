@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from models import Booking, ParkingSpot, Vehicle
+from utils.booking_filters import BookingFilters
+
+
+def seed(db):
+    t0 = datetime(2026, 3, 1, 9)
+    db.add_all([
+        ParkingSpot(id=1, row=0, col=0, floor="Ground", spot_type="standard"),
+        ParkingSpot(id=2, row=0, col=1, floor="Level 1", spot_type="ev"),
+        Vehicle(id=1, license_plate="KA01AB1234", owner_name="a"),
+        Vehicle(id=2, license_plate="TN10_X99", owner_name="b"),
+    ])
+    rows = [
+        # (spot, vehicle, status, refund_status, end offset hours)
+        (1, 1, "active", None, -2),
+        (2, 1, "active", None, 3),
+        (2, 2, "cancelled", "pending", 1),
+        (1, 2, "completed", None, 1),
+    ]
+    db.add_all([
+        Booking(user_id=1, spot_id=spot, vehicle_id=vehicle, name="n", email="e", phone="p",
+                start_time=t0 - timedelta(hours=4), end_time=t0 + timedelta(hours=end),
+                status=status, refund_status=refund, payment_method="card", payment_amount=1)
+        for spot, vehicle, status, refund, end in rows
+    ])
+    db.commit()
+    return t0
+
+
+def matching(db, now=None, **params):
+    query = BookingFilters(**params).apply(db.query(Booking), now=now)
+    return sorted(b.id for b in query)
+
+
+def test_filters_narrow_in_sql(session_factory):
+    db = session_factory()
+    now = seed(db)
+
+    assert matching(db) == [1, 2, 3, 4]
+    assert matching(db, floor="Level 1") == [2, 3]
+    assert matching(db, floor="Level 1", spot_type="ev", status="active") == [2]
+    assert matching(db, plate="ka01") == [1, 2]
+    # LIKE wildcards in the prefix are literal
+    assert matching(db, plate="TN10_") == [3, 4]
+    assert matching(db, plate="TN1%") == []
+    assert matching(db, status="cancelled", refund_status="pending") == [3]
+    assert matching(db, now=now, overstay=True) == [1]
+    assert matching(db, end_from=now, end_to=now + timedelta(hours=2)) == [3, 4]
+
+
+def test_cache_key_tracks_filter_values():
+    assert BookingFilters(plate=" ka01 ").cache_key() == BookingFilters(plate="KA01").cache_key()
+    assert BookingFilters(status="active").cache_key() != BookingFilters(status="pending").cache_key()
@@ -0,0 +1,49 @@
+import json
+from datetime import datetime, timedelta
+
+import main
+from models import Booking, ParkingSpot, PromoCode, User, Vehicle
+from utils.booking_filters import BookingFilters
+from utils.pagination import booking_counts
+
+PAGE = 50
+# One COUNT plus one joined page query, however many rows the page has
+QUERY_BUDGET = 2
+
+
+def seed(db):
+    admin = User(username="admin", role="admin")
+    db.add(admin)
+    db.add(PromoCode(code="P", discount_type="fixed", discount_value=1,
+                     expiry_date=datetime.utcnow() + timedelta(days=1), usage_limit=100))
+    db.add_all([ParkingSpot(row=i // 10, col=i % 10, floor="Ground") for i in range(PAGE)])
+    db.add_all([Vehicle(license_plate=f"V{i}", owner_name="o", phone="1") for i in range(PAGE)])
+    db.flush()
+    t0 = datetime(2026, 1, 1)
+    db.add_all([
+        Booking(user_id=admin.id, spot_id=i % PAGE + 1, vehicle_id=i % PAGE + 1, promo_code_id=1 if i % 2 else None,
+                name="n", email="e", phone="p", start_time=t0, end_time=t0 + timedelta(hours=1),
+                payment_method="card", payment_amount=10, discount_amount=0, refund_amount=0,
+                status="active" if i % 3 else "completed", created_at=t0 + timedelta(minutes=i))
+        for i in range(PAGE + 5)
+    ])
+    db.commit()
+    admin_id = admin.id
+    db.close()
+    return admin_id
+
+
+def test_booking_pages_stay_within_query_budget(session_factory, count_queries):
+    admin_id = seed(session_factory())
+    admin = User(id=admin_id, username="admin", role="admin")
+
+    for endpoint, extra in ((main.get_user_bookings, {}), (main.get_all_bookings, {"filters": BookingFilters()})):
+        booking_counts._entries.clear()
+        db = session_factory()
+        with count_queries(db) as queries:
+            page = json.loads(endpoint(page=1, limit=PAGE, cursor=None, current_user=admin, db=db, **extra).body)
+        db.close()
+        assert len(page["items"]) == PAGE
+        assert page["items"][0]["vehicle"]["license_plate"]
+        assert any(item["promo_code"] == "P" for item in page["items"])
+        assert queries.count <= QUERY_BUDGET, queries.statements
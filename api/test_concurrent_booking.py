@@ -0,0 +1,57 @@
+import threading
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+
+import main
+from models import Booking, BookingCreate, LayoutConfigDB, ParkingSpot, User
+
+N_REQUESTS = 16
+
+
+def test_parallel_bookings_for_one_spot_have_one_winner(session_factory):
+    db = session_factory()
+    db.add(LayoutConfigDB(rows=1, cols=1, floor="Ground"))
+    db.add(ParkingSpot(row=0, col=0, floor="Ground"))
+    users = [User(username=f"driver{i}", role="customer") for i in range(N_REQUESTS)]
+    db.add_all(users)
+    db.commit()
+    user_ids = [u.id for u in users]
+    db.close()
+
+    start = datetime.utcnow() + timedelta(hours=2)
+    barrier = threading.Barrier(N_REQUESTS)
+    outcomes = []
+
+    def book(i):
+        session = session_factory()
+        request = BookingCreate(
+            row=0, col=0, floor="Ground",
+            license_plate=f"RACE{i}",
+            name="Driver", email="driver@example.com", phone="0123",
+            start_time=start + timedelta(minutes=i),  # overlapping, not identical, ranges
+            end_time=start + timedelta(hours=2, minutes=i),
+            payment_method="card", payment_amount=0,
+        )
+        user = User(id=user_ids[i], username=f"driver{i}", role="customer")
+        barrier.wait()
+        try:
+            main.create_booking(request, current_user=user, db=session, idempotency_key=None)
+            outcomes.append("won")
+        except HTTPException as e:
+            outcomes.append(e.status_code)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(N_REQUESTS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert outcomes.count("won") == 1
+    assert outcomes.count(400) == N_REQUESTS - 1
+
+    db = session_factory()
+    assert db.query(Booking).count() == 1
+    db.close()
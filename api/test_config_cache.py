@@ -0,0 +1,58 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+from models import SystemConfig, User
+from services.config_cache import CONFIG_VERSION_KEY, ConfigCache, ConfigSnapshot
+
+
+def test_workers_converge_on_version_bump(session_factory):
+    writer, reader = ConfigCache(), ConfigCache()
+    db = session_factory()
+    db.add(SystemConfig(key="hourly_rate", value="10"))
+    db.commit()
+    writer.load(db)
+    reader.load(db)
+    assert reader.get().hourly_rate == 10.0
+
+    for rate in ("12.5", "15"):
+        db.query(SystemConfig).filter(SystemConfig.key == "hourly_rate").update({SystemConfig.value: rate})
+        writer.bump(db)
+        db.commit()
+        writer.load(db)
+
+    assert writer.get().version == 2
+    assert writer.get().hourly_rate == 15.0
+    # The other worker still serves its snapshot until it polls the version
+    assert reader.get().hourly_rate == 10.0
+    assert reader.refresh(session_factory()) is True
+    assert reader.get().hourly_rate == 15.0
+    assert reader.refresh(session_factory()) is False
+
+
+def test_invalid_values_fall_back_to_defaults(session_factory):
+    db = session_factory()
+    db.add_all([
+        SystemConfig(key="hourly_rate", value="ten"),
+        SystemConfig(key="cancellation_rule_2_percent", value="25"),
+    ])
+    db.commit()
+    snapshot = ConfigCache().load(db)
+    assert snapshot.hourly_rate == 10.0
+    assert snapshot.cancellation_rule_2_percent == 25.0
+
+
+def test_version_key_cannot_be_written_through_admin_config(session_factory):
+    db = session_factory()
+    ConfigCache().bump(db)
+    db.commit()
+    update = main.ConfigUpdate(configs=[main.ConfigItem(key="hourly_rate", value="12"),
+                                        main.ConfigItem(key=CONFIG_VERSION_KEY, value="0")])
+    with pytest.raises(HTTPException) as exc:
+        main.update_system_config(update, current_user=User(id=1, username="admin", role="admin"), db=db)
+    assert exc.value.status_code == 400
+    assert {c.key: c.value for c in session_factory().query(SystemConfig)} == {CONFIG_VERSION_KEY: "1"}
+
+
+def test_snapshots_do_not_share_values():
+    assert ConfigSnapshot().values is not ConfigSnapshot().values
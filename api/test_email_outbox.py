@@ -0,0 +1,138 @@
+import smtplib
+from datetime import datetime, timedelta
+
+import main
+from models import Booking, BookingAuditLog, EmailOutbox, User
+from services.email_outbox import MAX_ATTEMPTS, SEND_LEASE, claim_batch, deliver_batch, enqueue_email, retry_delay
+from utils import email
+
+
+class FakeSMTP:
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    def send(self, to_email, subject, body, is_html=False):
+        if to_email in self.errors:
+            raise self.errors[to_email]
+        self.sent.append(to_email)
+
+
+def test_dedupe_key_is_per_recipient(session_factory):
+    db = session_factory()
+    now = datetime(2026, 6, 1, 12, 0)
+    assert enqueue_email(db, "a@example.com", "Confirmed", "body", dedupe_key="booking-confirmed:1", now=now)
+    assert not enqueue_email(db, "A@example.com ", "Confirmed", "body", dedupe_key="booking-confirmed:1", now=now)
+    assert enqueue_email(db, "b@example.com", "Confirmed", "body", dedupe_key="booking-confirmed:1", now=now)
+    # No key: repeats are allowed (overstay reminders)
+    assert enqueue_email(db, "a@example.com", "Overstay", "body", now=now)
+    assert enqueue_email(db, "a@example.com", "Overstay", "body", now=now)
+    db.commit()
+    assert db.query(EmailOutbox).count() == 4
+
+
+def test_batch_outcomes_sent_retried_failed(session_factory):
+    db = session_factory()
+    now = datetime(2026, 6, 1, 12, 0)
+    for to in ("ok@example.com", "flaky@example.com", "gone@example.com"):
+        enqueue_email(db, to, "Hello", "body", now=now)
+    enqueue_email(db, "later@example.com", "Hello", "body", now=now + timedelta(minutes=1))
+    db.commit()
+
+    rows = claim_batch(db, now)
+    assert [row.to_email for row in rows] == ["ok@example.com", "flaky@example.com", "gone@example.com"]
+    # Leased rows are not handed to a second sender
+    assert claim_batch(session_factory(), now) == []
+
+    smtp = FakeSMTP({
+        "flaky@example.com": smtplib.SMTPServerDisconnected("dropped"),
+        "gone@example.com": smtplib.SMTPRecipientsRefused({"gone@example.com": (550, b"no such user")}),
+    })
+    assert deliver_batch(db, rows, smtp, now) == 1
+    assert smtp.sent == ["ok@example.com"]
+
+    status = {row.to_email: row for row in session_factory().query(EmailOutbox)}
+    assert status["ok@example.com"].status == "sent"
+    assert status["gone@example.com"].status == "failed"
+    flaky = status["flaky@example.com"]
+    assert (flaky.status, flaky.attempts) == ("pending", 1)
+    assert flaky.next_attempt_at == now + retry_delay(1)
+    assert status["later@example.com"].status == "pending"
+
+
+def test_expired_leases_count_as_attempts(session_factory):
+    db = session_factory()
+    now = datetime(2026, 6, 1, 12, 0)
+    enqueue_email(db, "crash@example.com", "Hello", "body", now=now)
+    db.commit()
+
+    # Every sender that claims it dies mid-send
+    assert [row.attempts for row in claim_batch(session_factory(), now)] == [0]
+    for attempt in range(1, MAX_ATTEMPTS):
+        now += SEND_LEASE
+        assert claim_batch(session_factory(), now - timedelta(seconds=1)) == []  # lease still held
+        reclaimed = claim_batch(session_factory(), now)
+        assert [(row.attempts, row.status) for row in reclaimed] == [(attempt, "sending")]
+    now += SEND_LEASE
+
+    # The last expired lease uses up its final attempt
+    assert claim_batch(session_factory(), now) == []
+    row = session_factory().query(EmailOutbox).one()
+    assert (row.status, row.attempts, row.last_error) == ("failed", MAX_ATTEMPTS, "Send lease expired")
+
+
+def test_failed_enqueue_is_rolled_back_on_its_own(session_factory, monkeypatch):
+    db = session_factory()
+    now = datetime.utcnow()
+    db.add(User(id=1, username="driver", email="d@example.com"))
+    db.add(Booking(id=1, user_id=1, spot_id=1, vehicle_id=1, name="n", email="d@example.com", phone="p",
+                   start_time=now + timedelta(days=1), end_time=now + timedelta(days=1, hours=1),
+                   payment_method="card", payment_amount=10, status="cancelled",
+                   refund_status="pending", refund_amount=10))
+    db.commit()
+
+    # The email row is written, then something fails before the call returns
+    def enqueue_then_fail(db, *args, **kwargs):
+        enqueue_email(db, *args, **kwargs)
+        raise RuntimeError("template error")
+    monkeypatch.setattr(main, "enqueue_email", enqueue_then_fail)
+
+    main.process_manual_refund(1, current_user=User(id=2, username="admin", role="admin"), db=db)
+
+    check = session_factory()
+    assert check.get(Booking, 1).refund_status == "refunded"
+    assert check.query(BookingAuditLog).count() == 1
+    assert check.query(EmailOutbox).count() == 0
+
+
+def test_smtp_session_reuses_connection(monkeypatch):
+    connections = []
+
+    class FakeServer:
+        def __init__(self, host, port, timeout=None):
+            self.messages = []
+            connections.append(self)
+
+        def starttls(self):
+            pass
+
+        def login(self, user, password):
+            pass
+
+        def sendmail(self, sender, to_email, message):
+            self.messages.append(to_email)
+
+        def quit(self):
+            pass
+
+    monkeypatch.setattr(email.smtplib, "SMTP", FakeServer)
+    monkeypatch.setattr(email, "MAIL_PORT", 587)
+    monkeypatch.setattr(email, "MAIL_USERNAME", "user")
+    monkeypatch.setattr(email, "MAIL_PASSWORD", "secret")
+
+    session = email.SMTPSession()
+    for i in range(3):
+        session.send(f"u{i}@example.com", "Hello", "body")
+    session.close()
+    assert len(connections) == 1
+    assert connections[0].messages == ["u0@example.com", "u1@example.com", "u2@example.com"]
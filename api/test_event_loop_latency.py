@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import event
+
+import main
+from models import Booking, EmailOutbox, LayoutConfigDB, ParkingSpot, User, Vehicle
+from services.email_outbox import OutboxSender
+from services.notifications import send_due_notifications
+from utils.layout import provision_spots
+
+ALERTS = 1000
+SMTP_SECONDS = 0.005  # one blocking SMTP round trip
+
+
+def p99(samples):
+    samples = sorted(samples)
+    return samples[int(len(samples) * 0.99) - 1]
+
+
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def seed(db, now):
+    db.add(LayoutConfigDB(rows=10, cols=10, floor="Ground"))
+    provision_spots(db, "Ground", 10, 10)
+    db.add_all([User(id=1, username="driver", email="d@example.com"), Vehicle(id=1, license_plate="LAT1", owner_name="d")])
+    db.flush()
+    spot_ids = [s.id for s in db.query(ParkingSpot.id)]
+    db.add_all([
+        Booking(id=i + 1, user_id=1, spot_id=spot_ids[i % len(spot_ids)], vehicle_id=1, name="n", email="e", phone="p",
+                start_time=now - timedelta(hours=3), end_time=now - timedelta(minutes=1), is_pre_alert_sent=True,
+                payment_method="card", payment_amount=10, status="active")
+        for i in range(ALERTS)
+    ])
+    # Awaiting the gateway's return redirect
+    db.add(Booking(id=ALERTS + 1, user_id=1, spot_id=spot_ids[0], vehicle_id=1, name="n", email="pay@example.com",
+                   phone="p", start_time=now + timedelta(days=1), end_time=now + timedelta(days=1, hours=2),
+                   payment_method="card", payment_amount=20, payment_status="pending", status="pending",
+                   latest_order_id=f"RP-{ALERTS + 1}-1"))
+    db.commit()
+
+
+def test_db_and_smtp_work_stays_off_the_event_loop_and_p99_holds(session_factory):
+    now = datetime.utcnow()
+    seed(session_factory(), now)
+
+    # Every SQL statement and SMTP send records whether it ran on the loop thread
+    statements = []
+    sends = []
+    engine = session_factory.kw["bind"]
+
+    def record_statement(*args):
+        statements.append(on_event_loop())
+    event.listen(engine, "before_cursor_execute", record_statement)
+
+    class SlowSMTP:
+        def send(self, to_email, subject, body, is_html=False):
+            time.sleep(SMTP_SECONDS)
+            sends.append((to_email, threading.current_thread().name, on_event_loop()))
+
+        def close(self):
+            pass
+
+    sender = OutboxSender(session_factory, workers=4, smtp_factory=SlowSMTP)
+
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+    main.app.dependency_overrides[main.get_db] = get_db
+
+    async def sample(client, n):
+        latencies = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            response = await client.get("/layout")
+            latencies.append(time.perf_counter() - t0)
+            assert response.status_code == 200
+        return latencies
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await sample(client, 5)  # warm up
+            baseline = await sample(client, 200)
+
+            # What notification_queue does when the deadlines come due at once,
+            # then the outbox senders delivering them, while map clients poll
+            worker = threading.Thread(target=send_due_notifications, args=(session_factory(), now, range(1, ALERTS + 1)))
+            worker.start()
+            sender.start()
+            loaded = []
+            while worker.is_alive() or len(sends) < ALERTS:
+                sender.wake()
+                loaded += await sample(client, 10)
+            worker.join()
+
+            # Async gateway endpoint: its DB work and confirmation email
+            response = await client.post("/payment/return", data={"rp_orderId": f"RP-{ALERTS + 1}-1", "rp_statusCode": "RP00"})
+            assert response.status_code == 303
+
+            deadline = asyncio.get_running_loop().time() + 30
+            while len(sends) < ALERTS + 1 and asyncio.get_running_loop().time() < deadline:
+                sender.wake()
+                await asyncio.sleep(0.01)
+        return baseline, loaded
+
+    try:
+        baseline, loaded = asyncio.run(scenario())
+    finally:
+        sender.stop()
+        event.remove(engine, "before_cursor_execute", record_statement)
+        main.app.dependency_overrides.pop(main.get_db, None)
+
+    assert len(sends) == ALERTS + 1
+    assert "pay@example.com" in [to for to, _, _ in sends]
+    assert session_factory().query(EmailOutbox).filter(EmailOutbox.status == "sent").count() == ALERTS + 1
+    assert session_factory().get(Booking, ALERTS + 1).status == "active"
+    # SMTP only on the outbox sender threads
+    assert {thread.rsplit("-", 1)[0] for _, thread, _ in sends} == {"email-outbox"}
+    assert not any(loop for _, _, loop in sends)
+    # No SQL on the event loop thread (sync endpoints and run_in_threadpool)
+    assert statements
+    assert not any(statements)
+    # Sending serially on the loop would stall requests for ~ALERTS * SMTP_SECONDS;
+    # the bound is loose so a busy runner doesn't flake it
+    assert len(loaded) >= 50
+    assert p99(loaded) < p99(baseline) + 0.05
@@ -0,0 +1,75 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import Booking, PromoCode
+from services.availability import AvailabilityIndex
+from services.deadlines import DeadlineQueue
+from services.holds import expire_holds
+
+
+def test_deadline_queue_fires_on_time_and_honours_changes():
+    fired = []
+    done = threading.Event()
+
+    def handler(keys):
+        fired.append((keys, datetime.utcnow()))
+        done.set()
+
+    queue = DeadlineQueue("test", handler)
+    queue.start()
+    try:
+        now = datetime.utcnow()
+        queue.schedule("late", now + timedelta(seconds=5))
+        queue.schedule("moved", now + timedelta(seconds=5))
+        queue.schedule("moved", now + timedelta(milliseconds=150))  # earlier deadline wakes the worker
+        queue.schedule("cancelled", now + timedelta(milliseconds=50))
+        queue.cancel("cancelled")
+
+        assert done.wait(2)
+        keys, at = fired[0]
+        assert keys == ["moved"]
+        assert timedelta(milliseconds=140) <= at - now < timedelta(milliseconds=500)
+        assert len(queue) == 1
+    finally:
+        queue.stop()
+
+
+def test_expired_hold_frees_spot_before_it_is_swept(session_factory):
+    now = datetime.utcnow()
+    start = now + timedelta(hours=1)
+    index = AvailabilityIndex()
+    index.track(Booking(id=1, spot_id=5, start_time=start, end_time=start + timedelta(hours=2),
+                        status="pending", hold_expires_at=now + timedelta(milliseconds=100)))
+    assert not index.is_free(5, start, start + timedelta(hours=1))
+    time.sleep(0.15)
+    assert index.is_free(5, start, start + timedelta(hours=1))
+
+
+def test_expire_holds_claims_once_and_releases_promo(session_factory):
+    now = datetime.utcnow()
+    db = session_factory()
+    promo = PromoCode(code="HOLD", discount_type="fixed", discount_value=1,
+                      expiry_date=now + timedelta(days=1), usage_limit=5, current_uses=2)
+    db.add(promo)
+    db.flush()
+    common = dict(user_id=1, spot_id=1, vehicle_id=1, name="n", email="e", phone="p",
+                  start_time=now + timedelta(hours=1), end_time=now + timedelta(hours=2),
+                  payment_method="card", payment_amount=10, payment_status="pending",
+                  promo_code_id=promo.id, status="pending")
+    db.add_all([
+        Booking(id=1, hold_expires_at=now - timedelta(seconds=1), **common),
+        Booking(id=2, hold_expires_at=now + timedelta(minutes=10), **common),
+        Booking(id=3, hold_expires_at=None, created_at=now - timedelta(hours=1), **common),  # pre-hold row
+    ])
+    db.commit()
+
+    expired = expire_holds(db, now)
+    assert sorted(b.id for b in expired) == [1, 3]
+    assert expire_holds(session_factory(), now) == []
+
+    check = session_factory()
+    assert {b.id: (b.status, b.payment_status) for b in check.query(Booking)} == {
+        1: ("expired", "failed"), 2: ("pending", "pending"), 3: ("expired", "failed"),
+    }
+    assert check.query(PromoCode).one().current_uses == 0
@@ -0,0 +1,45 @@
+import pytest
+from fastapi import HTTPException
+
+from services.idempotency import IdempotencyStore
+
+
+def test_retry_replays_first_response(session_factory):
+    store = IdempotencyStore()
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return {"id": len(calls)}
+
+    db = session_factory()
+    assert store.run(db, "bookings:1", "abc", {"spot": 1}, handler) == {"id": 1}
+
+    # Another worker: empty in-process cache, replay comes from the table
+    replay = IdempotencyStore().run(session_factory(), "bookings:1", "abc", {"spot": 1}, handler)
+    assert replay.status_code == 200
+    assert replay.body == b'{"id":1}'
+    assert len(calls) == 1
+
+    # Same key from another user is a different scope
+    assert store.run(db, "bookings:2", "abc", {"spot": 1}, handler) == {"id": 2}
+
+    with pytest.raises(HTTPException) as exc:
+        store.run(db, "bookings:1", "abc", {"spot": 2}, handler)
+    assert exc.value.status_code == 422
+
+
+def test_in_flight_key_conflicts_and_failures_release_it(session_factory):
+    store = IdempotencyStore()
+    db = session_factory()
+
+    def reenter():
+        with pytest.raises(HTTPException) as exc:
+            store.run(session_factory(), "payment_initiate:9", "k", {}, lambda: {})
+        assert exc.value.status_code == 409
+        raise RuntimeError("gateway down")
+
+    with pytest.raises(RuntimeError):
+        store.run(db, "payment_initiate:9", "k", {}, reenter)
+    # The crashed attempt released the key, so the retry runs
+    assert store.run(db, "payment_initiate:9", "k", {}, lambda: {"ok": True}) == {"ok": True}
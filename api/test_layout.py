@@ -0,0 +1,210 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from starlette.requests import Request
+
+import main
+from models import Booking, ParkingSpot, User
+from services import lot_events
+from services.layout_cache import LayoutCache
+from services.spot_catalog import SpotCatalog
+from utils.layout import provision_spots
+
+ADMIN = User(id=1, username="admin", role="admin")
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    # Keep the process-wide spot catalog and layout cache per test
+    catalog = SpotCatalog()
+    monkeypatch.setattr(main, "spot_catalog", catalog)
+    monkeypatch.setattr(lot_events, "spot_catalog", catalog)
+    cache = LayoutCache()
+    monkeypatch.setattr(main, "layout_cache", cache)
+    monkeypatch.setattr(lot_events, "layout_cache", cache)
+    return cache
+
+
+def get_layout(db, if_none_match=None, **params):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return main.get_layout(request=Request({"type": "http", "headers": headers}), db=db, **params)
+
+
+def floor_cells(db, floor):
+    return sorted((s.row, s.col) for s in db.query(ParkingSpot).filter(ParkingSpot.floor == floor))
+
+
+def test_provisioning_is_idempotent(session_factory):
+    db = session_factory()
+    assert provision_spots(db, "Ground", 3, 4) == 12
+    db.commit()
+    assert provision_spots(db, "Ground", 3, 4) == 0
+    db.commit()
+    assert len(floor_cells(db, "Ground")) == 12
+    # Other floors are provisioned separately
+    assert provision_spots(db, "Level 1", 2, 2) == 4
+    db.commit()
+    assert len(floor_cells(db, "Ground")) == 12
+
+
+def test_provisioning_skips_cells_another_worker_just_created(session_factory):
+    engine = session_factory.kw["bind"]
+    raced = []
+
+    # Another worker's lifespan fills in two cells between our read and our insert
+    def other_worker(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("INSERT") and not raced:
+            raced.append(True)
+            other = session_factory()
+            other.add_all([ParkingSpot(floor="Ground", row=0, col=0, label="A1"),
+                           ParkingSpot(floor="Ground", row=1, col=1, label="B2")])
+            other.commit()
+            other.close()
+    event.listen(engine, "before_cursor_execute", other_worker)
+    try:
+        db = session_factory()
+        provision_spots(db, "Ground", 2, 2)
+        db.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", other_worker)
+
+    assert raced
+    assert floor_cells(db, "Ground") == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+
+def test_resizing_a_floor_adds_and_removes_only_the_difference(session_factory):
+    db = session_factory()
+    main.update_layout(main.LayoutConfig(rows=3, cols=3, floor="Ground"), current_user=ADMIN, db=db)
+    kept = {(s.row, s.col): s.id for s in db.query(ParkingSpot) if s.row < 2 and s.col < 2}
+
+    main.update_layout(main.LayoutConfig(rows=2, cols=4, floor="Ground"), current_user=ADMIN, db=db)
+    assert floor_cells(db, "Ground") == [(r, c) for r in range(2) for c in range(4)]
+    # Surviving cells keep their spot rows (and so their bookings)
+    assert {(s.row, s.col): s.id for s in db.query(ParkingSpot) if s.row < 2 and s.col < 2} == kept
+
+    main.update_layout(main.LayoutConfig(rows=2, cols=4, floor="Ground"), current_user=ADMIN, db=db)
+    assert len(floor_cells(db, "Ground")) == 8
+
+
+def test_matching_etag_gets_an_empty_304(session_factory):
+    db = session_factory()
+    main.update_layout(main.LayoutConfig(rows=2, cols=2, floor="Ground"), current_user=ADMIN, db=db)
+
+    first = get_layout(db)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and len(json.loads(first.body)["spots"]) == 4
+
+    again = get_layout(db, if_none_match=etag)
+    assert again.status_code == 304
+    assert again.body == b""
+    assert again.headers["etag"] == etag
+    assert get_layout(db, if_none_match=f'"stale", W/{etag}').status_code == 304
+    assert get_layout(db, if_none_match='"stale"').status_code == 200
+
+
+def test_changes_invalidate_and_re_etag(session_factory, fresh_caches):
+    db = session_factory()
+    main.update_layout(main.LayoutConfig(rows=2, cols=2, floor="Ground"), current_user=ADMIN, db=db)
+    etag = get_layout(db).headers["etag"]
+    assert fresh_caches.get(("Ground", None, None)) is not None
+
+    fresh_caches.bump()
+    assert fresh_caches.get(("Ground", None, None)) is None
+    # Nothing changed, so the re-rendered body (and its ETag) is the same
+    assert get_layout(db, if_none_match=etag).status_code == 304
+
+    spot = db.query(ParkingSpot).filter(ParkingSpot.row == 0, ParkingSpot.col == 0).one()
+    main.toggle_spot_block(spot.id, current_user=ADMIN, db=db)
+    blocked = get_layout(db, if_none_match=etag)
+    assert blocked.status_code == 200 and blocked.headers["etag"] != etag
+
+    # floor_changed (resize) renders a new grid
+    main.update_layout(main.LayoutConfig(rows=2, cols=3, floor="Ground"), current_user=ADMIN, db=db)
+    resized = get_layout(db, if_none_match=blocked.headers["etag"])
+    assert resized.status_code == 200 and len(json.loads(resized.body)["spots"]) == 6
+
+
+def test_now_view_is_not_served_stale_after_a_booking(session_factory):
+    db = session_factory()
+    main.update_layout(main.LayoutConfig(rows=1, cols=2, floor="Ground"), current_user=ADMIN, db=db)
+    before = get_layout(db)
+    assert not any(s["is_booked"] for s in json.loads(before.body)["spots"])
+
+    now = datetime.utcnow()
+    spot = db.query(ParkingSpot).filter(ParkingSpot.col == 1).one()
+    booking = Booking(user_id=1, spot_id=spot.id, vehicle_id=1, name="n", email="e", phone="p",
+                      start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+                      payment_method="card", payment_amount=10, status="active")
+    db.add(booking)
+    db.commit()
+    lot_events.booking_changed(booking)
+
+    after = get_layout(db, if_none_match=before.headers["etag"])
+    assert after.status_code == 200
+    assert [s["is_booked"] for s in json.loads(after.body)["spots"]] == [False, True]
+
+
+def test_layouts_summary_counts_follow_bookings_and_blocks(session_factory):
+    db = session_factory()
+    main.update_layout(main.LayoutConfig(rows=1, cols=3, floor="Ground"), current_user=ADMIN, db=db)
+    main.update_layout(main.LayoutConfig(rows=1, cols=2, floor="Level 1"), current_user=ADMIN, db=db)
+    ev = db.query(ParkingSpot).filter(ParkingSpot.floor == "Ground", ParkingSpot.col == 2).one()
+    ev.spot_type = "ev"
+    db.commit()
+
+    def summaries():
+        return {f.floor: f.summary.model_dump() for f in main.get_all_layouts(db=db).floors}
+
+    assert summaries() == {
+        "Ground": {"free": {"standard": 2, "ev": 1}, "booked": {}, "blocked": {}},
+        "Level 1": {"free": {"standard": 2}, "booked": {}, "blocked": {}},
+    }
+
+    now = datetime.utcnow()
+    db.add(Booking(user_id=1, spot_id=ev.id, vehicle_id=1, name="n", email="e", phone="p",
+                   start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=1),
+                   payment_method="card", payment_amount=10, status="active"))
+    db.commit()
+    level1 = db.query(ParkingSpot).filter(ParkingSpot.floor == "Level 1", ParkingSpot.col == 0).one()
+    main.toggle_spot_block(level1.id, current_user=ADMIN, db=db)
+
+    assert summaries() == {
+        "Ground": {"free": {"standard": 2}, "booked": {"ev": 1}, "blocked": {}},
+        "Level 1": {"free": {"standard": 1}, "booked": {}, "blocked": {"standard": 1}},
+    }
+    # Floors and counts match the single-floor view
+    ground = next(f for f in main.get_all_layouts(db=db).floors if f.floor == "Ground")
+    assert [s.model_dump() for s in ground.spots] == json.loads(get_layout(db, floor="Ground").body)["spots"]
+
+
+def test_spot_changes_from_other_workers_are_reconciled(session_factory):
+    db = session_factory()
+    main.update_layout(main.LayoutConfig(rows=2, cols=2, floor="Ground"), current_user=ADMIN, db=db)
+    main.spot_catalog.load(db)
+    etag = get_layout(db).headers["etag"]
+
+    # Another worker blocks a spot, retypes one and widens the floor
+    other = session_factory()
+    blocked = other.query(ParkingSpot).filter(ParkingSpot.row == 0, ParkingSpot.col == 0).one()
+    blocked.is_blocked = True
+    ev = other.query(ParkingSpot).filter(ParkingSpot.row == 1, ParkingSpot.col == 1).one()
+    ev.spot_type = "ev"
+    other.query(main.LayoutConfigDB).filter(main.LayoutConfigDB.floor == "Ground").one().cols = 3
+    provision_spots(other, "Ground", 2, 3)
+    other.commit()
+    added = sorted(s.id for s in other.query(ParkingSpot).filter(ParkingSpot.col == 2))
+
+    # What monitor_tick does on this worker
+    tick = session_factory()
+    drift = main.spot_catalog.reconcile(tick)
+    assert drift == {"spots": sorted([blocked.id, ev.id] + added), "floors": ["Ground"]}
+    assert main.spot_catalog.get(blocked.id) is None
+    assert main.spot_catalog.get(ev.id).spot_type == "ev"
+    assert all(main.spot_catalog.get(spot_id) for spot_id in added)
+    lot_events.lot_resynced(tick.query(ParkingSpot).filter(ParkingSpot.id.in_(drift["spots"])).all(), drift["floors"])
+
+    resynced = get_layout(tick, if_none_match=etag)
+    assert resynced.status_code == 200 and len(json.loads(resynced.body)["spots"]) == 6
+    assert main.spot_catalog.reconcile(tick) == {"spots": [], "floors": []}
@@ -0,0 +1,44 @@
+import asyncio
+import json
+import threading
+
+from services.live_updates import LiveUpdateBroker
+
+
+def test_publish_from_thread_fans_out_per_floor():
+    async def scenario():
+        broker = LiveUpdateBroker()
+        broker.bind(asyncio.get_running_loop())
+        ground = [broker.subscribe("Ground") for _ in range(1000)]
+        level1 = broker.subscribe("Level 1")
+
+        # Request handlers publish from worker threads
+        t = threading.Thread(target=broker.publish, args=("Ground", {"type": "delta", "spots": [{"id": 7}]}))
+        t.start()
+        t.join()
+        await asyncio.sleep(0)
+
+        messages = [q.get_nowait() for q in ground]
+        assert all(m is messages[0] for m in messages)  # serialized once
+        assert json.loads(messages[0])["spots"] == [{"id": 7}]
+        assert level1.empty()
+
+        broker.unsubscribe("Ground", ground[0])
+        assert broker.subscriber_count("Ground") == 999
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_gets_resync():
+    async def scenario():
+        broker = LiveUpdateBroker(queue_size=2)
+        broker.bind(asyncio.get_running_loop())
+        queue = broker.subscribe("Ground")
+        for i in range(3):
+            broker.publish("Ground", {"type": "delta", "n": i})
+        await asyncio.sleep(0)
+
+        assert json.loads(queue.get_nowait()) == {"type": "resync"}
+        assert queue.empty()
+
+    asyncio.run(scenario())
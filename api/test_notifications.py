@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+from models import Booking, EmailOutbox, ParkingSpot, User, Vehicle
+from services.notifications import (
+    EXPIRY, OVERSTAY, PRE_ALERT, load_notifications, next_notification, notification_queue,
+    send_due_notifications,
+)
+
+
+def test_next_notification_follows_alert_flags():
+    end = datetime(2026, 6, 1, 12, 0)
+    assert next_notification(end, False, False, None, end - timedelta(hours=2)) == (PRE_ALERT, end - timedelta(minutes=15))
+    # Too late for a useful pre-alert: straight to expiry
+    assert next_notification(end, False, False, None, end - timedelta(minutes=5)) == (EXPIRY, end)
+    assert next_notification(end, True, False, None, end) == (EXPIRY, end)
+    sent = end + timedelta(minutes=1)
+    assert next_notification(end, True, True, sent, end + timedelta(hours=1)) == (OVERSTAY, sent + timedelta(hours=6))
+
+
+def test_due_alerts_are_claimed_once_and_requeued(session_factory):
+    now = datetime(2026, 6, 1, 11, 45)
+    db = session_factory()
+    db.add_all([
+        User(id=1, username="driver", email="d@example.com"),
+        ParkingSpot(id=1, row=0, col=0, floor="Ground"),
+        Vehicle(id=1, license_plate="ABC123", owner_name="d"),
+    ])
+    common = dict(user_id=1, spot_id=1, vehicle_id=1, name="n", email="e", phone="p",
+                  start_time=now - timedelta(hours=2), payment_method="card", payment_amount=10, status="active")
+    db.add_all([
+        Booking(id=1, end_time=now + timedelta(minutes=15), **common),   # pre-alert due now
+        Booking(id=2, end_time=now - timedelta(minutes=1), is_pre_alert_sent=True, **common),  # expired
+        Booking(id=3, end_time=now + timedelta(hours=5), **common),      # beyond the horizon
+    ])
+    db.commit()
+
+    notification_queue._deadlines.clear()
+    notification_queue._heap.clear()
+    try:
+        assert load_notifications(db, now) == 2
+        assert sorted(notification_queue.pop_due(now)) == [1, 2]
+
+        assert send_due_notifications(db, now, [1, 2]) == [(1, PRE_ALERT), (2, EXPIRY)]
+        # A second worker firing the same deadlines finds them claimed
+        assert send_due_notifications(session_factory(), now, [1, 2]) == []
+        queued = [row.subject for row in db.query(EmailOutbox).order_by(EmailOutbox.id)]
+        assert queued == ["Parking Expiring Soon - ParkPro", "Parking Expired - ParkPro"]
+
+        # Booking 1's expiry is requeued; booking 2's overstay reminder is
+        # 6 hours out, beyond the horizon, so a later refill queues it
+        assert notification_queue._deadlines == {1: now + timedelta(minutes=15)}
+    finally:
+        notification_queue._deadlines.clear()
+        notification_queue._heap.clear()
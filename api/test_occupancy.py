@@ -0,0 +1,76 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import main
+from models import LayoutConfigDB, ParkingSpot, User
+from services.occupancy import occupancy_matrix, to_datetime64
+
+WINDOW_START = datetime(2030, 1, 6, 0, 0)
+SLOT_MINUTES = 15
+N_SLOTS = 7 * 24 * 4
+
+
+def naive_matrix(spot_ids, bookings):
+    counts = np.zeros((len(spot_ids), N_SLOTS), dtype=np.int32)
+    slot = timedelta(minutes=SLOT_MINUTES)
+    for spot_id, start, end in bookings:
+        if spot_id not in spot_ids:
+            continue
+        row = spot_ids.index(spot_id)
+        for i in range(N_SLOTS):
+            slot_start = WINDOW_START + i * slot
+            if start < slot_start + slot and end > slot_start:
+                counts[row, i] += 1
+    return counts
+
+
+def test_matches_naive_scan():
+    rng = random.Random(42)
+    spot_ids = [5, 3, 9, 12]
+    bookings = []
+    for _ in range(200):
+        start = WINDOW_START + timedelta(minutes=rng.randint(-600, 7 * 24 * 60))
+        end = start + timedelta(minutes=rng.randint(1, 600))
+        bookings.append((rng.choice(spot_ids + [99]), start, end))
+
+    b_spot_ids, starts, ends = zip(*bookings)
+    result = occupancy_matrix(
+        spot_ids, b_spot_ids, to_datetime64(starts), to_datetime64(ends),
+        WINDOW_START, SLOT_MINUTES, N_SLOTS
+    )
+    assert (result == naive_matrix(spot_ids, bookings)).all()
+
+
+def test_partial_slots_are_covered():
+    start = WINDOW_START + timedelta(minutes=5)
+    end = WINDOW_START + timedelta(minutes=20)
+    result = occupancy_matrix(
+        [1], [1], to_datetime64([start]), to_datetime64([end]),
+        WINDOW_START, SLOT_MINUTES, 4
+    )
+    assert result.tolist() == [[1, 1, 0, 0]]
+
+
+def test_heatmap_omits_per_spot_matrix_unless_asked(session_factory):
+    db = session_factory()
+    db.add(LayoutConfigDB(floor="Ground", rows=10, cols=10))
+    db.add_all([ParkingSpot(row=r, col=c, floor="Ground") for r in range(10) for c in range(10)])
+    db.commit()
+    admin = User(id=1, username="admin", role="admin")
+    start = "2030-01-06T00:00:00Z"
+
+    floor = main.get_occupancy_heatmap(start_time=start, days=1, current_user=admin, db=db).floors[0]
+    assert floor.occupancy is None
+    assert len(floor.occupied) == 96
+
+    floor = main.get_occupancy_heatmap(start_time=start, days=1, include_spots=True, current_user=admin, db=db).floors[0]
+    assert len(floor.occupancy) == 100 and len(floor.occupancy[0]) == 96
+
+    # 100 spots x 2,976 slots is over the cap
+    with pytest.raises(HTTPException) as exc:
+        main.get_occupancy_heatmap(start_time=start, days=31, include_spots=True, current_user=admin, db=db)
+    assert exc.value.status_code == 400
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from models import Booking
+from utils.pagination import CountCache, decode_cursor, encode_cursor, paginate_bookings
+
+
+def add_bookings(db, n):
+    t0 = datetime(2026, 1, 1)
+    db.add_all([
+        Booking(user_id=1, spot_id=1, vehicle_id=1, name="n", email="e", phone="p",
+                start_time=t0, end_time=t0, payment_method="card", payment_amount=1,
+                created_at=t0 + timedelta(minutes=i // 4))  # ties on created_at
+        for i in range(n)
+    ])
+    db.commit()
+
+
+def test_cursor_walk_matches_offset_order(session_factory):
+    db = session_factory()
+    add_bookings(db, 37)
+    expected = [b.id for b in db.query(Booking).order_by(Booking.created_at.desc(), Booking.id.desc())]
+
+    walked, cursor = [], None
+    while True:
+        page, cursor = paginate_bookings(db.query(Booking), 5, cursor=cursor)
+        walked += [b.id for b in page]
+        if cursor is None:
+            break
+    assert walked == expected
+
+    page, _ = paginate_bookings(db.query(Booking), 5, page=3)
+    assert [b.id for b in page] == expected[10:15]
+
+
+def test_cursor_round_trip_and_count_cache():
+    created_at = datetime(2026, 5, 1, 8, 30, 15)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+    calls = []
+    counts = CountCache(ttl=60)
+    assert counts.get("all", lambda: calls.append(1) or 7) == 7
+    assert counts.get("all", lambda: calls.append(1) or 8) == 7
+    assert len(calls) == 1
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+from models import PromoCode
+from services.pricing import overstay_fee, overstay_hours, price, price_batch, price_with_promo
+
+
+def test_batch_matches_single_quotes():
+    start = datetime(2026, 3, 1, 9, 0)
+    ends = [start + timedelta(minutes=m) for m in (20, 90, 150, 601)]
+    types = ["standard", "ev", "vip", None]
+    base, discount, total = price_batch([start] * 4, ends, types, 10.0, [10, 0, 0, 0], [0, 5, 100, 0])
+
+    for n, (end, spot_type) in enumerate(zip(ends, types)):
+        promo = None
+        if n == 0:
+            promo = PromoCode(discount_type="percentage", discount_value=10)
+        elif n in (1, 2):
+            promo = PromoCode(discount_type="fixed", discount_value=[5, 100][n - 1])
+        assert price(start, end, spot_type, 10.0, promo) == (base[n], discount[n], total[n])
+
+    assert base.tolist() == [3.33, 22.5, 50.0, 100.17]
+    assert total[2] == 0.0  # fixed discount capped at the base amount
+
+
+def test_promo_covers_only_remaining_uses():
+    start = datetime(2026, 3, 1, 9, 0)
+    promo = PromoCode(discount_type="fixed", discount_value=2)
+    _, discount, _, applied = price_with_promo([start] * 3, [start + timedelta(hours=1)] * 3, ["standard"] * 3, 10.0, promo, 2)
+    assert applied.tolist() == [True, True, False]
+    assert discount.tolist() == [2.0, 2.0, 0.0]
+
+
+def test_overstay_bills_started_hours():
+    end = datetime(2026, 3, 1, 12, 0)
+    assert overstay_hours(end, end) == 0
+    assert overstay_hours(end, end + timedelta(minutes=61)) == 2
+    assert overstay_fee(end, end + timedelta(minutes=5), 10.0, "vip") == 20.0
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import PromoCode
+from services.promo_cache import PromoCache
+
+
+def test_hits_and_misses_are_cached_until_cleared(session_factory):
+    db = session_factory()
+    queries = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: queries.append(1))
+
+    cache = PromoCache()
+    assert cache.lookup(db, "summer") is None
+    assert cache.lookup(db, "SUMMER") is None
+    assert len(queries) == 1  # negative result cached
+
+    db.add(PromoCode(code="SUMMER", discount_type="fixed", discount_value=5,
+                     expiry_date=datetime.utcnow() + timedelta(days=1), usage_limit=10))
+    db.commit()
+    cache.clear()  # what the admin promo endpoints do
+
+    queries.clear()
+    promo = cache.lookup(db, "summer")
+    assert promo.code == "SUMMER" and promo.discount_value == 5.0
+    assert cache.lookup(db, "Summer") is promo
+    assert len(queries) == 1
+
+
+def test_entries_expire_and_stay_bounded(session_factory, count_queries):
+    db = session_factory()
+    cache = PromoCache(max_entries=3)
+    for code in ("A", "B", "C", "D"):
+        cache.lookup(db, code)
+    # The oldest entry was evicted; the rest are still served from memory
+    with count_queries(db) as queries:
+        for code in ("B", "C", "D"):
+            cache.lookup(db, code)
+    assert queries.count == 0
+    with count_queries(db) as queries:
+        cache.lookup(db, "A")
+    assert queries.count == 1
+
+    expiring = PromoCache(ttl=0, negative_ttl=0)
+    assert expiring.lookup(db, "B") is None
+    db.add(PromoCode(code="B", discount_type="fixed", discount_value=1,
+                     expiry_date=datetime.utcnow() + timedelta(days=1), usage_limit=1))
+    db.commit()
+    assert expiring.lookup(db, "B") is not None  # expired negative entry re-read
+    with count_queries(db) as queries:
+        expiring.lookup(db, "B")
+    assert queries.count == 1
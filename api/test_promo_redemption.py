@@ -0,0 +1,62 @@
+import threading
+from datetime import datetime, timedelta
+
+from models import PromoCode
+from services.promo_redemption import redeem_promo, redeem_promo_up_to, release_promo
+
+N_THREADS = 12
+ATTEMPTS = 5
+LIMIT = 20
+
+
+def add_promo(session_factory, limit=LIMIT):
+    db = session_factory()
+    promo = PromoCode(code="HOT", discount_type="fixed", discount_value=5,
+                      expiry_date=datetime.utcnow() + timedelta(days=1), usage_limit=limit)
+    db.add(promo)
+    db.commit()
+    promo_id = promo.id
+    db.close()
+    return promo_id
+
+
+def current_uses(session_factory, promo_id):
+    db = session_factory()
+    try:
+        return db.query(PromoCode.current_uses).filter(PromoCode.id == promo_id).scalar()
+    finally:
+        db.close()
+
+
+def test_parallel_redemptions_never_oversubscribe(session_factory):
+    promo_id = add_promo(session_factory)
+    barrier = threading.Barrier(N_THREADS)
+    granted = []
+
+    def worker():
+        db = session_factory()
+        barrier.wait()
+        for _ in range(ATTEMPTS):
+            if redeem_promo(db, promo_id, datetime.utcnow()):
+                granted.append(1)
+            db.commit()
+        db.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(N_THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(granted) == LIMIT
+    assert current_uses(session_factory, promo_id) == LIMIT
+
+
+def test_partial_grant_and_release(session_factory):
+    promo_id = add_promo(session_factory, limit=3)
+    db = session_factory()
+    assert redeem_promo_up_to(db, promo_id, datetime.utcnow(), 5) == 3
+    assert redeem_promo_up_to(db, promo_id, datetime.utcnow(), 1) == 0
+    release_promo(db, promo_id, 2)
+    db.commit()
+    assert current_uses(session_factory, promo_id) == 1
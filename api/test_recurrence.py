@@ -0,0 +1,113 @@
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import main
+from models import Booking, LayoutConfigDB, ParkingSpot, RecurringBookingCreate, User
+from services.holds import HOLD_TTL, SERIES_PAYMENT_LEAD, expire_holds
+from services.occupancy import to_datetime64
+from services.recurrence import conflicting_occurrences, expand_occurrences
+
+
+def test_weekday_rule_walks_local_dates():
+    myt = timezone(timedelta(hours=8))
+    start = datetime(2026, 1, 5, 8, 0, tzinfo=myt)  # Monday 08:00 local, Sunday 00:00 UTC
+    occurrences = expand_occurrences(start, start + timedelta(hours=9), "daily", date(2026, 1, 18), weekdays=[0, 1, 2, 3, 4])
+
+    assert len(occurrences) == 10
+    assert all(s.weekday() < 5 for s, _ in occurrences)
+    assert occurrences[5][0] == datetime(2026, 1, 12, 8, 0, tzinfo=myt)
+
+
+def test_weekly_interval_and_limit():
+    start = datetime(2026, 1, 7, 9, 0)  # Wednesday
+    occurrences = expand_occurrences(start, start + timedelta(hours=1), "weekly", date(2026, 3, 1), interval=2)
+    assert [s.date() for s, _ in occurrences] == [date(2026, 1, 7), date(2026, 1, 21), date(2026, 2, 4), date(2026, 2, 18)]
+
+    with pytest.raises(ValueError):
+        expand_occurrences(start, start + timedelta(hours=1), "daily", date(2027, 6, 1))
+
+
+def test_conflict_mask_matches_pairwise_overlap():
+    rng = np.random.default_rng(7)
+    origin = datetime(2026, 1, 1)
+    starts = [origin + timedelta(days=d, hours=8) for d in range(60)]
+    ends = [s + timedelta(hours=9) for s in starts]
+    existing = []
+    for _ in range(40):
+        s = origin + timedelta(minutes=int(rng.integers(0, 60 * 24 * 60)))
+        existing.append((s, s + timedelta(minutes=int(rng.integers(15, 60 * 30)))))
+
+    mask = conflicting_occurrences(
+        to_datetime64(starts), to_datetime64(ends),
+        to_datetime64([s for s, _ in existing]), to_datetime64([e for _, e in existing]),
+    )
+    expected = [any(es < e and ee > s for es, ee in existing) for s, e in zip(starts, ends)]
+    assert mask.tolist() == expected
+    assert not conflicting_occurrences(to_datetime64(starts), to_datetime64(ends), to_datetime64([]), to_datetime64([])).any()
+
+
+def test_series_occurrences_hold_until_shortly_before_they_start(session_factory):
+    db = session_factory()
+    db.add(LayoutConfigDB(floor="Ground", rows=1, cols=1))
+    db.add(ParkingSpot(floor="Ground", row=0, col=0))
+    db.commit()
+    now = datetime.utcnow()
+    first = (now + timedelta(hours=2)).replace(microsecond=0)
+    rule = RecurringBookingCreate(
+        row=0, col=0, floor="Ground", license_plate="DAILY1", name="n", email="e@example.com", phone="p",
+        start_time=first, end_time=first + timedelta(hours=1), frequency="daily",
+        until=(first + timedelta(days=3)).date(), payment_method="card",
+    )
+    series = main.create_recurring_booking(rule, current_user=User(id=1, username="u", role="customer"), db=db)
+    assert series.booked == 4
+    ids = [b.id for b in series.bookings]
+
+    def statuses():
+        check = session_factory()
+        return [check.get(Booking, i).status for i in ids]
+
+    # The first occurrence is due now, like a single booking
+    assert [b.id for b in expire_holds(session_factory(), now + HOLD_TTL + timedelta(seconds=1))] == ids[:1]
+    assert statuses() == ["expired", "pending", "pending", "pending"]
+
+    # Occurrences are paid one at a time
+    paid = db.get(Booking, ids[2])
+    paid.status, paid.payment_status = "active", "paid"
+    db.commit()
+
+    # Each later one lapses only once its own payment deadline passes
+    second = first + timedelta(days=1) - SERIES_PAYMENT_LEAD
+    assert expire_holds(session_factory(), second - timedelta(seconds=1)) == []
+    assert [b.id for b in expire_holds(session_factory(), second)] == ids[1:2]
+    assert [b.id for b in expire_holds(session_factory(), first + timedelta(days=3))] == ids[3:]
+    assert statuses() == ["expired", "expired", "active", "expired"]
+
+
+def test_series_accepts_mixed_aware_and_naive_times(session_factory):
+    db = session_factory()
+    db.add(LayoutConfigDB(floor="Ground", rows=1, cols=1))
+    db.add(ParkingSpot(floor="Ground", row=0, col=0))
+    db.commit()
+    sgt = timezone(timedelta(hours=8))
+    first = (datetime.utcnow() + timedelta(days=1)).replace(hour=1, minute=0, second=0, microsecond=0)
+
+    def book(start_time, end_time):
+        rule = RecurringBookingCreate(
+            row=0, col=0, floor="Ground", license_plate="MIXED1", name="n", email="e@example.com", phone="p",
+            start_time=start_time, end_time=end_time, frequency="daily",
+            until=(first + timedelta(days=1)).date(), payment_method="card",
+        )
+        return main.create_recurring_booking(rule, current_user=User(id=1, username="u", role="customer"), db=db)
+
+    # 09:00+08:00 to a naive (UTC) 02:00 is one hour, not a TypeError
+    series = book(first.replace(tzinfo=timezone.utc).astimezone(sgt), first + timedelta(hours=1))
+    assert [(b.start_time, b.end_time) for b in series.bookings] == [
+        (first.replace(tzinfo=timezone.utc) + timedelta(days=d), first.replace(tzinfo=timezone.utc) + timedelta(days=d, hours=1))
+        for d in range(2)
+    ]
+    # And the other way round, with the end before the start
+    with pytest.raises(main.HTTPException) as exc:
+        book(first + timedelta(days=1), (first + timedelta(days=1) - timedelta(hours=1)).replace(tzinfo=timezone.utc).astimezone(sgt))
+    assert exc.value.status_code == 400
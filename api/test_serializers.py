@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+
+import main
+from models import Booking, ParkingSpot, PromoCode, Vehicle
+from utils.serializers import booking_json, booking_rows, dumps
+
+
+def seed(db):
+    t0 = datetime(2026, 4, 1, 9, 30, 0, 250000)
+    db.add_all([
+        ParkingSpot(id=1, row=2, col=4, floor="Level 1", spot_type="ev"),
+        Vehicle(id=1, license_plate="JHR77", owner_name="Siti", make="Proton", year=2020, created_at=t0, updated_at=t0),
+        PromoCode(id=1, code="NEW10", discount_type="fixed", discount_value=10, expiry_date=t0, usage_limit=5),
+        Booking(id=1, user_id=1, spot_id=1, vehicle_id=1, booking_uuid="u-1", name="Siti", email="s@example.com",
+                phone="012", start_time=datetime(2026, 4, 2, 8), end_time=datetime(2026, 4, 2, 10, 15),
+                payment_method="card", payment_amount=17.5, discount_amount=10, promo_code_id=1,
+                refund_amount=0, excess_fee=None, created_at=t0),
+    ])
+    db.commit()
+
+
+def test_booking_json_matches_pydantic_output(session_factory):
+    db = session_factory()
+    seed(db)
+    expected = main.build_booking_response(db.get(Booking, 1), can_cancel=True).model_dump(mode="json")
+    expected_bytes = json.dumps(expected, ensure_ascii=False, separators=(",", ":")).encode()
+
+    row = booking_rows(db).filter(Booking.id == 1).one()
+    assert dumps(booking_json(row, can_cancel=True)) == expected_bytes
+
+
+def test_bookings_without_spot_or_vehicle_rows_are_still_listed(session_factory):
+    db = session_factory()
+    seed(db)
+    # Rows left behind by a removed spot/vehicle (SQLite doesn't enforce the FKs)
+    db.add(Booking(id=2, user_id=1, spot_id=99, vehicle_id=99, name="Old", email="o@example.com", phone="013",
+                   start_time=datetime(2026, 4, 3, 8), end_time=datetime(2026, 4, 3, 9),
+                   payment_method="card", payment_amount=5, refund_amount=0))
+    db.commit()
+
+    # Same rows as the plain Booking count used for the page total
+    assert booking_rows(db).count() == db.query(Booking).count() == 2
+    orphan = booking_json(booking_rows(db).filter(Booking.id == 2).one())
+    assert (orphan["spot_info"], orphan["vehicle"], orphan["payment_amount"]) == ("N/A", None, 5.0)
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+import main
+from models import Booking, BookingCreate, LayoutConfigDB, ParkingSpot, PromoCode, QuoteItem, QuoteRequest, User
+from services import lot_events
+from services.availability import AvailabilityIndex
+from services.config_cache import ConfigCache
+from services.promo_cache import PromoCache
+from services.spot_catalog import SpotCatalog
+
+START = datetime(2030, 1, 7, 9, 0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalog(monkeypatch):
+    # Loaded lazily by the endpoints; keep it per test
+    catalog = SpotCatalog()
+    monkeypatch.setattr(main, "spot_catalog", catalog)
+    monkeypatch.setattr(lot_events, "spot_catalog", catalog)
+    return catalog
+
+
+@pytest.fixture
+def lot(session_factory):
+    db = session_factory()
+    db.add_all([
+        LayoutConfigDB(floor="Ground", rows=2, cols=2),
+        LayoutConfigDB(floor="Level 1", rows=1, cols=2),
+    ])
+    spots = {
+        "G-A1": ParkingSpot(floor="Ground", row=0, col=0, label="A1"),
+        "G-A2": ParkingSpot(floor="Ground", row=0, col=1, label="A2", spot_type="ev"),
+        "G-B1": ParkingSpot(floor="Ground", row=1, col=0, label="B1", is_blocked=True),
+        "G-B2": ParkingSpot(floor="Ground", row=1, col=1, label="B2"),
+        "G-C1": ParkingSpot(floor="Ground", row=2, col=0, label="C1"),  # outside the grid
+        "L1-A1": ParkingSpot(floor="Level 1", row=0, col=0, label="A1"),
+        "L1-A2": ParkingSpot(floor="Level 1", row=0, col=1, label="A2", spot_type="ev"),
+    }
+    db.add_all(spots.values())
+    db.flush()
+    common = dict(user_id=1, vehicle_id=1, name="n", email="e", phone="p",
+                  payment_method="card", payment_amount=10)
+    db.add_all([
+        # Held (unpaid) over part of the searched window
+        Booking(spot_id=spots["G-A1"].id, start_time=START + timedelta(hours=1), end_time=START + timedelta(hours=3),
+                status="pending", hold_expires_at=START + timedelta(days=1), **common),
+        # Checked out before the window starts
+        Booking(spot_id=spots["G-B2"].id, start_time=START - timedelta(hours=2), end_time=START,
+                status="completed", **common),
+        # Still parked past its end (an overstay); the booking check doesn't
+        # hold the spot for later windows, so neither does the search
+        Booking(spot_id=spots["L1-A1"].id, start_time=START - timedelta(hours=3), end_time=START - timedelta(hours=1),
+                status="active", **common),
+    ])
+    db.commit()
+    return db, {name: spot.id for name, spot in spots.items()}
+
+
+def search(db, **params):
+    params.setdefault("start_time", START.isoformat() + "Z")
+    params.setdefault("end_time", (START + timedelta(hours=2)).isoformat() + "Z")
+    return [spot.id for spot in main.search_spots(db=db, **params).spots]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_search_ranks_free_bookable_spots(lot, indexed, monkeypatch):
+    db, ids = lot
+    if indexed:
+        index = AvailabilityIndex()
+        index.load(db)
+        monkeypatch.setattr(main, "availability_index", index)
+
+    # Booked, blocked and off-grid spots never come back; preferred floor first
+    assert search(db, count=10) == [ids["G-A2"], ids["G-B2"], ids["L1-A1"], ids["L1-A2"]]
+    assert search(db, count=10, floor="Level 1") == [ids["L1-A1"], ids["L1-A2"], ids["G-A2"], ids["G-B2"]]
+    assert search(db, count=10, spot_type="ev") == [ids["G-A2"], ids["L1-A2"]]
+    assert search(db, count=1, spot_type="standard") == [ids["G-B2"]]
+    # Every result passes create_booking's overlap check
+    end = START + timedelta(hours=2)
+    assert not any(main.find_overlapping_bookings(db, [spot_id], START, end) for spot_id in search(db, count=10))
+    assert main.find_overlapping_bookings(db, [ids["G-A1"]], START, end)
+    # Outside the booking's window the spot is free again
+    later = START + timedelta(hours=3)
+    assert ids["G-A1"] in search(db, count=10, start_time=later.isoformat() + "Z",
+                                 end_time=(later + timedelta(hours=1)).isoformat() + "Z")
+
+
+def test_search_rejects_bad_requests(lot):
+    db, _ = lot
+    for params in ({"count": 0}, {"count": main.MAX_SEARCH_RESULTS + 1}, {"start_time": "soon"},
+                   {"end_time": START.isoformat() + "Z"}):
+        with pytest.raises(HTTPException) as exc:
+            search(db, **params)
+        assert exc.value.status_code == 400
+
+
+def test_quotes_load_the_catalog_on_first_use(lot, fresh_catalog, monkeypatch):
+    db, ids = lot
+    monkeypatch.setattr(main, "config_cache", ConfigCache())  # 10.00/hour
+    monkeypatch.setattr(main, "promo_cache", PromoCache())
+    db.add(PromoCode(code="TENOFF", discount_type="percentage", discount_value=10,
+                     expiry_date=START + timedelta(days=1), usage_limit=5))
+    db.commit()
+    assert not fresh_catalog.loaded
+
+    def quote(spot_id, hours=2, promo_code=None):
+        return QuoteItem(spot_id=spot_id, start_time=START, end_time=START + timedelta(hours=hours), promo_code=promo_code)
+
+    response = main.create_quotes(QuoteRequest(items=[
+        quote(ids["G-A1"]),
+        quote(ids["G-A2"], promo_code="tenoff"),
+        quote(ids["G-B1"]),  # blocked
+        quote(ids["G-C1"]),  # outside the grid
+        quote(ids["L1-A1"], hours=0),
+        quote(ids["L1-A1"], promo_code="NOPE"),
+    ]), db=db)
+
+    assert fresh_catalog.loaded
+    assert response.hourly_rate == 10.0
+    assert [(q.spot_type, q.base_amount, q.discount_amount, q.total_amount, q.promo_applied) for q in response.quotes[:2]] == [
+        ("standard", 20.0, 0.0, 20.0, False),
+        ("ev", 30.0, 3.0, 27.0, True),
+    ]
+    assert [q.error for q in response.quotes[2:]] == [
+        "Spot not found or not bookable", "Spot not found or not bookable", "End time must be after start time", None,
+    ]
+    assert (response.quotes[5].total_amount, response.quotes[5].promo_applied) == (20.0, False)
+
+
+def test_quote_matches_the_booking_it_produces(lot, monkeypatch):
+    db, ids = lot
+    monkeypatch.setattr(main, "config_cache", ConfigCache())  # 10.00/hour
+    monkeypatch.setattr(main, "promo_cache", PromoCache())
+    # 12.5% of an EV hour (15.00) is 1.875
+    db.add(PromoCode(code="EIGHTH", discount_type="percentage", discount_value=12.5,
+                     expiry_date=START + timedelta(days=1), usage_limit=5))
+    db.commit()
+    end = START + timedelta(hours=1)
+
+    quote = main.create_quotes(QuoteRequest(items=[
+        QuoteItem(spot_id=ids["L1-A2"], start_time=START, end_time=end, promo_code="EIGHTH"),
+    ]), db=db).quotes[0]
+    # Amounts as sent to the DB, before DECIMAL(10,2) rounds them its own way
+    inserted = []
+    record = lambda mapper, conn, booking: inserted.append((booking.discount_amount, booking.payment_amount))
+    event.listen(Booking, "before_insert", record)
+    try:
+        main.create_booking(BookingCreate(
+            row=0, col=1, floor="Level 1", license_plate="CENT1", name="n", email="e@example.com", phone="p",
+            start_time=START, end_time=end, payment_method="card", payment_amount=0, promo_code="EIGHTH",
+        ), current_user=User(id=1, username="u", role="customer"), db=db, idempotency_key=None)
+    finally:
+        event.remove(Booking, "before_insert", record)
+
+    assert (quote.base_amount, quote.discount_amount, quote.total_amount) == (15.0, 1.88, 13.12)
+    assert inserted == [(quote.discount_amount, quote.total_amount)]
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import String, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.orm import Session
+
+from models import Booking, ParkingSpot, PromoCode, Vehicle
+from utils.booking_filters import BookingFilters
+
+EXPORT_CHUNK_ROWS = 5000
+
+
+class utc_text(ColumnElement):
+    """
+    A naive-UTC DATETIME rendered by the database as ISO 8601 with a Z
+    suffix (second precision), so rows arrive as ready-to-write strings.
+    """
+    inherit_cache = True
+    type = String()
+
+    def __init__(self, column):
+        self.column = column
+
+
+class money_text(ColumnElement):
+    """A NUMERIC amount rendered by the database with two decimals."""
+    inherit_cache = True
+    type = String()
+
+    def __init__(self, column):
+        self.column = column
+
+
+@compiles(utc_text)
+def _utc_text_default(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM-DD\"T\"HH24:MI:SS\"Z\"')" % compiler.process(element.column, **kw)
+
+
+@compiles(utc_text, "mysql")
+def _utc_text_mysql(element, compiler, **kw):
+    return "DATE_FORMAT(%s, '%%%%Y-%%%%m-%%%%dT%%%%H:%%%%i:%%%%sZ')" % compiler.process(element.column, **kw)
+
+
+@compiles(utc_text, "sqlite")
+def _utc_text_sqlite(element, compiler, **kw):
+    # SQLAlchemy stores "YYYY-MM-DD HH:MM:SS.ffffff"; slicing is far cheaper than strftime()
+    return "(replace(substr(%s, 1, 19), ' ', 'T') || 'Z')" % compiler.process(element.column, **kw)
+
+
+@compiles(money_text)
+def _money_text_default(element, compiler, **kw):
+    return "CAST(CAST(%s AS NUMERIC(10, 2)) AS VARCHAR(20))" % compiler.process(element.column, **kw)
+
+
+@compiles(money_text, "mysql")
+def _money_text_mysql(element, compiler, **kw):
+    return "CAST(%s AS CHAR)" % compiler.process(element.column, **kw)
+
+
+@compiles(money_text, "sqlite")
+def _money_text_sqlite(element, compiler, **kw):
+    column = compiler.process(element.column, **kw)
+    return "CASE WHEN %s IS NULL THEN NULL ELSE printf('%%.2f', %s) END" % (column, column)
+
+
+# (output name, column). Timestamps and amounts are formatted in SQL and
+# everything else is a plain string/int, so the encoders below write driver
+# rows as-is: no ORM objects, no per-value conversion in Python.
+EXPORT_COLUMNS = [
+    ("id", Booking.id),
+    ("booking_uuid", Booking.booking_uuid),
+    ("created_at", utc_text(Booking.created_at)),
+    ("status", Booking.status),
+    ("floor", ParkingSpot.floor),
+    ("row", ParkingSpot.row),
+    ("col", ParkingSpot.col),
+    ("spot_type", ParkingSpot.spot_type),
+    ("license_plate", Vehicle.license_plate),
+    ("name", Booking.name),
+    ("email", Booking.email),
+    ("phone", Booking.phone),
+    ("start_time", utc_text(Booking.start_time)),
+    ("end_time", utc_text(Booking.end_time)),
+    ("payment_method", Booking.payment_method),
+    ("payment_status", Booking.payment_status),
+    ("payment_amount", money_text(Booking.payment_amount)),
+    ("discount_amount", money_text(Booking.discount_amount)),
+    ("promo_code", PromoCode.code),
+    ("excess_fee", money_text(Booking.excess_fee)),
+    ("refund_status", Booking.refund_status),
+    ("refund_amount", money_text(Booking.refund_amount)),
+    ("cancellation_time", utc_text(Booking.cancellation_time)),
+    ("latest_order_id", Booking.latest_order_id),
+]
+EXPORT_FIELDS = [name for name, _ in EXPORT_COLUMNS]
+
+
+def export_statement(filters: Optional[BookingFilters] = None, now: Optional[datetime] = None):
+    stmt = (
+        select(*[column.label(name) for name, column in EXPORT_COLUMNS])
+        .select_from(Booking)
+        .outerjoin(ParkingSpot, ParkingSpot.id == Booking.spot_id)
+        .outerjoin(Vehicle, Vehicle.id == Booking.vehicle_id)
+        .outerjoin(PromoCode, PromoCode.id == Booking.promo_code_id)
+        .order_by(Booking.id)
+    )
+    if filters is not None:
+        stmt = filters.apply(stmt, now=now)
+    return stmt
+
+
+def export_chunks(db: Session, filters: Optional[BookingFilters] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[tuple]]:
+    """
+    Yields lists of row tuples through a server-side cursor (an unbuffered
+    SSCursor on MySQL), so memory is bounded by one chunk however large the
+    export is. Runs on its own Core connection: the stream outlives the
+    request handler, and plain rows skip the ORM loading layer entirely.
+    """
+    with db.get_bind().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(export_statement(filters))
+        for partition in result.partitions():
+            yield partition
+
+
+def csv_lines(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def ndjson_lines(chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    # Amounts stay decimal strings, as in the CSV: no float rounding for finance
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    fields = EXPORT_FIELDS
+    for rows in chunks:
+        yield "".join([dumps(dict(zip(fields, row))) + "\n" for row in rows]).encode()
+
+
+def gzipped(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Streams a single gzip member; each input chunk is compressed as it arrives."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
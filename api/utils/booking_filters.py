@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Query
+
+from models import Booking, ParkingSpot, Vehicle
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class BookingFilters:
+    """
+    Admin booking list filters, declared as query parameters (use with
+    Depends). Each filter maps onto an indexed column: status/payment/refund
+    and email onto their (column, created_at, id) indexes, floor and spot
+    type onto the spot_id index via a spot subquery, plate prefix onto the
+    unique license_plate index, overstays onto (status, end_time).
+    """
+
+    def __init__(
+        self,
+        status: Optional[str] = None,
+        payment_status: Optional[str] = None,
+        refund_status: Optional[str] = None,
+        floor: Optional[str] = None,
+        spot_type: Optional[str] = None,
+        start_from: Optional[datetime] = None,
+        start_to: Optional[datetime] = None,
+        end_from: Optional[datetime] = None,
+        end_to: Optional[datetime] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        plate: Optional[str] = None,
+        email: Optional[str] = None,
+        overstay: bool = False,
+    ):
+        self.status = status
+        self.payment_status = payment_status
+        self.refund_status = refund_status
+        self.floor = floor
+        self.spot_type = spot_type
+        self.start_from = _naive_utc(start_from)
+        self.start_to = _naive_utc(start_to)
+        self.end_from = _naive_utc(end_from)
+        self.end_to = _naive_utc(end_to)
+        self.created_from = _naive_utc(created_from)
+        self.created_to = _naive_utc(created_to)
+        self.plate = plate.strip().upper() if plate and plate.strip() else None
+        self.email = email.strip() if email and email.strip() else None
+        self.overstay = overstay
+
+    def cache_key(self) -> tuple:
+        """Hashable identity of the filter set (e.g. for cached totals)."""
+        return tuple(sorted(vars(self).items()))
+
+    def apply(self, query: Query, now: Optional[datetime] = None) -> Query:
+        if self.status:
+            query = query.filter(Booking.status == self.status)
+        if self.payment_status:
+            query = query.filter(Booking.payment_status == self.payment_status)
+        if self.refund_status:
+            query = query.filter(Booking.refund_status == self.refund_status)
+        if self.email:
+            query = query.filter(Booking.email == self.email)
+
+        if self.floor or self.spot_type:
+            spots = select(ParkingSpot.id)
+            if self.floor:
+                spots = spots.where(ParkingSpot.floor == self.floor)
+            if self.spot_type:
+                spots = spots.where(ParkingSpot.spot_type == self.spot_type)
+            query = query.filter(Booking.spot_id.in_(spots))
+
+        if self.plate:
+            vehicles = select(Vehicle.id).where(Vehicle.license_plate.like(f"{_escape_like(self.plate)}%", escape="\\"))
+            query = query.filter(Booking.vehicle_id.in_(vehicles))
+
+        if self.start_from:
+            query = query.filter(Booking.start_time >= self.start_from)
+        if self.start_to:
+            query = query.filter(Booking.start_time < self.start_to)
+        if self.end_from:
+            query = query.filter(Booking.end_time >= self.end_from)
+        if self.end_to:
+            query = query.filter(Booking.end_time < self.end_to)
+        if self.created_from:
+            query = query.filter(Booking.created_at >= self.created_from)
+        if self.created_to:
+            query = query.filter(Booking.created_at < self.created_to)
+
+        if self.overstay:
+            # Still parked past the booked end
+            query = query.filter(Booking.status == "active", Booking.end_time < (now or datetime.utcnow()))
+        return query
@@ -1,5 +1,7 @@
 import os
+import re
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
@@ -11,6 +13,9 @@ MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
 MAIL_FROM = os.getenv("MAIL_FROM")
 MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
 MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+# Reconnect rather than reuse a connection idle this long (servers drop them)
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
 
 # Premium Email Template with Dark Mode support (via media queries) and responsive design
 def get_html_template(subject: str, body: str, is_html: bool = False) -> str:
@@ -101,48 +106,100 @@ def get_html_template(subject: str, body: str, is_html: bool = False) -> str:
     </html>
     """
 
-def send_email(to_email: str, subject: str, body: str, is_html: bool = False):
-    """
-    Sends an email using the configured SMTP server with premium HTML template.
-    """
-    if not MAIL_USERNAME or not MAIL_PASSWORD:
-        print(f"Mock Email to {to_email}: {subject}\n{body}")
-        return
+def build_message(to_email: str, subject: str, body: str, is_html: bool = False) -> str:
+    """The full MIME message (plain text + templated HTML) as a string."""
+    msg = MIMEMultipart("alternative")
+    msg['From'] = f"ParkPro Support <{MAIL_FROM}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
 
-    try:
-        msg = MIMEMultipart("alternative")
-        msg['From'] = f"ParkPro Support <{MAIL_FROM}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-
-        # Plain text version (stripping HTML tags if html provided? For now just use body as is if text, or simple strip if html)
-        # Actually proper mime requires plain text. If is_html, we should ideally strip tags.
-        plain_text_body = body
-        if is_html:
-            # Very basic strip for fallback
-            import re
-            plain_text_body = re.sub('<[^<]+?>', '', body)
-            
-        part1 = MIMEText(plain_text_body, 'plain')
+    # Plain text version (stripping HTML tags if html provided? For now just use body as is if text, or simple strip if html)
+    # Actually proper mime requires plain text. If is_html, we should ideally strip tags.
+    plain_text_body = body
+    if is_html:
+        # Very basic strip for fallback
+        plain_text_body = re.sub('<[^<]+?>', '', body)
         
-        # HTML version
-        html_content = get_html_template(subject, body, is_html)
-        part2 = MIMEText(html_content, 'html')
+    part1 = MIMEText(plain_text_body, 'plain')
+    
+    # HTML version
+    html_content = get_html_template(subject, body, is_html)
+    part2 = MIMEText(html_content, 'html')
 
-        msg.attach(part1)
-        msg.attach(part2)
+    msg.attach(part1)
+    msg.attach(part2)
+    return msg.as_string()
 
+
+def is_permanent_failure(error: Exception) -> bool:
+    """5xx replies and refused recipients won't succeed on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class SMTPSession:
+    """
+    One long-lived SMTP connection reused across messages: connect, STARTTLS
+    and login happen once per session instead of once per email. Reconnects
+    when the server has dropped it or it sat idle too long. Not thread-safe;
+    use one per sender thread.
+    """
+
+    def __init__(self, idle_timeout: float = SMTP_IDLE_SECONDS):
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
         # Use SMTP_SSL for port 465 (or implicit SSL)
         if MAIL_PORT == 465 or os.getenv("MAIL_USE_SSL", "False") == "True":
-             server = smtplib.SMTP_SSL(MAIL_SERVER, MAIL_PORT)
+            server = smtplib.SMTP_SSL(MAIL_SERVER, MAIL_PORT, timeout=SMTP_TIMEOUT_SECONDS)
         else:
-             server = smtplib.SMTP(MAIL_SERVER, MAIL_PORT)
-             server.starttls()
-             
+            server = smtplib.SMTP(MAIL_SERVER, MAIL_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+            server.starttls()
         server.login(MAIL_USERNAME, MAIL_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(MAIL_FROM, to_email, text)
-        server.quit()
+        self._server = server
+
+    def send(self, to_email: str, subject: str, body: str, is_html: bool = False):
+        """Raises on failure so the caller can retry."""
+        if not MAIL_USERNAME or not MAIL_PASSWORD:
+            print(f"Mock Email to {to_email}: {subject}\n{body}")
+            return
+        message = build_message(to_email, subject, body, is_html)
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.sendmail(MAIL_FROM, to_email, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # Server closed the reused connection; one fresh attempt
+            self.close()
+            self._connect()
+            self._server.sendmail(MAIL_FROM, to_email, message)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+def send_email(to_email: str, subject: str, body: str, is_html: bool = False):
+    """
+    Sends one email right away on its own connection. Application emails go
+    through the outbox (services.email_outbox.enqueue_email) instead.
+    """
+    session = SMTPSession()
+    try:
+        session.send(to_email, subject, body, is_html)
         print(f"Email sent to {to_email}")
     except Exception as e:
         print(f"Failed to send email: {e}")
+    finally:
+        session.close()
@@ -0,0 +1,85 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import ParkingSpot, SpotSchema
+from utils.common import format_spot_id
+
+GridCell = Tuple[int, int]
+
+
+@lru_cache(maxsize=64)
+def grid_cells(rows: int, cols: int) -> Tuple[GridCell, ...]:
+    """
+    Row-major (row, col) skeleton for a floor. Cached per dimension so repeated
+    renders of the same floor size don't rebuild the coordinate list.
+    """
+    return tuple((r, c) for r in range(rows) for c in range(cols))
+
+
+def index_spots(spots: Iterable[ParkingSpot]) -> Dict[GridCell, ParkingSpot]:
+    """
+    Key spots by (row, col) so each grid cell is resolved with a dict lookup
+    instead of scanning the whole floor.
+    """
+    return {(s.row, s.col): s for s in spots}
+
+
+def assemble_layout(
+    rows: int,
+    cols: int,
+    spot_index: Dict[GridCell, ParkingSpot],
+    occupied_ids: Set[int],
+) -> List[SpotSchema]:
+    """
+    Builds the SpotSchema list for a floor in a single pass over the grid.
+    Cells without a ParkingSpot row are returned as plain standard spots.
+    """
+    spots_out = []
+    for r, c in grid_cells(rows, cols):
+        spot = spot_index.get((r, c))
+        if spot:
+            spots_out.append(SpotSchema(
+                id=spot.id,
+                row=r,
+                col=c,
+                is_booked=spot.id in occupied_ids,
+                label=spot.label or "",
+                spot_type=spot.spot_type or "standard",
+                is_blocked=bool(spot.is_blocked),
+                floor=spot.floor,
+            ))
+        else:
+            spots_out.append(SpotSchema(id=0, row=r, col=c, is_booked=False))
+    return spots_out
+
+
+def provision_spots(db: Session, floor: str, rows: int, cols: int) -> int:
+    """
+    Creates every missing ParkingSpot for the floor's grid in a single bulk
+    INSERT, labelled A1, A2, ... B1 by position. Existing spots are left as is.
+    Cells another worker fills in concurrently are skipped by the unique
+    (floor, row, col) constraint (INSERT IGNORE). The caller commits.
+    Returns the number of spots this call tried to create.
+    """
+    existing = {(r, c) for r, c in db.query(ParkingSpot.row, ParkingSpot.col).filter(ParkingSpot.floor == floor)}
+    new_spots = [
+        {
+            "row": r,
+            "col": c,
+            "floor": floor,
+            "label": format_spot_id(r, c),
+            "spot_type": "standard",
+            "is_booked": False,
+            "is_blocked": False,
+        }
+        for r, c in grid_cells(rows, cols) if (r, c) not in existing
+    ]
+    if new_spots:
+        db.execute(
+            insert(ParkingSpot).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite"),
+            new_spots
+        )
+    return len(new_spots)
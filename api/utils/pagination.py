@@ -0,0 +1,84 @@
+import base64
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Hashable, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+from models import Booking
+
+BOOKING_COUNT_TTL_SECONDS = float(os.getenv("BOOKING_COUNT_TTL_SECONDS", "60"))
+
+
+def encode_cursor(created_at: datetime, booking_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{booking_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, booking_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(booking_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate_bookings(query: Query, limit: int, page: int = 1, cursor: Optional[str] = None):
+    """
+    Newest-first page of bookings plus the cursor for the next page (None on
+    the last page). With a cursor this is a keyset seek on (created_at, id),
+    served by the composite indexes, so deep pages cost the same as the
+    first. Without one it falls back to OFFSET paging for old clients.
+    """
+    query = query.order_by(Booking.created_at.desc(), Booking.id.desc())
+    if cursor:
+        created_at, booking_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Booking.created_at < created_at,
+            and_(Booking.created_at == created_at, Booking.id < booking_id)
+        ))
+    else:
+        query = query.offset((page - 1) * limit)
+
+    bookings = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        last = bookings[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return bookings, next_cursor
+
+
+class CountCache:
+    """
+    Short-lived cache for list totals. COUNT(*) over the booking history is
+    the slow part of every page; an approximate total that lags by up to the
+    TTL is fine for a pager.
+    """
+
+    def __init__(self, ttl: float = BOOKING_COUNT_TTL_SECONDS, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at monotonic, count)
+
+    def get(self, key: Hashable, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        count = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            self._entries[key] = (now + self.ttl, count)
+        return count
+
+
+booking_counts = CountCache()
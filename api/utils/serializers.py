@@ -0,0 +1,141 @@
+from functools import lru_cache
+from typing import List, Optional
+
+import orjson
+from sqlalchemy.orm import Query, Session
+
+from models import Booking, ParkingSpot, PromoCode, Vehicle
+from utils.common import format_spot_id
+
+# Column projection for BookingResponse. Rows come back as plain tuples (one
+# joined query, no ORM identity map or lazy loads), and booking_json() maps
+# them straight to the response dict without Pydantic re-validation. Keep the
+# order in sync with the unpacking in booking_json().
+BOOKING_RESPONSE_COLUMNS = (
+    Booking.id,
+    Booking.booking_uuid,
+    ParkingSpot.row.label("spot_row"),
+    ParkingSpot.col.label("spot_col"),
+    ParkingSpot.floor.label("spot_floor"),
+    Booking.name,
+    Booking.email,
+    Booking.phone,
+    Vehicle.id.label("vehicle_id"),
+    Vehicle.license_plate,
+    Vehicle.owner_name,
+    Vehicle.make,
+    Vehicle.model,
+    Vehicle.color,
+    Vehicle.year,
+    Vehicle.phone.label("vehicle_phone"),
+    Vehicle.email.label("vehicle_email"),
+    Vehicle.created_at.label("vehicle_created_at"),
+    Vehicle.updated_at.label("vehicle_updated_at"),
+    Booking.start_time,
+    Booking.end_time,
+    Booking.payment_method,
+    Booking.payment_amount,
+    Booking.payment_status,
+    Booking.discount_amount,
+    PromoCode.code.label("promo_code"),
+    Booking.status,
+    Booking.refund_status,
+    Booking.refund_amount,
+    Booking.excess_fee,
+    Booking.created_at,
+    Booking.latest_order_id,
+    ParkingSpot.spot_type,
+)
+
+
+def booking_rows(db: Session) -> Query:
+    """
+    Query of BookingResponse rows; filter/paginate it like db.query(Booking).
+    Rows expose id and created_at (for cursors), status, start/end_time and
+    spot_type (for can_cancel and fee estimates) by name. Outer joins, so
+    a booking whose spot or vehicle row is gone is still listed (and the
+    page agrees with a plain Booking count).
+    """
+    return (
+        db.query(*BOOKING_RESPONSE_COLUMNS)
+        .select_from(Booking)
+        .outerjoin(ParkingSpot, ParkingSpot.id == Booking.spot_id)
+        .outerjoin(Vehicle, Vehicle.id == Booking.vehicle_id)
+        .outerjoin(PromoCode, PromoCode.id == Booking.promo_code_id)
+    )
+
+
+@lru_cache(maxsize=4096)
+def _spot_info(row: int, col: int, floor: Optional[str]) -> str:
+    return format_spot_id(row, col, floor)
+
+
+def booking_json(row, can_cancel: bool = False, estimated_excess_fee: float = 0.0) -> dict:
+    """
+    BookingResponse as a JSON-ready dict, byte-for-byte what the Pydantic
+    model would emit: booking times as UTC with a Z suffix, vehicle times
+    naive, amounts as floats, fields in model order. A missing spot reads
+    "N/A" and a missing vehicle null.
+    """
+    (
+        id, booking_uuid, spot_row, spot_col, spot_floor, name, email, phone,
+        vehicle_id, license_plate, owner_name, make, model, color, year,
+        vehicle_phone, vehicle_email, vehicle_created_at, vehicle_updated_at,
+        start_time, end_time, payment_method, payment_amount, payment_status,
+        discount_amount, promo_code, status, refund_status, refund_amount,
+        excess_fee, created_at, latest_order_id, _spot_type,
+    ) = row
+    return {
+        "id": id,
+        "booking_uuid": booking_uuid,
+        "spot_info": _spot_info(spot_row, spot_col, spot_floor) if spot_row is not None else "N/A",
+        "name": name,
+        "email": email,
+        "phone": phone,
+        "vehicle": None if vehicle_id is None else {
+            "id": vehicle_id,
+            "license_plate": license_plate,
+            "owner_name": owner_name,
+            "make": make,
+            "model": model,
+            "color": color,
+            "year": year,
+            "phone": vehicle_phone,
+            "email": vehicle_email,
+            "created_at": vehicle_created_at.isoformat() if vehicle_created_at else None,
+            "updated_at": vehicle_updated_at.isoformat() if vehicle_updated_at else None,
+        },
+        # DB stores naive UTC
+        "start_time": start_time.isoformat() + "Z",
+        "end_time": end_time.isoformat() + "Z",
+        "payment_method": payment_method,
+        "payment_amount": float(payment_amount),
+        "payment_status": payment_status,
+        "discount_amount": float(discount_amount or 0),
+        "promo_code": promo_code,
+        "status": status,
+        "refund_status": refund_status,
+        "refund_amount": float(refund_amount or 0),
+        "excess_fee": float(excess_fee or 0),
+        "estimated_excess_fee": estimated_excess_fee,
+        "created_at": created_at.isoformat() + "Z" if created_at else None,
+        "can_cancel": can_cancel,
+        "latest_order_id": latest_order_id,
+    }
+
+
+def paginated_json(items: List[dict], total: int, page: int, size: int, pages: int, next_cursor: Optional[str]) -> dict:
+    """PaginatedBookingResponse as a JSON-ready dict."""
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "size": size,
+        "pages": pages,
+        "next_cursor": next_cursor,
+    }
+
+
+def dumps(value) -> bytes:
+    """Compact JSON bytes, same output as FastAPI's JSONResponse."""
+    return orjson.dumps(value)